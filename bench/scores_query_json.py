@@ -0,0 +1,67 @@
+"""Compare the /scores/query serialization paths: dict rows + ScoreOut vs DuckDB JSON.
+
+Run from the app root with the usual server environment (DUCKDB_PATH, TOKENS_JSON, ...):
+
+    python -m bench.scores_query_json --limit 2000 --repeat 20
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Callable, List
+
+from server.db import scores_repo
+from server.schemas.scores import ScoreOut
+
+
+def _legacy(limit: int) -> bytes:
+    rows = scores_repo.list_by_sets(limit=limit, offset=0)
+    models = [ScoreOut(**row) for row in rows]
+    payload = [model.model_dump(mode="json") for model in models]
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _columnar(limit: int) -> bytes:
+    body, _ = scores_repo.list_by_sets_json(limit=limit, offset=0)
+    return body
+
+
+def _measure(name: str, fn: Callable[[int], bytes], limit: int, repeat: int) -> None:
+    fn(limit)  # прогрев: соединение, план, кеш страниц
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(limit)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    body = fn(limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    print(
+        f"{name:<9} rows={len(json.loads(body))} bytes={len(body)} "
+        f"median_ms={timings[len(timings) // 2] * 1000:.2f} "
+        f"peak_alloc_kib={peak / 1024:.0f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    legacy = json.loads(_legacy(args.limit))
+    columnar = json.loads(_columnar(args.limit))
+    print(f"parity={'ok' if legacy == columnar else 'MISMATCH'}")
+
+    _measure("legacy", _legacy, args.limit, args.repeat)
+    _measure("columnar", _columnar, args.limit, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import os
+import sys
+
+import duckdb
+
+DUCKDB_PATH = os.getenv("DUCKDB_PATH", "/srv/neiruha/lab/app/data/neiruha.duckdb")
+
+# Админские представления считают оценки по scores_all, иначе после архивации теряют старые строки
+_ADMIN_VIEWS = (
+    "CREATE OR REPLACE VIEW v_students AS WITH student_tracks AS (SELECT DISTINCT tp.track_id, tp.user_id, tp.joined_at FROM track_participants AS tp WHERE (tp.role_in_track = 'student')), student_users AS (SELECT DISTINCT user_id FROM student_tracks), score_last AS (SELECT student_id, max(measured_at) AS last_score_at FROM scores_all GROUP BY student_id)SELECT u.user_id, u.display_name, u.email, u.telegram_username, u.telegram_id, u.banned, u.frozen, u.created_at, u.last_connected, count(DISTINCT st.track_id) AS tracks_total, count(DISTINCT CASE  WHEN ((t.status = 'active')) THEN (st.track_id) ELSE NULL END) AS tracks_active, count(DISTINCT te.user_id) AS teachers_total, count(DISTINCT me.user_id) AS mentors_total, max(st.joined_at) AS last_joined_at, max(ts.occurred_at) AS last_step_in_tracks_at, sl.last_score_at FROM student_users AS su INNER JOIN users AS u ON ((u.user_id = su.user_id)) LEFT JOIN student_tracks AS st ON ((st.user_id = u.user_id)) LEFT JOIN tracks AS t ON ((t.track_id = st.track_id)) LEFT JOIN track_participants AS te ON (((te.track_id = st.track_id) AND (te.role_in_track = 'teacher'))) LEFT JOIN track_participants AS me ON (((me.track_id = st.track_id) AND (me.role_in_track = 'mentor'))) LEFT JOIN track_steps AS ts ON ((ts.track_id = st.track_id)) LEFT JOIN score_last AS sl ON ((sl.student_id = u.user_id)) GROUP BY u.user_id, u.display_name, u.email, u.telegram_username, u.telegram_id, u.banned, u.frozen, u.created_at, u.last_connected, sl.last_score_at",
+    "CREATE OR REPLACE VIEW v_tracks_admin_overview AS WITH p AS (SELECT track_id, count(DISTINCT user_id) AS participants_total, sum(CASE  WHEN ((role_in_track = 'student')) THEN (1) ELSE 0 END) AS students_total, sum(CASE  WHEN ((role_in_track = 'owner')) THEN (1) ELSE 0 END) AS owners_in_participants, sum(CASE  WHEN ((role_in_track NOT IN ('owner', 'student'))) THEN (1) ELSE 0 END) AS bad_roles_cnt, string_agg(DISTINCT role_in_track, ', ') AS roles_list FROM track_participants GROUP BY track_id), s AS (SELECT track_id, count_star() AS steps_total, min(occurred_at) AS first_step_at, max(occurred_at) AS last_step_at, sum(CASE  WHEN ((occurred_at >= (now() - CAST('7 day' AS INTERVAL)))) THEN (1) ELSE 0 END) AS steps_last7 FROM track_steps GROUP BY track_id), m AS (SELECT track_id, count_star() AS measurements_total, max(measured_at) AS last_score_at FROM scores_all GROUP BY track_id), nxt AS (SELECT t1.track_id, t2.title AS next_track_title FROM tracks AS t1 LEFT JOIN tracks AS t2 ON ((t2.track_id = t1.next_track_id)))SELECT t.track_id, t.title, t.status, t.next_track_id, nxt.next_track_title, t.owner_user_id, ou.display_name AS owner_name, ou.telegram_username AS owner_telegram, COALESCE(p.participants_total, 0) AS participants_total, COALESCE(p.students_total, 0) AS students_total, COALESCE(p.roles_list, '') AS roles_list, COALESCE(s.steps_total, 0) AS steps_total, s.first_step_at, s.last_step_at, COALESCE(s.steps_last7, 0) AS steps_last7, COALESCE(m.measurements_total, 0) AS measurements_total, m.last_score_at, ((COALESCE(p.owners_in_participants, 0) = 1) AND (t.owner_user_id IS NOT NULL)) AS owner_in_participants, (COALESCE(p.bad_roles_cnt, 0) = 0) AS roles_clean FROM tracks AS t LEFT JOIN p ON ((p.track_id = t.track_id)) LEFT JOIN s ON ((s.track_id = t.track_id)) LEFT JOIN m ON ((m.track_id = t.track_id)) LEFT JOIN nxt ON ((nxt.track_id = t.track_id)) LEFT JOIN users AS ou ON ((ou.user_id = t.owner_user_id)) ORDER BY lower(t.title)",
+)
+
+
+def main() -> None:
+    con = duckdb.connect(DUCKDB_PATH)
+    try:
+        con.execute("BEGIN")
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archive_files(
+                path VARCHAR PRIMARY KEY,
+                table_name VARCHAR NOT NULL,
+                row_count BIGINT NOT NULL,
+                min_at TIMESTAMP,
+                max_at TIMESTAMP,
+                archived_at TIMESTAMP DEFAULT(CURRENT_TIMESTAMP) NOT NULL
+            )
+            """
+        )
+        # Сервер пересоздаёт представления при старте со списком архивных файлов
+        con.execute("CREATE OR REPLACE VIEW scores_all AS SELECT * FROM scores")
+        con.execute("CREATE OR REPLACE VIEW sys_events_all AS SELECT * FROM sys_events")
+        for view_sql in _ADMIN_VIEWS:
+            con.execute(view_sql)
+        con.execute("COMMIT")
+    except Exception as exc:  # pragma: no cover - migration guard
+        con.execute("ROLLBACK")
+        print(f"Migration failed: {exc}", file=sys.stderr)
+        raise
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
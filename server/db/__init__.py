@@ -1,5 +1,5 @@
 """Database repositories."""
 
-from .connection import get_conn, dictrows
+from .connection import close_db, get_conn, dictrows, unit_of_work
 
-__all__ = ["get_conn", "dictrows"]
+__all__ = ["get_conn", "dictrows", "close_db", "unit_of_work"]
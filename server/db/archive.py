@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import re
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..config import ARCHIVE_DIR, DB_BACKEND, SCORES_ARCHIVE_AFTER_DAYS, SYS_EVENTS_ARCHIVE_AFTER_DAYS
+from ..logging_utils import get_logger
+from ..utils.ids import new_id
+from ..utils.time import ensure_naive_utc, now_utc
+from .connection import checkpoint
+from .writer import run_write
+
+log = get_logger("db.archive")
+
+__all__ = ["SCORES_SOURCE", "SYS_EVENTS_SOURCE", "enabled", "ensure_views", "archive_cold", "last_archive"]
+
+# Старые строки уезжают в Parquet рядом с базой (Hive-разбиение), а чтение идёт через
+# представление «горячая таблица UNION ALL read_parquet» — ответы API от этого не меняются.
+# В Postgres архива нет, там читаем таблицы напрямую.
+SCORES_SOURCE = "scores_all" if DB_BACKEND == "duckdb" else "scores"
+SYS_EVENTS_SOURCE = "sys_events_all" if DB_BACKEND == "duckdb" else "sys_events"
+
+# table -> (представление, колонка времени, ключи разбиения, порядок при пересборке, возраст в днях)
+_TIERS: Dict[str, tuple] = {
+    "scores": (
+        "scores_all",
+        "measured_at",
+        ("month", "track_id"),
+        "track_id, student_id, measured_at",
+        SCORES_ARCHIVE_AFTER_DAYS,
+    ),
+    "sys_events": ("sys_events_all", "occurred_at", ("month",), "occurred_at", SYS_EVENTS_ARCHIVE_AFTER_DAYS),
+}
+
+# DELETE по таблице с PRIMARY KEY в DuckDB дорожает нелинейно (десятки тысяч строк —
+# секунды), поэтому крупную порцию убираем пересборкой горячей таблицы
+_DELETE_MAX_ROWS = 10_000
+
+_ROOT = Path(ARCHIVE_DIR).resolve()
+_last: Dict[str, Any] = {}
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def table_ddl(con, table: str, name: str) -> str:
+    """Return the ``CREATE TABLE`` of ``table`` (constraints included) under a new name."""
+
+    ddl = con.execute(
+        "SELECT sql FROM duckdb_tables() WHERE schema_name = 'main' AND table_name = ?", [table]
+    ).fetchall()[0][0]
+    return re.sub(r"^CREATE TABLE [^(]+", f"CREATE TABLE {name}", ddl.rstrip(";"), count=1)
+
+
+def _keep_hot(con, table: str, where: str, order_by: str) -> int:
+    # Оставшиеся строки переливаются в новую таблицу, и она подменяет старую в той же транзакции
+    con.execute(table_ddl(con, table, f"{table}__hot"))
+    con.execute(f"INSERT INTO {table}__hot SELECT * FROM {table} WHERE NOT ({where}) ORDER BY {order_by}")
+    kept = con.execute(f"SELECT COUNT(*) FROM {table}__hot").fetchall()[0][0]
+    total = con.execute(f"SELECT COUNT(*) FROM {table}").fetchall()[0][0]
+    con.execute(f"ALTER TABLE {table} RENAME TO {table}__cold")
+    con.execute(f"ALTER TABLE {table}__hot RENAME TO {table}")
+    con.execute(f"DROP TABLE {table}__cold")
+    return total - kept
+
+
+def enabled() -> bool:
+    return DB_BACKEND == "duckdb" and any(days > 0 for *_, days in _TIERS.values())
+
+
+def _view_sql(con, table: str) -> str:
+    view, _, partition, _, _ = _TIERS[table]
+    columns = ", ".join(
+        f'"{name}"'
+        for (name,) in con.execute(
+            """
+            SELECT column_name FROM duckdb_columns()
+            WHERE schema_name = 'main' AND table_name = ?
+            ORDER BY column_index
+            """,
+            [table],
+        ).fetchall()
+    )
+    has_manifest = con.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE schema_name = 'main' AND table_name = 'archive_files'"
+    ).fetchall()[0][0]
+    files: List[str] = []
+    if has_manifest:
+        files = [
+            str(_ROOT / path)
+            for (path,) in con.execute(
+                "SELECT path FROM archive_files WHERE table_name = ? ORDER BY path", [table]
+            ).fetchall()
+        ]
+    sql = f"CREATE OR REPLACE VIEW {view} AS SELECT {columns} FROM {table}"
+    if files:
+        # Файлы перечислены явно: представление меняется в той же транзакции, что и DELETE,
+        # поэтому читатель не увидит строку ни дважды, ни ни разу. Фильтры по track_id
+        # отсекают лишние файлы по пути, не открывая их.
+        hive_types = ", ".join(f"'{key}': VARCHAR" for key in partition)
+        sql += (
+            f" UNION ALL SELECT {columns} FROM read_parquet([{', '.join(_quote(f) for f in files)}],"
+            f" hive_partitioning = true, hive_types = {{{hive_types}}})"
+        )
+    return sql
+
+
+def ensure_views() -> None:
+    """Recreate the read-through views from the archive manifest (DuckDB only)."""
+
+    if DB_BACKEND != "duckdb":
+        return
+
+    def _create(con) -> None:
+        for table in _TIERS:
+            con.execute(_view_sql(con, table))
+
+    run_write(_create)
+
+
+def _archive_table(con, table: str, cutoff: datetime, batch: str) -> Dict[str, Any]:
+    _, time_column, partition, order_by, _ = _TIERS[table]
+    target = _ROOT / table
+    where = f"{time_column} < TIMESTAMP '{cutoff.isoformat(sep=' ')}'"
+    rows = con.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}").fetchall()[0][0]
+    if not rows:
+        return {"rows": 0, "files": 0}
+
+    target.mkdir(parents=True, exist_ok=True)
+    written = con.execute(
+        f"""
+        COPY (SELECT *, strftime({time_column}, '%Y-%m') AS month FROM {table} WHERE {where})
+        TO {_quote(str(target))}
+        (FORMAT parquet, PARTITION_BY ({', '.join(partition)}), FILENAME_PATTERN '{batch}_{{uuid}}',
+         APPEND, RETURN_FILES)
+        """
+    ).fetchall()[0][1]
+    # Манифест заполняется из самих файлов — заодно проверяем, что они читаются
+    con.execute(
+        f"""
+        INSERT INTO archive_files (path, table_name, row_count, min_at, max_at)
+        SELECT substr(filename, ?), ?, COUNT(*), MIN({time_column}), MAX({time_column})
+        FROM read_parquet(?, filename = true)
+        GROUP BY filename
+        """,
+        [len(str(_ROOT)) + 2, table, written],
+    )
+    archived = con.execute(
+        "SELECT COALESCE(SUM(row_count), 0) FROM archive_files WHERE table_name = ? AND path LIKE ?",
+        [table, f"%/{batch}_%"],
+    ).fetchall()[0][0]
+    if rows <= _DELETE_MAX_ROWS:
+        deleted = con.execute(f"DELETE FROM {table} WHERE {where}").fetchall()[0][0]
+    else:
+        deleted = _keep_hot(con, table, where, order_by)
+    if archived != rows or deleted != rows:
+        raise RuntimeError(f"archive mismatch table={table} rows={rows} archived={archived} deleted={deleted}")
+    con.execute(_view_sql(con, table))
+    return {"rows": int(rows), "files": len(written)}
+
+
+def _discard(table: str, batch: str) -> None:
+    for path in (_ROOT / table).rglob(f"{batch}_*.parquet"):
+        try:
+            path.unlink()
+        except OSError:
+            log.warning("archive cleanup failed path=%s", path)
+
+
+def archive_cold() -> Dict[str, Any]:
+    """Move rows older than the configured age from the hot tables into Parquet.
+
+    Each table is handled in one writer transaction: the rows are written to
+    ``ARCHIVE_DIR/<table>/month=YYYY-MM[/track_id=...]/``, recorded in
+    ``archive_files``, removed from the hot table (large batches rebuild it instead of
+    deleting) and the view is switched to the new file list. If the transaction fails
+    the written files are removed again.
+    """
+
+    started_at = now_utc()
+    report: Dict[str, Any] = {"started_at": started_at, "tables": {}}
+    if DB_BACKEND != "duckdb":
+        return report
+
+    for table, (*_, days) in _TIERS.items():
+        if days <= 0:
+            continue
+        cutoff = ensure_naive_utc(started_at - timedelta(days=days)).replace(microsecond=0)
+        batch = new_id("b")
+        t0 = time.monotonic()
+        try:
+            result = run_write(lambda con: _archive_table(con, table, cutoff, batch))
+        except Exception:
+            _discard(table, batch)
+            raise
+        result["cutoff"] = cutoff
+        result["ms"] = round((time.monotonic() - t0) * 1000, 1)
+        report["tables"][table] = result
+        log.info(
+            "archived table=%s rows=%s files=%s cutoff=%s ms=%s",
+            table,
+            result["rows"],
+            result["files"],
+            cutoff.isoformat(),
+            result["ms"],
+        )
+    if any(result["rows"] for result in report["tables"].values()):
+        checkpoint()
+    report["finished_at"] = now_utc()
+    _last.clear()
+    _last.update(report)
+    return report
+
+
+def last_archive() -> Optional[Dict[str, Any]]:
+    return dict(_last) if _last else None
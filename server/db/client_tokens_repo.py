@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Set
 
 import json
 
+from . import invalidation
 from .connection import dictrows, get_conn
+from .writer import run_write
 from ..logging_utils import get_logger
 from ..utils.time import ensure_naive_utc
 
@@ -22,7 +24,7 @@ def create_token(
     ip_hash: str | None,
     payload_json: Dict[str, Any] | None,
 ) -> Dict[str, Any]:
-    with get_conn(False) as con:
+    def _write(con):
         con.execute(
             """
             INSERT INTO client_tokens (
@@ -57,7 +59,9 @@ def create_token(
             """,
             [token_id],
         )
-        row = dictrows(cur)[0]
+        return dictrows(cur)[0]
+
+    row = run_write(_write)
     log.info("Issued client token %s for user %s", token_id, user_id)
     return row
 
@@ -87,38 +91,77 @@ def get_token(token_id: str) -> Optional[Dict[str, Any]]:
 
 
 def revoke_token(token_id: str) -> bool:
-    with get_conn(False) as con:
+    def _write(con):
+        # rowcount у DuckDB для UPDATE всегда -1 — число изменённых строк берём из RETURNING
         cur = con.execute(
-            "UPDATE client_tokens SET revoked_at = CURRENT_TIMESTAMP WHERE token_id = ? AND revoked_at IS NULL",
+            "UPDATE client_tokens SET revoked_at = CURRENT_TIMESTAMP WHERE token_id = ? AND revoked_at IS NULL RETURNING token_id",
             [token_id],
         )
-        changed = cur.rowcount
+        return len(cur.fetchall())
+
+    changed = run_write(_write)
+    invalidation.token_changed(token_id)
     if changed:
         log.info("Revoked client token %s", token_id)
     return bool(changed)
 
 
 def refresh_token(token_id: str, *, new_expires_at: datetime) -> Optional[Dict[str, Any]]:
-    with get_conn(False) as con:
+    def _write(con):
         cur = con.execute(
             """
             UPDATE client_tokens
             SET expires_at = ?, revoked_at = NULL
             WHERE token_id = ?
+            RETURNING token_id, user_id, telegram_user_id, expires_at, revoked_at
             """,
             [ensure_naive_utc(new_expires_at), token_id],
         )
-        if cur.rowcount == 0:
-            return None
-        cur = con.execute(
+        return dictrows(cur)
+
+    rows = run_write(_write)
+    invalidation.token_changed(token_id)
+    if not rows:
+        return None
+    log.info("Refreshed client token %s", token_id)
+    return rows[0]
+
+
+def load_revocation_state(*, revoked_since: datetime) -> Dict[str, Set[str]]:
+    """Return the sets a signed token must be checked against: revoked tokens, banned and frozen users."""
+
+    with get_conn(True) as con:
+        revoked = con.execute(
+            "SELECT token_id FROM client_tokens WHERE revoked_at IS NOT NULL AND revoked_at >= ?",
+            [ensure_naive_utc(revoked_since)],
+        ).fetchall()
+        banned = con.execute(
+            "SELECT DISTINCT user_id FROM banned_users WHERE user_id IS NOT NULL"
+        ).fetchall()
+        frozen = con.execute("SELECT user_id FROM users WHERE frozen").fetchall()
+    return {
+        "revoked_tokens": {row[0] for row in revoked},
+        "banned_users": {row[0] for row in banned},
+        "frozen_users": {row[0] for row in frozen},
+    }
+
+
+def touch_many(usage: Dict[str, datetime]) -> None:
+    """Move last_used_at forward for every token in ``usage`` with one UPDATE."""
+
+    if not usage:
+        return
+    token_ids = list(usage)
+    used_at = [ensure_naive_utc(usage[token_id]) for token_id in token_ids]
+
+    run_write(
+        lambda con: con.execute(
             """
-            SELECT token_id, user_id, telegram_user_id, expires_at, revoked_at
-            FROM client_tokens
-            WHERE token_id = ?
-            LIMIT 1
+            UPDATE client_tokens
+            SET last_used_at = GREATEST(COALESCE(client_tokens.last_used_at, u.used_at), u.used_at)
+            FROM (SELECT unnest(CAST(? AS VARCHAR[])) AS token_id, unnest(CAST(? AS TIMESTAMP[])) AS used_at) u
+            WHERE client_tokens.token_id = u.token_id
             """,
-            [token_id],
+            [token_ids, used_at],
         )
-        rows = dictrows(cur)
-    log.info("Refreshed client token %s", token_id)
-    return rows[0] if rows else None
+    )
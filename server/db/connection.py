@@ -1,33 +1,386 @@
 # /srv/neiruha/lab/app/server/db/connection.py
+import threading
+import time
 from contextlib import contextmanager
-from ..config import DB_BACKEND, DUCKDB_PATH, POSTGRES_DSN
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from ..config import (
+    DB_BACKEND,
+    DUCKDB_HEALTHCHECK_SECONDS,
+    DUCKDB_PERSISTENT_CONN,
+    DUCKDB_PATH,
+)
 from ..logging_utils import get_logger
 
 log = get_logger("db")
 
+# Один экземпляр базы на процесс: файл, каталог и buffer pool живут между запросами,
+# а потоки получают свои лёгкие курсоры через .cursor().
+_db_lock = threading.Lock()
+_db: dict[str, Any] = {"con": None, "generation": 0, "checked_at": 0.0}
+_local = threading.local()
+_unit_of_work: ContextVar[Optional[Any]] = ContextVar("db_unit_of_work", default=None)
+_after_commit: ContextVar[Optional[list]] = ContextVar("db_after_commit", default=None)
+
+
+def _open_db():
+    import duckdb
+
+    con = duckdb.connect(DUCKDB_PATH, read_only=False)
+    log.info("duckdb shared handle opened path=%s", DUCKDB_PATH)
+    return con
+
+
+def _close_db_locked() -> None:
+    con = _db.get("con")
+    _db["con"] = None
+    _db["generation"] += 1
+    if con is not None:
+        try:
+            con.close()
+        except Exception:
+            pass
+
+
+def _shared_db():
+    """Return the process-wide handle, reopening it if the health check fails."""
+
+    with _db_lock:
+        con = _db.get("con")
+        now = time.monotonic()
+        if con is not None and now - _db["checked_at"] >= DUCKDB_HEALTHCHECK_SECONDS:
+            try:
+                con.execute("SELECT 1").fetchone()
+                _db["checked_at"] = now
+            except Exception as e:
+                log.warning("duckdb shared handle failed health check, reconnecting: %s", e)
+                _close_db_locked()
+                con = None
+        if con is None:
+            con = _open_db()
+            _db["con"] = con
+            _db["checked_at"] = now
+        return con, _db["generation"]
+
+
+def _thread_cursor():
+    con, generation = _shared_db()
+    cur = getattr(_local, "cursor", None)
+    if cur is None or getattr(_local, "generation", None) != generation:
+        cur = con.cursor()
+        _local.cursor = cur
+        _local.generation = generation
+    return cur
+
+
+def _drop_thread_cursor() -> None:
+    cur = getattr(_local, "cursor", None)
+    _local.cursor = None
+    if cur is not None:
+        try:
+            cur.close()
+        except Exception:
+            pass
+
+
+def invalidate_db(reason: Optional[str] = None) -> None:
+    """Force the next get_conn() to reopen the shared handle."""
+
+    with _db_lock:
+        if _db.get("con") is not None:
+            log.warning("duckdb shared handle invalidated reason=%s", reason or "manual")
+        _close_db_locked()
+
+
+def close_db() -> None:
+    if DB_BACKEND == "postgres":
+        from . import postgres
+
+        postgres.close_pool()
+        return
+    with _db_lock:
+        if _db.get("con") is not None:
+            log.info("duckdb shared handle closed")
+        _close_db_locked()
+
+
+def _is_fatal(exc: Exception) -> bool:
+    import duckdb
+
+    if isinstance(exc, (duckdb.FatalException, duckdb.ConnectionException)):
+        return True
+    return "database has been invalidated" in str(exc)
+
+
+def checkpoint() -> None:
+    """Flush the WAL into the main file so file-level copies see fresh data."""
+
+    if DB_BACKEND != "duckdb" or not DUCKDB_PERSISTENT_CONN:
+        return
+    with _db_lock:
+        con = _db.get("con")
+        if con is None:
+            return
+        try:
+            con.execute("CHECKPOINT")
+        except Exception as e:
+            log.warning("duckdb checkpoint failed: %s", e)
+
+
 @contextmanager
-def get_conn(read_only: bool = True):
-    if DB_BACKEND == "duckdb":
-        import duckdb
+def _duckdb_persistent():
+    depth = getattr(_local, "depth", 0)
+    try:
+        if depth:
+            # Вложенный get_conn в том же потоке не должен перетирать результаты внешнего курсора
+            con, _ = _shared_db()
+            cur = con.cursor()
+        else:
+            cur = _thread_cursor()
+    except Exception as e:
+        log.exception(f"DuckDB connection error: {e}")
+        raise
+    _local.depth = depth + 1
+    try:
+        yield cur
+    except Exception as e:
+        # Курсор мог остаться в середине транзакции — закрываем его, следующий вызов возьмёт новый
+        if not depth:
+            _drop_thread_cursor()
+        if _is_fatal(e):
+            invalidate_db(str(e))
+        raise
+    finally:
+        _local.depth = depth
+        if depth:
+            try:
+                cur.close()
+            except Exception:
+                pass
+
+
+@contextmanager
+def _duckdb_per_call(read_only: bool):
+    import duckdb
+    try:
+        con = duckdb.connect(DUCKDB_PATH, read_only=read_only)
+        log.debug(f"duckdb.connect({DUCKDB_PATH}, read_only={read_only}) ok")
         try:
-            con = duckdb.connect(DUCKDB_PATH, read_only=read_only)
-            log.debug(f"duckdb.connect({DUCKDB_PATH}, read_only={read_only}) ok")
+            yield con
+        finally:
             try:
+                con.close()
+            except Exception:
+                pass
+    except Exception as e:
+        # Не скрываем — пробрасываем наверх, чтобы handler/стартап-чеки отреагировали
+        log.exception(f"DuckDB connection error: {e}")
+        raise
+
+
+@contextmanager
+def get_conn(read_only: bool = True):
+    uow_con = _unit_of_work.get()
+    if uow_con is not None:
+        # Внутри unit_of_work или задания писателя все репозитории работают на одном
+        # соединении и в одной транзакции
+        yield uow_con
+        return
+    with backend_conn(read_only) as con:
+        yield con
+
+
+@contextmanager
+def backend_conn(read_only: bool = True):
+    """Open a connection of the configured backend, ignoring any bound transaction."""
+
+    # read_only соблюдается только в режиме per-call: общий handle открыт на запись,
+    # потому что DuckDB не даёт открыть один файл в двух конфигурациях в одном процессе.
+    if DB_BACKEND == "duckdb":
+        if DUCKDB_PERSISTENT_CONN:
+            with _duckdb_persistent() as con:
+                yield con
+        else:
+            with _duckdb_per_call(read_only) as con:
                 yield con
-            finally:
-                try:
-                    con.close()
-                except Exception:
-                    pass
-        except Exception as e:
-            # Не скрываем — пробрасываем наверх, чтобы handler/стартап-чеки отреагировали
-            log.exception(f"DuckDB connection error: {e}")
-            raise
     elif DB_BACKEND == "postgres":
-        raise NotImplementedError("Postgres backend is not enabled yet.")
+        from . import postgres
+
+        with postgres.connection(read_only) as con:
+            yield con
     else:
         raise RuntimeError(f"Unsupported DB_BACKEND: {DB_BACKEND}")
 
+
+@contextmanager
+def bind_transaction(con):
+    """Route ``get_conn`` and ``after_commit`` in this context to ``con``'s open transaction.
+
+    Yields the list of after-commit callbacks; whoever commits ``con`` runs them.
+    """
+
+    callbacks: list = []
+    token = _unit_of_work.set(con)
+    callbacks_token = _after_commit.set(callbacks)
+    try:
+        yield callbacks
+    finally:
+        _after_commit.reset(callbacks_token)
+        _unit_of_work.reset(token)
+
+
+@contextmanager
+def unit_of_work():
+    """Run the enclosed repository reads on one connection, in one read transaction.
+
+    Every ``get_conn`` in the block sees the same snapshot; nested blocks join the outer
+    one. Writes do not belong here: a multi-step write is a single ``run_write(fn)`` job,
+    and the repository calls inside ``fn`` share the writer's transaction.
+    """
+
+    if _unit_of_work.get() is not None:
+        yield _unit_of_work.get()
+        return
+    with backend_conn(True) as con:
+        con.execute("BEGIN TRANSACTION")
+        token = _unit_of_work.set(con)
+        try:
+            yield con
+        finally:
+            _unit_of_work.reset(token)
+            try:
+                con.execute("ROLLBACK")
+            except Exception:
+                pass
+
+
+def after_commit(fn) -> None:
+    """Call ``fn`` once the active unit of work commits, or right away outside of one."""
+
+    callbacks = _after_commit.get()
+    if callbacks is None:
+        fn()
+    else:
+        callbacks.append(fn)
+
+
 def dictrows(cursor):
     cols = [d[0] for d in cursor.description]
     return [dict(zip(cols, r)) for r in cursor.fetchall()]
+
+
+def json_row_sql(sql: str) -> str:
+    """Wrap ``sql`` so that every row comes back as one JSON object string."""
+
+    return f"SELECT CAST(to_json(q) AS VARCHAR) FROM ({sql}) q"
+
+
+def json_rows(con, sql: str, params=None) -> list[str]:
+    """Run ``sql`` and return each row as one JSON object string, serialized by the database."""
+
+    cur = con.execute(json_row_sql(sql), params or [])
+    return [row[0] for row in cur.fetchall()]
+
+
+def json_array(con, sql: str, params=None) -> bytes:
+    """Run ``sql`` and return its rows as a JSON array, serialized by the database column-wise.
+
+    Each row comes back as one ready-made JSON string, so no per-row dicts or models are
+    built in Python. Column names and values must already match the response contract.
+    """
+
+    rows = json_rows(con, sql, params)
+    if not rows:
+        return b"[]"
+    return ("[" + ",".join(rows) + "]").encode("utf-8")
+
+
+
+class RowStream:
+    """A running query whose result is drained in ``fetchmany`` chunks.
+
+    It owns its own cursor, so chunks may be fetched from different threads (as a
+    streaming response does), and ``interrupt()`` may be called from any thread to
+    abort a fetch in progress. ``close()`` waits for that fetch and releases the cursor.
+    Backends that can hand out Arrow batches directly set ``supports_arrow``; use either
+    ``fetchmany`` or ``fetch_arrow`` on one stream, not both.
+    """
+
+    def __init__(self, cursor: Any, *, release, interrupt, arrow_reader=None) -> None:
+        self.columns = [d[0] for d in cursor.description]
+        self._cursor = cursor
+        self._release = release
+        self._interrupt = interrupt
+        self._arrow_reader = arrow_reader
+        self._reader = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def supports_arrow(self) -> bool:
+        return self._arrow_reader is not None
+
+    def fetchmany(self, size: int) -> list:
+        with self._lock:
+            if self._closed:
+                return []
+            return self._cursor.fetchmany(size)
+
+    def fetch_arrow(self, size: int):
+        """Return the next chunk as a pyarrow RecordBatch, or ``None`` at the end."""
+
+        with self._lock:
+            if self._closed:
+                return None
+            if self._reader is None:
+                self._reader = self._arrow_reader(size)
+            try:
+                return self._reader.read_next_batch()
+            except StopIteration:
+                return None
+
+    def interrupt(self) -> None:
+        if self._closed:
+            return
+        try:
+            self._interrupt()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self._release()
+            except Exception as e:
+                log.warning("row stream release failed: %s", e)
+
+
+def open_row_stream(sql: str, params=None) -> RowStream:
+    """Start ``sql`` on a dedicated read cursor; the caller must ``close()`` the stream."""
+
+    if DB_BACKEND == "postgres":
+        from . import postgres
+
+        return postgres.open_row_stream(sql, params)
+    if DB_BACKEND != "duckdb":
+        raise RuntimeError(f"Unsupported DB_BACKEND: {DB_BACKEND}")
+
+    import duckdb
+
+    if DUCKDB_PERSISTENT_CONN:
+        con, _ = _shared_db()
+        cur = con.cursor()
+    else:
+        cur = duckdb.connect(DUCKDB_PATH, read_only=True)
+    try:
+        cur.execute(sql, params or [])
+    except Exception:
+        cur.close()
+        raise
+    # to_arrow_reader появился в новых DuckDB, fetch_record_batch — его прежнее имя
+    arrow_reader = getattr(cur, "to_arrow_reader", None) or cur.fetch_record_batch
+    return RowStream(cur, release=cur.close, interrupt=cur.interrupt, arrow_reader=arrow_reader)
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from typing import Callable, List
+
+from .connection import after_commit
+
+__all__ = ["subscribe", "token_changed", "user_changed"]
+
+# Слушатели получают (kind, key): kind = "token" | "user"
+_listeners: List[Callable[[str, str], None]] = []
+
+
+def subscribe(fn: Callable[[str, str], None]) -> None:
+    _listeners.append(fn)
+
+
+def _notify(kind: str, key: str) -> None:
+    for fn in list(_listeners):
+        fn(kind, key)
+
+
+def token_changed(token_id: str) -> None:
+    """Signal that a client token was revoked or refreshed (fires after commit)."""
+
+    after_commit(lambda: _notify("token", token_id))
+
+
+def user_changed(user_id: str) -> None:
+    """Signal that a user's frozen/banned state changed (fires after commit)."""
+
+    after_commit(lambda: _notify("user", user_id))
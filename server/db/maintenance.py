@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import (
+    DB_BACKEND,
+    SCORES_RECLUSTER_CHECK_SECONDS,
+    SCORES_RECLUSTER_ENABLED,
+    SCORES_RECLUSTER_MIN_GAIN,
+    SCORES_RECLUSTER_QUIET_HOURS,
+)
+from ..logging_utils import get_logger
+from ..utils.time import now_utc
+from . import archive
+from .connection import checkpoint, get_conn
+from .writer import run_write
+
+log = get_logger("db.maintenance")
+
+__all__ = ["scores_layout_stats", "recluster_scores", "last_recluster", "start", "stop"]
+
+CLUSTER_KEY = ("track_id", "student_id", "measured_at")
+
+_SHADOW = "scores__shadow"
+_OLD = "scores__old"
+
+# Min/max каждого row group'а из zone map. DuckDB хранит у строк только первые 8 байт,
+# поэтому ключи сравниваются по тому же префиксу — как это делает сам планировщик.
+_ZONES_SQL = r"""
+    SELECT
+        row_group_id,
+        column_name,
+        MIN(regexp_extract(stats, '^\[Min: (.*?), Max: ', 1)) AS lo,
+        MAX(regexp_extract(stats, ', Max: (.*?)(, Has Unicode|\]\[)', 1)) AS hi
+    FROM pragma_storage_info('scores')
+    WHERE column_name IN ('track_id', 'student_id')
+      AND segment_type <> 'VALIDITY'
+      AND stats LIKE '[Min:%'
+    GROUP BY row_group_id, column_name
+"""
+
+_SCAN_SQL = f"""
+    WITH zones AS ({_ZONES_SQL}),
+    keys AS (
+        SELECT DISTINCT 'track_id' AS column_name, left(track_id, 8) AS k FROM scores
+        UNION ALL
+        SELECT DISTINCT 'student_id', left(student_id, 8) FROM scores
+    ),
+    hits AS (
+        SELECT keys.column_name, keys.k, COUNT(zones.row_group_id) AS groups
+        FROM keys
+        LEFT JOIN zones
+          ON zones.column_name = keys.column_name AND keys.k BETWEEN zones.lo AND zones.hi
+        GROUP BY keys.column_name, keys.k
+    )
+    SELECT column_name, AVG(groups) FROM hits GROUP BY column_name
+"""
+
+
+def scores_layout_stats() -> Dict[str, Any]:
+    """Describe how well the zone maps of ``scores`` prune key lookups.
+
+    ``track_scan`` / ``student_scan`` are the average share of row groups whose
+    min/max range still covers a single track or student, i.e. what an
+    equality filter has to read; 1.0 means no pruning at all. ``track_scan_sorted``
+    is roughly what ``track_scan`` drops to once the table is sorted.
+    """
+
+    with get_conn(True) as con:
+        rows = con.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        row_groups = con.execute(
+            "SELECT COUNT(DISTINCT row_group_id) FROM pragma_storage_info('scores')"
+        ).fetchone()[0]
+        tracks = con.execute("SELECT COUNT(DISTINCT track_id) FROM scores").fetchone()[0]
+        scans = dict(con.execute(_SCAN_SQL).fetchall())
+    groups = max(row_groups, 1)
+    # После сортировки трек занимает свою долю строк плюс в среднем одну пограничную группу
+    sorted_scan = min(1.0, 1 / max(tracks, 1) + 1 / groups)
+    return {
+        "rows": int(rows),
+        "row_groups": int(row_groups),
+        "track_scan": round(float(scans.get("track_id") or 0) / groups, 4),
+        "track_scan_sorted": round(sorted_scan, 4),
+        "student_scan": round(float(scans.get("student_id") or 0) / groups, 4),
+    }
+
+
+def _build_shadow() -> int:
+    """Copy ``scores`` into a sorted shadow table without holding the writer."""
+
+    with get_conn(False) as con:
+        con.execute(f"DROP TABLE IF EXISTS {_SHADOW}")
+        con.execute(archive.table_ddl(con, "scores", _SHADOW))
+        con.execute(f"INSERT INTO {_SHADOW} SELECT * FROM scores ORDER BY {', '.join(CLUSTER_KEY)}")
+        # fetchall, а не fetchone: недочитанный результат держит транзакцию курсора открытой,
+        # и CHECKPOINT после переключения таблиц откажет
+        return con.execute(f"SELECT COUNT(*) FROM {_SHADOW}").fetchall()[0][0]
+
+
+def _swap(con) -> Tuple[int, int]:
+    # Пока строилась копия, оценки могли добавить, поправить или удалить: доносим разницу
+    # и меняем таблицы местами в одной транзакции писателя, читатели видят либо старую, либо новую
+    stale = con.execute(
+        f"""
+        DELETE FROM {_SHADOW}
+        WHERE score_id IN (SELECT score_id FROM (SELECT * FROM {_SHADOW} EXCEPT SELECT * FROM scores))
+        """
+    ).fetchone()[0]
+    fresh = con.execute(
+        f"INSERT INTO {_SHADOW} SELECT * FROM scores EXCEPT SELECT * FROM {_SHADOW}"
+    ).fetchone()[0]
+    indexes = [
+        sql
+        for (sql,) in con.execute(
+            "SELECT sql FROM duckdb_indexes() WHERE table_name = 'scores' AND sql IS NOT NULL"
+        ).fetchall()
+    ]
+    con.execute(f"ALTER TABLE scores RENAME TO {_OLD}")
+    con.execute(f"ALTER TABLE {_SHADOW} RENAME TO scores")
+    con.execute(f"DROP TABLE {_OLD}")
+    for sql in indexes:
+        con.execute(sql)
+    return int(stale), int(fresh)
+
+
+_run_lock = threading.Lock()
+_last: Dict[str, Any] = {}
+
+
+def recluster_scores(*, force: bool = False) -> Dict[str, Any]:
+    """Rewrite ``scores`` ordered by ``(track_id, student_id, measured_at)``.
+
+    The sorted copy is built next to the live table, so reads and writes carry on
+    meanwhile; only the final catch-up and rename run on the writer thread. Without
+    ``force`` the rewrite is skipped unless sorting would cut ``track_scan`` by at
+    least ``SCORES_RECLUSTER_MIN_GAIN``. Returns a report with before/after layout stats.
+    """
+
+    started_at = now_utc()
+    if DB_BACKEND != "duckdb":
+        return {"status": "skipped", "reason": "backend", "started_at": started_at}
+    if not _run_lock.acquire(blocking=False):
+        return {"status": "skipped", "reason": "running", "started_at": started_at}
+    try:
+        before = scores_layout_stats()
+        gain = before["track_scan"] - before["track_scan_sorted"]
+        if not force and gain < SCORES_RECLUSTER_MIN_GAIN:
+            report = {"status": "skipped", "reason": "clustered", "started_at": started_at, "before": before}
+            log.info("scores recluster skipped track_scan=%s gain=%.4f", before["track_scan"], gain)
+            return _remember(report)
+
+        t0 = time.monotonic()
+        try:
+            copied = _build_shadow()
+            t1 = time.monotonic()
+            stale, fresh = run_write(_swap)
+        except Exception:
+            with get_conn(False) as con:
+                con.execute(f"DROP TABLE IF EXISTS {_SHADOW}")
+            raise
+        t2 = time.monotonic()
+        checkpoint()
+        after = scores_layout_stats()
+        report = {
+            "status": "done",
+            "started_at": started_at,
+            "finished_at": now_utc(),
+            "before": before,
+            "after": after,
+            "copied": copied,
+            "caught_up": stale + fresh,
+            "build_ms": round((t1 - t0) * 1000, 1),
+            "swap_ms": round((t2 - t1) * 1000, 1),
+        }
+        log.info(
+            "scores reclustered rows=%s row_groups=%s student_scan=%s->%s track_scan=%s->%s build_ms=%s swap_ms=%s",
+            after["rows"],
+            after["row_groups"],
+            before["student_scan"],
+            after["student_scan"],
+            before["track_scan"],
+            after["track_scan"],
+            report["build_ms"],
+            report["swap_ms"],
+        )
+        return _remember(report)
+    finally:
+        _run_lock.release()
+
+
+def _remember(report: Dict[str, Any]) -> Dict[str, Any]:
+    _last.clear()
+    _last.update(report)
+    return report
+
+
+def last_recluster() -> Optional[Dict[str, Any]]:
+    return dict(_last) if _last else None
+
+
+# --- плановый запуск ---------------------------------------------------------------
+
+_stop = threading.Event()
+_thread: threading.Thread | None = None
+_start_lock = threading.Lock()
+
+
+def _quiet_hours() -> Tuple[int, int]:
+    start, _, end = SCORES_RECLUSTER_QUIET_HOURS.partition("-")
+    return int(start) % 24, int(end or start) % 24
+
+
+def _in_quiet_hours(hour: int) -> bool:
+    start, end = _quiet_hours()
+    if start <= end:
+        return start <= hour < end
+    # Окно через полночь, например 22-4
+    return hour >= start or hour < end
+
+
+def _loop() -> None:
+    done_on: Optional[date] = None
+    while not _stop.wait(SCORES_RECLUSTER_CHECK_SECONDS):
+        now = now_utc()
+        if done_on == now.date() or not _in_quiet_hours(now.hour):
+            continue
+        try:
+            # Сначала архив: перестраивать строки, которые сейчас уедут в Parquet, незачем
+            archive.archive_cold()
+        except Exception:
+            log.exception("archive failed")
+        if not SCORES_RECLUSTER_ENABLED:
+            done_on = now.date()
+            continue
+        try:
+            report = recluster_scores()
+        except Exception:
+            log.exception("scores recluster failed")
+            report = {"status": "failed"}
+        # Не чаще раза в сутки, даже если перестройка не понадобилась или упала
+        if report.get("reason") != "running":
+            done_on = now.date()
+
+
+def start() -> None:
+    global _thread
+    if DB_BACKEND != "duckdb" or not (SCORES_RECLUSTER_ENABLED or archive.enabled()):
+        return
+    with _start_lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=_loop, name="db-maintenance", daemon=True)
+        _thread.start()
+    log.info("db maintenance scheduled quiet_hours=%s utc", SCORES_RECLUSTER_QUIET_HOURS)
+
+
+def stop() -> None:
+    _stop.set()
+    thread = _thread
+    if thread is not None and thread.is_alive():
+        # Идущую перестройку не прерываем: после stop_writer() её переключение всё равно не пройдёт
+        thread.join(timeout=5)
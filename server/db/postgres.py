@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Iterator, Optional, Sequence
+
+from ..config import (
+    POSTGRES_DSN,
+    POSTGRES_POOL_MAX,
+    POSTGRES_POOL_MIN,
+    POSTGRES_POOL_TIMEOUT,
+    POSTGRES_PREPARE_THRESHOLD,
+)
+from ..logging_utils import get_logger
+
+log = get_logger("db.postgres")
+
+__all__ = ["connection", "open_row_stream", "close_pool", "pool_stats"]
+
+_pool_lock = threading.Lock()
+_pool: Any = None
+
+
+@lru_cache(maxsize=1024)
+def _to_pyformat(sql: str) -> str:
+    """Translate DuckDB-style ``?`` placeholders to psycopg ``%s``.
+
+    Literals and quoted identifiers are left alone; a bare ``%`` is escaped.
+    """
+
+    out: list[str] = []
+    quote: Optional[str] = None
+    for ch in sql:
+        if quote:
+            out.append("%%" if ch == "%" else ch)
+            if ch == quote:
+                quote = None
+            continue
+        if ch in ("'", '"'):
+            quote = ch
+            out.append(ch)
+        elif ch == "?":
+            out.append("%s")
+        elif ch == "%":
+            out.append("%%")
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+class PgConnection:
+    """Thin adapter giving a pooled psycopg connection the DuckDB ``execute`` contract.
+
+    Repositories call ``con.execute(sql, params).fetchall()`` with ``?`` placeholders;
+    the returned psycopg cursor already exposes ``description``, ``fetchone``,
+    ``fetchall`` and ``rowcount``.
+    """
+
+    __slots__ = ("raw",)
+
+    def __init__(self, raw: Any) -> None:
+        self.raw = raw
+
+    def execute(self, sql: str, params: Sequence[Any] | None = None):
+        if params:
+            return self.raw.execute(_to_pyformat(sql), list(params))
+        return self.raw.execute(sql)
+
+    def cursor(self):
+        return self
+
+
+def _get_pool():
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            from psycopg_pool import ConnectionPool
+
+            # psycopg готовит серверный prepared statement после prepare_threshold
+            # выполнений одного текста — это и есть кеш планов на соединение
+            _pool = ConnectionPool(
+                POSTGRES_DSN,
+                min_size=POSTGRES_POOL_MIN,
+                max_size=POSTGRES_POOL_MAX,
+                timeout=POSTGRES_POOL_TIMEOUT,
+                kwargs={"autocommit": True, "prepare_threshold": POSTGRES_PREPARE_THRESHOLD},
+                check=ConnectionPool.check_connection,
+                name="neiruha",
+                open=False,
+            )
+            _pool.open(wait=True, timeout=POSTGRES_POOL_TIMEOUT)
+            log.info(
+                "postgres pool opened min=%s max=%s prepare_threshold=%s",
+                POSTGRES_POOL_MIN,
+                POSTGRES_POOL_MAX,
+                POSTGRES_PREPARE_THRESHOLD,
+            )
+    return _pool
+
+
+@contextmanager
+def connection(read_only: bool = True) -> Iterator[PgConnection]:
+    # read_only не форсируем: права разграничиваются ролью в POSTGRES_DSN
+    with _get_pool().connection() as raw:
+        yield PgConnection(raw)
+
+
+def open_row_stream(sql: str, params: Sequence[Any] | None = None):
+    """Run ``sql`` through a server-side cursor so rows arrive as they are fetched."""
+
+    from .connection import RowStream
+
+    pool = _get_pool()
+    raw = pool.getconn()
+    try:
+        # Именованный курсор живёт только внутри транзакции, а соединения пула в autocommit
+        raw.execute("BEGIN")
+        cur = raw.cursor(name=f"stream_{id(raw):x}")
+        if params:
+            cur.execute(_to_pyformat(sql), list(params))
+        else:
+            cur.execute(sql)
+    except Exception:
+        try:
+            raw.execute("ROLLBACK")
+        except Exception:
+            pass
+        pool.putconn(raw)
+        raise
+
+    def release() -> None:
+        try:
+            cur.close()
+            raw.execute("ROLLBACK")
+        finally:
+            pool.putconn(raw)
+
+    return RowStream(cur, release=release, interrupt=raw.cancel)
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+            log.info("postgres pool closed")
+
+
+def pool_stats() -> dict[str, Any]:
+    if _pool is None:
+        return {}
+    return dict(_pool.get_stats())
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import json
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from ..config import DB_BACKEND
+from ..logging_utils import get_logger
+from ..utils.time import ensure_naive_utc
+from .archive import SCORES_SOURCE
+from .connection import after_commit, dictrows, get_conn
+from .writer import run_write
+
+log = get_logger("db.profiles")
+
+# Хэш строки не зависит от порядка: суммируем хэши строк, поэтому новые оценки
+# можно проверить, не пересчитывая старые
+_ROW_HASH = "hash(s.score_id, s.metric_id, s.role_at_rate, s.raw_value, s.corrected_value, s.\"value\", s.measured_at)"
+_ROW_HASH_PG = (
+    "hashtextextended(concat_ws('|', s.score_id, s.metric_id, s.role_at_rate, s.raw_value, "
+    "s.corrected_value, s.\"value\", s.measured_at), 0)"
+)
+
+SourceState = Tuple[Optional[datetime], str]
+
+# Счётчики изменений оценок по областям (трек целиком и студент в треке). Пути записи
+# увеличивают их после коммита, и чтение серии сравнивает счётчик вместо хэша по всем оценкам
+_watermark_lock = threading.Lock()
+_watermarks: Dict[Tuple[str, Optional[str]], int] = {}
+
+
+def scores_changed(scopes: Iterable[Tuple[str, str]]) -> None:
+    """Bump the change counters of ``(track_id, student_id)`` scopes once the write commits."""
+
+    pairs = set(scopes)
+
+    def _bump() -> None:
+        with _watermark_lock:
+            for track_id, student_id in pairs:
+                for scope in ((track_id, student_id), (track_id, None)):
+                    _watermarks[scope] = _watermarks.get(scope, 0) + 1
+
+    after_commit(_bump)
+
+
+def watermark(track_id: str, student_id: Optional[str] = None) -> int:
+    """Return the change counter of a scope; it moves whenever this process writes its scores."""
+
+    with _watermark_lock:
+        return _watermarks.get((track_id, student_id), 0)
+
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    with get_conn(True) as con:
+        cur = con.execute(
+            """
+            SELECT
+                profile_id,
+                profile_type,
+                scope_kind,
+                track_id,
+                user_id,
+                CAST(data_json AS VARCHAR) AS data_json,
+                source_last_at,
+                source_hash,
+                format_version,
+                computed_at
+            FROM profiles
+            WHERE profile_id = ?
+            LIMIT 1
+            """,
+            [profile_id],
+        )
+        rows = dictrows(cur)
+    if not rows:
+        return None
+    row = rows[0]
+    row["data"] = json.loads(row.pop("data_json"))
+    return row
+
+
+def source_state(
+    track_id: str,
+    *,
+    student_id: Optional[str] = None,
+    cutoff: Optional[datetime] = None,
+) -> Tuple[SourceState, Optional[str]]:
+    """Return ``((max measured_at, content hash), hash of rows up to cutoff)`` for a scope.
+
+    The hash is ``"<count>:<sum of row hashes>"``. With ``cutoff`` the second value is
+    the same hash over ``measured_at <= cutoff``: when it still matches a stored hash,
+    old scores are untouched and only rows past the cutoff need to be merged in.
+    """
+
+    row_hash = _ROW_HASH_PG if DB_BACKEND == "postgres" else _ROW_HASH
+    where = ["s.track_id = ?"]
+    if student_id:
+        where.append("s.student_id = ?")
+    prefix = "s.measured_at <= ?"
+
+    sql = f"""
+        SELECT
+            MAX(s.measured_at),
+            COUNT(*),
+            CAST(COALESCE(SUM({row_hash}), 0) AS VARCHAR),
+            COUNT(*) FILTER (WHERE {prefix}),
+            CAST(COALESCE(SUM({row_hash}) FILTER (WHERE {prefix}), 0) AS VARCHAR)
+        FROM {SCORES_SOURCE} s
+        WHERE {' AND '.join(where)}
+    """
+    cutoff_param = ensure_naive_utc(cutoff) if cutoff else None
+    params = [cutoff_param, cutoff_param, track_id]
+    if student_id:
+        params.append(student_id)
+
+    with get_conn(True) as con:
+        last_at, total, total_sum, head, head_sum = con.execute(sql, params).fetchone()
+    head_hash = f"{head}:{head_sum}" if cutoff else None
+    return (last_at, f"{total}:{total_sum}"), head_hash
+
+
+def upsert_profile(
+    *,
+    profile_id: str,
+    profile_type: str,
+    scope_kind: str,
+    track_id: Optional[str],
+    user_id: Optional[str],
+    data: Dict[str, Any],
+    source_last_at: Optional[datetime],
+    source_hash: str,
+    format_version: str,
+) -> None:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+    run_write(
+        lambda con: con.execute(
+            """
+            INSERT INTO profiles (
+                profile_id,
+                profile_type,
+                scope_kind,
+                track_id,
+                user_id,
+                data_json,
+                source_last_at,
+                source_hash,
+                format_version
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (profile_id) DO UPDATE SET
+                data_json = excluded.data_json,
+                source_last_at = excluded.source_last_at,
+                source_hash = excluded.source_hash,
+                format_version = excluded.format_version,
+                computed_at = excluded.computed_at,
+                updated_at = excluded.updated_at
+            """,
+            [
+                profile_id,
+                profile_type,
+                scope_kind,
+                track_id,
+                user_id,
+                payload,
+                ensure_naive_utc(source_last_at) if source_last_at else None,
+                source_hash,
+                format_version,
+            ],
+        )
+    )
+    log.info("Materialized profile %s hash=%s", profile_id, source_hash)
@@ -1,15 +1,34 @@
 from __future__ import annotations
 
+import glob
+import json
 import os
 import re
 import shutil
 import threading
-from typing import Any, List, Sequence, Tuple
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
 import duckdb
 
-from ..config import DUCKDB_PATH, SANDBOX_DUCKDB_PATH
+from ..config import (
+    DUCKDB_PATH,
+    SANDBOX_CACHE_MAX_BYTES,
+    SANDBOX_CACHE_MAX_ENTRY_BYTES,
+    SANDBOX_DUCKDB_PATH,
+    SANDBOX_JOB_MAX_ESTIMATED_ROWS,
+    SANDBOX_MAX_BYTES,
+    SANDBOX_MAX_ESTIMATED_ROWS,
+    SANDBOX_MAX_ROWS,
+    SANDBOX_POOL_SIZE,
+    SANDBOX_REFRESH_SECONDS,
+    SANDBOX_TIMEOUT_SECONDS,
+)
+from .connection import checkpoint
 from ..logging_utils import get_logger
+from ..utils.cache import SizedLRUCache
 
 log = get_logger("db.sandbox")
 
@@ -17,9 +36,118 @@ _SQL_PREFIX_PATTERN = re.compile(r"^(\s*)(select|with)\b", re.IGNORECASE | re.DO
 _FORBIDDEN_PATTERN = re.compile(r"\b(attach|copy|pragma|export)\b", re.IGNORECASE)
 _COMMENT_PATTERN = re.compile(r"--|/\*")
 
-_cache_lock = threading.Lock()
-_exec_lock = threading.Lock()
-_cache: dict[str, Any] = {"src_mtime": None, "con": None}
+# ioctl FICLONE: copy-on-write клон файла на btrfs/xfs/overlayfs — мгновенно и без лишнего места
+_FICLONE = 0x40049409
+
+_FETCH_CHUNK_ROWS = 1000
+_ARROW_BATCH_ROWS = 65536
+_QUOTED_PATTERN = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+# Для этих соединений (декартово и по неравенству) DuckDB сильно занижает оценку выхода,
+# поэтому их стоимость — произведение входов
+_PAIRWISE_OPERATORS = {"CROSS_PRODUCT", "NESTED_LOOP_JOIN", "BLOCKWISE_NL_JOIN", "PIECEWISE_MERGE_JOIN", "IE_JOIN"}
+# Результат таких запросов зависит не только от данных снимка — их не кэшируем
+_VOLATILE_PATTERN = re.compile(
+    r"\b(random|setseed|uuid|gen_random_uuid|now|today|current_date|current_time|current_timestamp"
+    r"|get_current_time|get_current_timestamp|transaction_timestamp|nextval|currval)\b",
+    re.IGNORECASE,
+)
+_SLOT_POLL_SECONDS = 0.1
+
+
+class SandboxTimeoutError(RuntimeError):
+    """Raised when a sandbox query runs (or waits for a slot) longer than its timeout."""
+
+
+class SandboxCancelledError(RuntimeError):
+    """Raised when a sandbox query is cancelled from outside, e.g. the client went away."""
+
+
+class QueryTooExpensiveError(ValueError):
+    """Raised when the plan of a query is estimated to touch more rows than allowed."""
+
+    def __init__(self, estimated_rows: int, operator: str, limit: int) -> None:
+        super().__init__(f"Estimated {estimated_rows} rows at {operator}, limit is {limit}")
+        self.estimated_rows = estimated_rows
+        self.operator = operator
+        self.limit = limit
+
+
+class QueryControl:
+    """Deadline and cancel switch for one sandbox query.
+
+    The clock starts when the control is created, so waiting for a pool slot counts
+    against the timeout. ``cancel()`` may be called from any thread at any point; a
+    running query is stopped with ``interrupt()`` on its cursor.
+    """
+
+    def __init__(self, timeout: Optional[float] = None) -> None:
+        self.timeout = SANDBOX_TIMEOUT_SECONDS if timeout is None else timeout
+        self.started = time.monotonic()
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._interrupt = None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+            interrupt = self._interrupt
+        if interrupt is not None:
+            try:
+                interrupt()
+            except Exception:  # pragma: no cover - defensive
+                pass
+
+    def remaining(self) -> Optional[float]:
+        if self.timeout <= 0:
+            return None
+        return self.timeout - (time.monotonic() - self.started)
+
+    def check(self) -> None:
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            with self._lock:
+                if self.reason is None:
+                    self.reason = "timeout"
+        if self.reason == "timeout":
+            raise SandboxTimeoutError(f"Query exceeded {self.timeout:g} s")
+        if self.reason is not None:
+            raise SandboxCancelledError(f"Query cancelled: {self.reason}")
+
+    @contextmanager
+    def running(self, cursor) -> Iterator[None]:
+        with self._lock:
+            self._interrupt = cursor.interrupt
+        timer = None
+        try:
+            self.check()
+            remaining = self.remaining()
+            if remaining is not None:
+                timer = threading.Timer(remaining, self.cancel, args=("timeout",))
+                timer.daemon = True
+                timer.start()
+            yield
+        except duckdb.InterruptException:
+            self.check()
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            with self._lock:
+                self._interrupt = None
+
+
+@dataclass(slots=True)
+class SelectResult:
+    columns: List[str]
+    rows: List[Tuple[Any, ...]]
+    truncated: bool = False
+    truncated_by: Optional[str] = None  # "rows" | "bytes"
+    nbytes: int = 0
+    cached: bool = False
+    profile: Optional[Dict[str, Any]] = None
+    table: Any = None  # pyarrow.Table, если запрошен Arrow — тогда rows пуст
 
 
 def _validate_sql(sql: str) -> None:
@@ -36,50 +164,583 @@ def _validate_sql(sql: str) -> None:
         raise ValueError("Forbidden statement in SQL")
 
 
-def _ensure_copy_locked(src_mtime: float) -> duckdb.DuckDBPyConnection:
-    existing = _cache.get("src_mtime")
-    con = _cache.get("con")
-    sandbox_path = SANDBOX_DUCKDB_PATH
+def _source_mtime() -> float:
+    # Свежие записи общего handle лежат в WAL, пока не случится checkpoint
+    src_mtime = os.path.getmtime(DUCKDB_PATH)
+    wal_path = f"{DUCKDB_PATH}.wal"
+    if os.path.exists(wal_path):
+        src_mtime = max(src_mtime, os.path.getmtime(wal_path))
+    return src_mtime
 
-    need_refresh = (
-        con is None
-        or existing != src_mtime
-        or not os.path.exists(sandbox_path)
-    )
 
-    if not need_refresh:
-        return con
+def _clone_file(src: str, dst: str) -> str:
+    """Copy ``src`` to ``dst`` as a reflink when the filesystem allows it, else byte by byte.
+
+    A hard link is not an option: DuckDB rewrites blocks of the live file in place, so
+    a linked "snapshot" would change under running queries.
+    """
+
+    try:
+        import fcntl
 
-    if con is not None:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        return "reflink"
+    except (ImportError, OSError):
+        shutil.copyfile(src, dst)
+        return "copy"
+
+
+def _remove_file(path: str) -> None:
+    for name in (path, f"{path}.wal"):
         try:
-            con.close()
-        except Exception:  # pragma: no cover - defensive
+            os.remove(name)
+        except FileNotFoundError:
             pass
+        except OSError as e:
+            log.warning("Sandbox snapshot cleanup failed path=%s: %s", name, e)
 
-    os.makedirs(os.path.dirname(sandbox_path), exist_ok=True)
-    shutil.copy2(DUCKDB_PATH, sandbox_path)
-    new_con = duckdb.connect(sandbox_path, read_only=True)
-    _cache["con"] = new_con
-    _cache["src_mtime"] = src_mtime
-    log.info("Sandbox copy refreshed from %s", DUCKDB_PATH)
-    return new_con
 
+class _Snapshot:
+    """One read-only copy of the database with its idle cursors.
 
-def ensure_copy_up_to_date() -> duckdb.DuckDBPyConnection:
-    if not os.path.exists(DUCKDB_PATH):
-        raise FileNotFoundError(f"Source database not found: {DUCKDB_PATH}")
+    The snapshot is retired when a newer one replaces it, but its connection and file
+    live until the last query that borrowed a cursor from it returns it.
+    """
 
-    src_mtime = os.path.getmtime(DUCKDB_PATH)
-    with _cache_lock:
-        return _ensure_copy_locked(src_mtime)
+    def __init__(self, path: str, src_mtime: float, generation: int) -> None:
+        self.path = path
+        self.src_mtime = src_mtime
+        self.generation = generation
+        self.created_at = time.monotonic()
+        self.con = duckdb.connect(path, read_only=True)
+        self._lock = threading.Lock()
+        self._idle: List[Any] = []
+        self._in_use = 0
+        self._retired = False
+
+    def acquire(self):
+        with self._lock:
+            self._in_use += 1
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return self.con.cursor()
+        except Exception:
+            self.release(None)
+            raise
+
+    def release(self, cursor, *, broken: bool = False) -> None:
+        with self._lock:
+            self._in_use -= 1
+            if cursor is not None and not broken and not self._retired:
+                self._idle.append(cursor)
+                cursor = None
+            close = self._retired and self._in_use == 0
+        if cursor is not None:
+            _close_quietly(cursor)
+        if close:
+            self._close()
+
+    def retire(self) -> None:
+        with self._lock:
+            self._retired = True
+            close = self._in_use == 0
+        if close:
+            self._close()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def _close(self) -> None:
+        for cursor in self._idle:
+            _close_quietly(cursor)
+        self._idle.clear()
+        _close_quietly(self.con)
+        _remove_file(self.path)
+        log.info("Sandbox snapshot retired generation=%s", self.generation)
+
+
+def _close_quietly(con) -> None:
+    try:
+        con.close()
+    except Exception:  # pragma: no cover - defensive
+        pass
+
+
+class _SnapshotManager:
+    """Keeps the current sandbox snapshot fresh and hands out cursors over it.
+
+    A new snapshot is taken only when the primary file changed and the current one is
+    older than ``SANDBOX_REFRESH_SECONDS``. While one request refreshes, the others keep
+    querying the current snapshot; only the very first snapshot blocks. At most
+    ``SANDBOX_POOL_SIZE`` queries run at once, each on its own cursor.
+    """
+
+    def __init__(self, pool_size: int, refresh_seconds: float) -> None:
+        self._current: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, pool_size))
+        self._pool_size = max(1, pool_size)
+        self._refresh_seconds = refresh_seconds
+        self._generation = 0
+        self._stats: Dict[str, Any] = {
+            "refreshes": 0,
+            "refresh_ms_last": 0.0,
+            "method": None,
+            "queries": 0,
+            "timeouts": 0,
+            "cancelled": 0,
+            "truncated": 0,
+            "rejected": 0,
+        }
+
+    def _snapshot_path(self, generation: int) -> str:
+        root, ext = os.path.splitext(SANDBOX_DUCKDB_PATH)
+        return f"{root}.{generation}{ext or '.duckdb'}"
+
+    def _cleanup_stale(self) -> None:
+        # Снимки прошлых запусков процесса: открытых соединений к ним уже нет
+        root, ext = os.path.splitext(SANDBOX_DUCKDB_PATH)
+        for path in glob.glob(f"{glob.escape(root)}.*{ext or '.duckdb'}"):
+            _remove_file(path)
+        if os.path.exists(SANDBOX_DUCKDB_PATH):
+            _remove_file(SANDBOX_DUCKDB_PATH)
+
+    def _take(self) -> _Snapshot:
+        started = time.monotonic()
+        if self._generation == 0:
+            self._cleanup_stale()
+        self._generation += 1
+        path = self._snapshot_path(self._generation)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        checkpoint()
+        # checkpoint сам двигает mtime, поэтому запоминаем значение после него
+        src_mtime = _source_mtime()
+        method = _clone_file(DUCKDB_PATH, path)
+        try:
+            snapshot = _Snapshot(path, src_mtime, self._generation)
+        except Exception:
+            _remove_file(path)
+            raise
+        elapsed = (time.monotonic() - started) * 1000
+        self._stats.update(method=method, refresh_ms_last=round(elapsed, 1))
+        self._stats["refreshes"] += 1
+        log.info(
+            "Sandbox snapshot taken generation=%s method=%s ms=%.1f from %s",
+            self._generation,
+            method,
+            elapsed,
+            DUCKDB_PATH,
+        )
+        return snapshot
+
+    def _refresh_if_due(self) -> None:
+        current = self._current
+        if current is not None and os.path.exists(current.path):
+            if current.src_mtime == _source_mtime():
+                return
+            if time.monotonic() - current.created_at < self._refresh_seconds:
+                return
+        # Обновляет один поток; остальные, если снимок уже есть, не ждут его
+        if not self._refresh_lock.acquire(blocking=current is None):
+            return
+        try:
+            if self._current is not current:
+                return
+            fresh = self._take()
+            with self._lock:
+                previous, self._current = self._current, fresh
+            if previous is not None:
+                previous.retire()
+        finally:
+            self._refresh_lock.release()
+
+    def _acquire_slot(self, control: Optional[QueryControl]) -> None:
+        if control is None:
+            self._slots.acquire()
+            return
+        while not self._slots.acquire(timeout=_SLOT_POLL_SECONDS):
+            control.check()
+
+    def generation(self) -> int:
+        """Return the generation queries would run on now, taking a new snapshot if one is due."""
+
+        if not os.path.exists(DUCKDB_PATH):
+            raise FileNotFoundError(f"Source database not found: {DUCKDB_PATH}")
+        self._refresh_if_due()
+        current = self._current
+        return current.generation if current else 0
+
+    @contextmanager
+    def cursor(self, control: Optional[QueryControl] = None) -> Iterator[Tuple[int, Any]]:
+        """Yield ``(snapshot generation, cursor)`` for one query."""
+
+        if not os.path.exists(DUCKDB_PATH):
+            raise FileNotFoundError(f"Source database not found: {DUCKDB_PATH}")
+        self._acquire_slot(control)
+        try:
+            self._refresh_if_due()
+            with self._lock:
+                snapshot = self._current
+                cur = snapshot.acquire()
+            self._stats["queries"] += 1
+            broken = False
+            try:
+                yield snapshot.generation, cur
+            except BaseException:
+                # После ошибки курсор может держать полуоткрытый результат — в пул его не возвращаем
+                broken = True
+                raise
+            finally:
+                snapshot.release(cur, broken=broken)
+        finally:
+            self._slots.release()
+
+    def count(self, key: str) -> None:
+        self._stats[key] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        current = self._current
+        return {
+            **self._stats,
+            "generation": current.generation if current else 0,
+            "in_use": current.in_use if current else 0,
+            "pool_size": self._pool_size,
+            "age_seconds": round(time.monotonic() - current.created_at, 1) if current else None,
+        }
 
+    def close(self) -> None:
+        with self._lock:
+            current, self._current = self._current, None
+        if current is not None:
+            current.retire()
+
+
+_manager = _SnapshotManager(SANDBOX_POOL_SIZE, SANDBOX_REFRESH_SECONDS)
+_results: SizedLRUCache[Tuple[Any, ...], SelectResult] = SizedLRUCache(
+    SANDBOX_CACHE_MAX_BYTES, SANDBOX_CACHE_MAX_ENTRY_BYTES
+)
+_results_generation = 0
+_results_lock = threading.Lock()
+
+
+def _normalize_sql(sql: str) -> str:
+    # Пробелы схлопываются только вне строковых литералов и идентификаторов в кавычках
+    parts = _QUOTED_PATTERN.split(sql.strip())
+    return "".join(part if i % 2 else _WHITESPACE_PATTERN.sub(" ", part) for i, part in enumerate(parts))
+
+
+def _cache_key(
+    generation: int, sql: str, params: Sequence[Any], max_rows: int, max_bytes: int, arrow: bool
+) -> Optional[Tuple[Any, ...]]:
+    if not _results.enabled or _VOLATILE_PATTERN.search(sql):
+        return None
+    try:
+        params_key = json.dumps(list(params), sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+    return (generation, _normalize_sql(sql), params_key, max_rows, max_bytes, arrow)
+
+
+def _sync_results_generation(generation: int) -> None:
+    # Результаты прежнего снимка больше никому не достанутся — освобождаем память сразу
+    global _results_generation
+    with _results_lock:
+        if generation > _results_generation:
+            _results_generation = generation
+            _results.clear()
+
+
+def _row_bytes(row: Sequence[Any]) -> int:
+    # Грубая оценка размера строки в JSON-ответе: текст значений плюс кавычки и разделители
+    return sum(len(str(value)) for value in row) + 3 * len(row)
+
+
+def _plan_operators(node: Dict[str, Any], depth: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+    """Flatten one EXPLAIN (FORMAT JSON) node; return its output estimate and the operator list.
+
+    Every operator gets ``estimated_rows`` (DuckDB's estimate, or the largest child's
+    when it has none) and ``cost``: the estimate, or the product of both inputs for
+    pairwise joins.
+    """
+
+    children = [_plan_operators(child, depth + 1) for child in node.get("children", [])]
+    extra = node.get("extra_info") or {}
+    estimate = extra.get("Estimated Cardinality") if isinstance(extra, dict) else None
+    rows = int(estimate) if estimate not in (None, "") else max((c[0] for c in children), default=0)
+    cost = rows
+    if node.get("name") in _PAIRWISE_OPERATORS and len(children) == 2:
+        cost = max(cost, children[0][0] * children[1][0])
+    operators = [{"depth": depth, "name": node.get("name", ""), "estimated_rows": rows, "cost": cost}]
+    for _, child_operators in children:
+        operators.extend(child_operators)
+    return rows, operators
+
+
+def _explain(cur, sql: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
+    plan = json.loads(cur.execute(f"EXPLAIN (FORMAT JSON) {sql}", params).fetchall()[0][1])
+    operators: List[Dict[str, Any]] = []
+    for root in plan:
+        operators.extend(_plan_operators(root)[1])
+    return operators
+
+
+def _costliest(operators: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # При равной стоимости называем самый глубокий оператор — источник, а не проекцию над ним
+    return max(operators, key=lambda op: (op["cost"], op["depth"]))
+
+
+def _check_cost(operators: List[Dict[str, Any]], limit: int) -> None:
+    if limit <= 0 or not operators:
+        return
+    worst = _costliest(operators)
+    if worst["cost"] > limit:
+        _manager.count("rejected")
+        raise QueryTooExpensiveError(worst["cost"], worst["name"], limit)
+
+
+def _profile_summary(raw: str) -> Dict[str, Any]:
+    info = json.loads(raw)
+    operators: List[Dict[str, Any]] = []
+
+    def walk(node: Dict[str, Any], depth: int) -> None:
+        extra = node.get("extra_info") or {}
+        estimate = extra.get("Estimated Cardinality") if isinstance(extra, dict) else None
+        operators.append(
+            {
+                "depth": depth,
+                "name": node.get("operator_name") or node.get("operator_type", ""),
+                "rows": int(node.get("operator_cardinality") or 0),
+                "estimated_rows": int(estimate) if estimate not in (None, "") else None,
+                "time_ms": round(float(node.get("operator_timing") or 0) * 1000, 3),
+            }
+        )
+        for child in node.get("children", []):
+            walk(child, depth + 1)
+
+    for child in info.get("children", []):
+        walk(child, 0)
+    return {
+        "latency_ms": round(float(info.get("latency") or 0) * 1000, 3),
+        "cpu_ms": round(float(info.get("cpu_time") or 0) * 1000, 3),
+        "rows_scanned": int(info.get("cumulative_rows_scanned") or 0),
+        "peak_memory_bytes": int(info.get("system_peak_buffer_memory") or 0),
+        "operators": operators,
+    }
+
+
+def _fetch_capped(
+    cur, control: QueryControl, max_rows: int, max_bytes: int
+) -> Tuple[List[Tuple[Any, ...]], Optional[str], int]:
+    # Строки остаются кортежами DuckDB: лишней копии в list на каждую строку не делаем
+    rows: List[Tuple[Any, ...]] = []
+    size = 0
+    while True:
+        control.check()
+        chunk = cur.fetchmany(_FETCH_CHUNK_ROWS)
+        if not chunk:
+            return rows, None, size
+        for row in chunk:
+            if max_rows > 0 and len(rows) >= max_rows:
+                return rows, "rows", size
+            row_size = _row_bytes(row)
+            if max_bytes > 0 and size + row_size > max_bytes:
+                return rows, "bytes", size
+            size += row_size
+            rows.append(row)
+
+
+def _fetch_arrow_capped(cur, control: QueryControl, max_rows: int, max_bytes: int):
+    """Collect the result as a pyarrow Table, cut at ``max_rows`` rows or ``max_bytes`` of Arrow buffers."""
+
+    import pyarrow as pa
+
+    # to_arrow_reader появился в новых DuckDB, fetch_record_batch — его прежнее имя
+    reader = (getattr(cur, "to_arrow_reader", None) or cur.fetch_record_batch)(_ARROW_BATCH_ROWS)
+    batches = []
+    rows = size = 0
+    truncated_by: Optional[str] = None
+    while truncated_by is None:
+        control.check()
+        try:
+            batch = reader.read_next_batch()
+        except StopIteration:
+            break
+        if not batch.num_rows:
+            continue
+        if max_rows > 0 and rows + batch.num_rows > max_rows:
+            batch, truncated_by = batch.slice(0, max_rows - rows), "rows"
+        if max_bytes > 0 and size + batch.nbytes > max_bytes:
+            # Сколько строк порции влезает при среднем размере строки в ней
+            fits = (max_bytes - size) * batch.num_rows // max(batch.nbytes, 1)
+            batch, truncated_by = batch.slice(0, fits), "bytes"
+        rows += batch.num_rows
+        size += batch.nbytes
+        batches.append(batch)
+    return pa.Table.from_batches(batches, schema=reader.schema), truncated_by, size
+
+
+def select(
+    sql: str,
+    params: Sequence[Any] | None = None,
+    *,
+    control: Optional[QueryControl] = None,
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    use_cache: bool = True,
+    profile: bool = False,
+    max_estimated_rows: Optional[int] = None,
+    arrow: bool = False,
+) -> SelectResult:
+    """Run a read-only query on the current snapshot.
+
+    The result is read in chunks and stops at ``max_rows`` rows or roughly ``max_bytes``
+    of JSON (``SANDBOX_MAX_ROWS`` / ``SANDBOX_MAX_BYTES`` by default, 0 = no cap); the
+    rest is not computed. Raises ``SandboxTimeoutError`` / ``SandboxCancelledError``
+    when ``control`` stops the query.
+
+    Results are cached per snapshot generation, normalized SQL, params and caps, so a
+    repeated query is answered without DuckDB until the next snapshot; queries calling
+    volatile functions (``random()``, ``now()``, ...) always run.
+
+    Before running, the query is planned with ``EXPLAIN`` and refused with
+    ``QueryTooExpensiveError`` if any operator is estimated above ``max_estimated_rows``
+    (``SANDBOX_MAX_ESTIMATED_ROWS``). With ``profile`` the cache is skipped and DuckDB's
+    per-operator timings and row counts are returned in ``SelectResult.profile``.
+
+    With ``arrow`` the result comes back as ``SelectResult.table`` (a pyarrow Table
+    built from DuckDB's record batches, no Python row objects) and ``max_bytes`` caps
+    its Arrow buffers instead of the JSON estimate.
+    """
 
-def select(sql: str, params: Sequence[Any] | None = None) -> Tuple[List[str], List[List[Any]]]:
     _validate_sql(sql)
-    with _exec_lock:
-        con = ensure_copy_up_to_date()
-        cur = con.execute(sql, params or [])
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-    normalized_rows = [list(row) for row in rows]
-    return columns, normalized_rows
+    limit = SANDBOX_MAX_ESTIMATED_ROWS if max_estimated_rows is None else max_estimated_rows
+    use_cache = use_cache and not profile
+    control = control or QueryControl()
+    max_rows = SANDBOX_MAX_ROWS if max_rows is None else max_rows
+    max_bytes = SANDBOX_MAX_BYTES if max_bytes is None else max_bytes
+    params = params or []
+    if use_cache and _results.enabled:
+        generation = _manager.generation()
+        _sync_results_generation(generation)
+        key = _cache_key(generation, sql, params, max_rows, max_bytes, arrow)
+        hit = _results.get(key) if key is not None else None
+        if hit is not None:
+            return SelectResult(
+                columns=hit.columns,
+                rows=hit.rows,
+                truncated=hit.truncated,
+                truncated_by=hit.truncated_by,
+                nbytes=hit.nbytes,
+                cached=True,
+                table=hit.table,
+            )
+    try:
+        with _manager.cursor(control) as (generation, cur), control.running(cur):
+            _check_cost(_explain(cur, sql, params), limit)
+            if profile:
+                cur.execute("SET enable_profiling = 'no_output'")
+            try:
+                cur.execute(sql, params)
+                columns = [desc[0] for desc in cur.description]
+                if arrow:
+                    table, truncated_by, nbytes = _fetch_arrow_capped(cur, control, max_rows, max_bytes)
+                    rows = []
+                else:
+                    table = None
+                    rows, truncated_by, nbytes = _fetch_capped(cur, control, max_rows, max_bytes)
+                profiled = _profile_summary(cur.get_profiling_information(format="json")) if profile else None
+            finally:
+                if profile:
+                    cur.disable_profiling()
+    except SandboxTimeoutError:
+        _manager.count("timeouts")
+        log.warning("Sandbox query timed out after %.1f s", time.monotonic() - control.started)
+        raise
+    except SandboxCancelledError:
+        _manager.count("cancelled")
+        log.info("Sandbox query cancelled reason=%s", control.reason)
+        raise
+    if truncated_by is not None:
+        _manager.count("truncated")
+    result = SelectResult(
+        columns=columns,
+        rows=rows,
+        truncated=truncated_by is not None,
+        truncated_by=truncated_by,
+        nbytes=nbytes,
+        profile=profiled,
+        table=table,
+    )
+    if use_cache:
+        # Ключ строится по поколению, на котором запрос реально выполнился
+        key = _cache_key(generation, sql, params, max_rows, max_bytes, arrow)
+        if key is not None and generation >= _results_generation:
+            _results.put(key, result, nbytes)
+    return result
+
+
+def explain(
+    sql: str, params: Sequence[Any] | None = None, *, max_estimated_rows: Optional[int] = None
+) -> Dict[str, Any]:
+    """Plan a query without running it; report its operators and whether the cost guard lets it through."""
+
+    _validate_sql(sql)
+    limit = SANDBOX_MAX_ESTIMATED_ROWS if max_estimated_rows is None else max_estimated_rows
+    control = QueryControl()
+    with _manager.cursor(control) as (_, cur), control.running(cur):
+        operators = _explain(cur, sql, list(params or []))
+    worst = _costliest(operators) if operators else None
+    return {
+        "operators": operators,
+        "estimated_rows": worst["cost"] if worst else 0,
+        "costliest_operator": worst["name"] if worst else None,
+        "limit": limit,
+        "allowed": limit <= 0 or worst is None or worst["cost"] <= limit,
+    }
+
+
+def spill_parquet(
+    sql: str,
+    params: Sequence[Any] | None,
+    path: str,
+    *,
+    control: Optional[QueryControl] = None,
+    max_estimated_rows: Optional[int] = None,
+) -> Tuple[List[str], int]:
+    """Write the whole result of a read-only query to a Parquet file; return its columns and row count.
+
+    DuckDB streams the result straight into the file, so nothing is held in Python. The
+    file appears under ``path`` only once it is complete. The cost guard uses
+    ``SANDBOX_JOB_MAX_ESTIMATED_ROWS`` by default.
+    """
+
+    _validate_sql(sql)
+    limit = SANDBOX_JOB_MAX_ESTIMATED_ROWS if max_estimated_rows is None else max_estimated_rows
+    control = control or QueryControl()
+    partial = f"{path}.part"
+    try:
+        with _manager.cursor(control) as (_, cur), control.running(cur):
+            _check_cost(_explain(cur, sql, list(params or [])), limit)
+            relation = cur.sql(sql, params=list(params or []))
+            columns = list(relation.columns)
+            relation.to_parquet(partial)
+            rows = cur.execute(
+                "SELECT COALESCE(SUM(num_rows), 0) FROM parquet_file_metadata(?)", [partial]
+            ).fetchall()[0][0]
+    except BaseException:
+        _remove_file(partial)
+        raise
+    os.replace(partial, path)
+    return columns, int(rows)
+
+
+def sandbox_stats() -> Dict[str, Any]:
+    return {**_manager.stats(), "cache": _results.stats()}
+
+
+def close_sandbox() -> None:
+    _manager.close()
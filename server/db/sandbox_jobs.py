@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import duckdb
+
+from ..config import (
+    SANDBOX_JOB_DIR,
+    SANDBOX_JOB_QUEUE_MAX,
+    SANDBOX_JOB_TIMEOUT_SECONDS,
+    SANDBOX_JOB_TTL_SECONDS,
+    SANDBOX_JOB_WORKERS,
+)
+from ..logging_utils import get_logger
+from ..utils.ids import new_id
+from ..utils.time import now_utc
+from . import sandbox
+
+log = get_logger("db.sandbox_jobs")
+
+__all__ = [
+    "JobQueueFullError",
+    "SandboxJob",
+    "submit",
+    "get_job",
+    "list_jobs",
+    "cancel",
+    "read_page",
+    "result_path",
+    "stop",
+]
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+_ACTIVE = (QUEUED, RUNNING)
+
+_ROOT = Path(SANDBOX_JOB_DIR).resolve()
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when ``SANDBOX_JOB_QUEUE_MAX`` jobs are already queued or running."""
+
+
+@dataclass(slots=True)
+class SandboxJob:
+    job_id: str
+    sql: str
+    params: List[Any]
+    status: str = QUEUED
+    submitted_at: datetime = field(default_factory=now_utc)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    queue_ms: Optional[float] = None
+    run_ms: Optional[float] = None
+    columns: List[str] = field(default_factory=list)
+    row_count: Optional[int] = None
+    file_bytes: Optional[int] = None
+    error: Optional[str] = None
+    control: Optional[sandbox.QueryControl] = None
+    future: Optional[Future] = None
+    enqueued: float = field(default_factory=time.monotonic)
+    expires: Optional[float] = None
+
+    @property
+    def path(self) -> Path:
+        return _ROOT / f"{self.job_id}.parquet"
+
+
+_lock = threading.Lock()
+_jobs: Dict[str, SandboxJob] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+# Результаты читаются из Parquet отдельной in-memory базой, снимок для этого не нужен
+_reader = duckdb.connect()
+
+
+def _ensure_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Файлы прошлых запусков: заданий, которым они принадлежали, в памяти уже нет
+        _ROOT.mkdir(parents=True, exist_ok=True)
+        for path in _ROOT.glob("*.parquet*"):
+            path.unlink(missing_ok=True)
+        _executor = ThreadPoolExecutor(max_workers=max(1, SANDBOX_JOB_WORKERS), thread_name_prefix="sandbox-job")
+    return _executor
+
+
+def _finish(job: SandboxJob, status: str, error: Optional[str] = None) -> None:
+    job.status = status
+    job.error = error
+    job.finished_at = now_utc()
+    job.expires = time.monotonic() + SANDBOX_JOB_TTL_SECONDS
+
+
+def _expire_locked() -> None:
+    now = time.monotonic()
+    for job_id in [job_id for job_id, job in _jobs.items() if job.expires is not None and job.expires <= now]:
+        _jobs.pop(job_id).path.unlink(missing_ok=True)
+
+
+def _run(job: SandboxJob) -> None:
+    with _lock:
+        if job.status != QUEUED:
+            return
+        job.control = sandbox.QueryControl(SANDBOX_JOB_TIMEOUT_SECONDS)
+        job.status = RUNNING
+        job.started_at = now_utc()
+        job.queue_ms = round((time.monotonic() - job.enqueued) * 1000, 1)
+    started = time.monotonic()
+    status, error = DONE, None
+    try:
+        columns, rows = sandbox.spill_parquet(job.sql, job.params, str(job.path), control=job.control)
+    except sandbox.SandboxCancelledError:
+        status = CANCELLED
+    except Exception as exc:
+        status, error = FAILED, str(exc)
+    with _lock:
+        job.run_ms = round((time.monotonic() - started) * 1000, 1)
+        if status == DONE:
+            job.columns = columns
+            job.row_count = rows
+            job.file_bytes = job.path.stat().st_size
+        _finish(job, status, error)
+    log.info(
+        "Sandbox job %s status=%s rows=%s queue_ms=%s run_ms=%s%s",
+        job.job_id,
+        status,
+        job.row_count,
+        job.queue_ms,
+        job.run_ms,
+        f" error={error}" if error else "",
+    )
+
+
+def submit(sql: str, params: Optional[List[Any]] = None) -> SandboxJob:
+    """Queue ``sql`` to run on the sandbox snapshot; its result is spilled to Parquet.
+
+    Raises ``ValueError`` for SQL the sandbox rejects and ``JobQueueFullError`` when the
+    queue is full.
+    """
+
+    sandbox._validate_sql(sql)
+    executor = _ensure_executor()
+    with _lock:
+        _expire_locked()
+        if sum(1 for job in _jobs.values() if job.status in _ACTIVE) >= SANDBOX_JOB_QUEUE_MAX:
+            raise JobQueueFullError(f"At most {SANDBOX_JOB_QUEUE_MAX} sandbox jobs may be queued")
+        job = SandboxJob(job_id=new_id("job_"), sql=sql, params=list(params or []))
+        _jobs[job.job_id] = job
+        job.future = executor.submit(_run, job)
+    log.info("Sandbox job %s queued", job.job_id)
+    return job
+
+
+def get_job(job_id: str) -> Optional[SandboxJob]:
+    with _lock:
+        _expire_locked()
+        return _jobs.get(job_id)
+
+
+def list_jobs() -> List[SandboxJob]:
+    with _lock:
+        _expire_locked()
+        return sorted(_jobs.values(), key=lambda job: job.submitted_at, reverse=True)
+
+
+def cancel(job_id: str) -> Optional[SandboxJob]:
+    """Cancel a queued or running job, or drop a finished one together with its result."""
+
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status == QUEUED:
+            if job.future is not None:
+                job.future.cancel()
+            _finish(job, CANCELLED)
+            return job
+        if job.status == RUNNING:
+            control = job.control
+        else:
+            _jobs.pop(job_id)
+            job.path.unlink(missing_ok=True)
+            job.expires = time.monotonic()
+            return job
+    # Запрос остановится в своём потоке, статус выставит _run
+    control.cancel("cancelled by request")
+    return job
+
+
+def result_path(job: SandboxJob) -> Optional[Path]:
+    return job.path if job.status == DONE and job.path.exists() else None
+
+
+def read_page(job: SandboxJob, offset: int, limit: int) -> Tuple[List[str], List[List[Any]]]:
+    path = result_path(job)
+    if path is None:
+        raise FileNotFoundError(f"Job {job.job_id} has no result")
+    cur = _reader.cursor()
+    try:
+        cur.execute("SELECT * FROM read_parquet(?) LIMIT ? OFFSET ?", [str(path), limit, offset])
+        rows = cur.fetchall()
+        return [desc[0] for desc in cur.description], [list(row) for row in rows]
+    finally:
+        cur.close()
+
+
+def stop() -> None:
+    with _lock:
+        executor = _executor
+        running = [job.control for job in _jobs.values() if job.status == RUNNING and job.control is not None]
+        for job in _jobs.values():
+            if job.status == QUEUED:
+                _finish(job, CANCELLED)
+    for control in running:
+        control.cancel("shutdown")
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,38 +1,136 @@
 from __future__ import annotations
 
+import json
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
-from .connection import dictrows, get_conn
+from . import profiles_repo
+from .archive import SCORES_SOURCE
+from .connection import RowStream, dictrows, get_conn, json_row_sql, json_rows, open_row_stream
+from .writer import run_write
+from ..config import DB_BACKEND
 from ..utils.time import ensure_naive_utc
 
+# Ключ страницы: строки идут по (measured_at, score_id) по убыванию, следующая страница
+# начинается строго после последней пары, поэтому OFFSET не нужен
+ScoreKey = Tuple[datetime, str]
 
-def list_by_track(
-    track_id: str,
+
+# Приводит строку к контракту ScoreOut так, как его отдаёт Pydantic:
+# value_raw — float, occurred_at — ISO без зоны, микросекунды только если они есть.
+_SCORE_JSON_PROJECTION = """
+    SELECT
+        score_id,
+        step_id,
+        track_id,
+        student_id,
+        metric_id,
+        metric_name,
+        CAST(value_raw AS DOUBLE) AS value_raw,
+        rater_user_id,
+        role_at_rate,
+        comment,
+        CASE
+            WHEN microsecond(occurred_at) % 1000000 = 0
+                THEN strftime(occurred_at, '%Y-%m-%dT%H:%M:%S')
+            ELSE strftime(occurred_at, '%Y-%m-%dT%H:%M:%S.%f')
+        END AS occurred_at
+    FROM ({sql}) r
+"""
+
+# В Postgres to_json(float8) теряет ".0", а NUMERIC с масштабом его сохраняет
+_SCORE_JSON_PROJECTION_PG = """
+    SELECT
+        score_id,
+        step_id,
+        track_id,
+        student_id,
+        metric_id,
+        metric_name,
+        CAST(value_raw AS NUMERIC(5, 1)) AS value_raw,
+        rater_user_id,
+        role_at_rate,
+        comment,
+        CASE
+            WHEN date_trunc('second', occurred_at) = occurred_at
+                THEN to_char(occurred_at, 'YYYY-MM-DD"T"HH24:MI:SS')
+            ELSE to_char(occurred_at, 'YYYY-MM-DD"T"HH24:MI:SS.US')
+        END AS occurred_at
+    FROM ({sql}) r
+"""
+
+
+# Одна «форма» запроса — один текст SQL: списки любой длины идут одним параметром
+# через = ANY(?), поэтому Postgres держит серверный prepared statement на форму,
+# а не на каждую длину IN (...)
+_FILTER_COLUMNS = {"track": "s.track_id", "student": "s.student_id", "metric": "s.metric_id"}
+_FILTER_SQL = {
+    "eq": "{col} = ?",
+    "any": "{col} = ANY(?)",
+    "since": "s.measured_at >= ?",
+    "until": "s.measured_at < ?",
+    "after": "s.measured_at > ?",
+    # Первое условие отдельно — его DuckDB проталкивает в скан и отсекает блоки по zone map
+    "seek": "s.measured_at <= ? AND (s.measured_at < ? OR s.score_id < ?)",
+}
+
+FilterShape = Tuple[Tuple[str, str], ...]
+IdFilter = Union[None, str, Sequence[str]]
+
+
+def _compile_filters(
     *,
-    student_id: Optional[str] = None,
-    metric_id: Optional[str] = None,
+    track: IdFilter = None,
+    student: IdFilter = None,
+    metric: IdFilter = None,
     since: Optional[datetime] = None,
     until: Optional[datetime] = None,
-    limit: int,
-    offset: int,
-) -> List[Dict[str, Any]]:
-    where = ["s.track_id = ?"]
-    params: List[Any] = [track_id]
-
-    if student_id:
-        where.append("s.student_id = ?")
-        params.append(student_id)
-    if metric_id:
-        where.append("s.metric_id = ?")
-        params.append(metric_id)
-    if since:
-        where.append("s.measured_at >= ?")
-        params.append(ensure_naive_utc(since))
-    if until:
-        where.append("s.measured_at < ?")
-        params.append(ensure_naive_utc(until))
+    after_time: Optional[datetime] = None,
+    after: Optional[ScoreKey] = None,
+) -> Optional[Tuple[FilterShape, List[Any]]]:
+    """Normalize filters into a hashable shape and its params; ``None`` when an empty list matches nothing.
+
+    A single id becomes ``= ?`` (DuckDB prunes row groups on it, ``ANY`` it does not);
+    two or more become one list parameter for ``= ANY(?)``.
+    """
+
+    shape: List[Tuple[str, str]] = []
+    params: List[Any] = []
+    for key, value in (("track", track), ("student", student), ("metric", metric)):
+        if value is None:
+            continue
+        if isinstance(value, str):
+            values = [value]
+        else:
+            values = list(dict.fromkeys(value))
+            if not values:
+                return None
+        if len(values) == 1:
+            shape.append((key, "eq"))
+            params.append(values[0])
+        else:
+            shape.append((key, "any"))
+            params.append(values)
+    for op, value in (("since", since), ("until", until), ("after", after_time)):
+        if value:
+            shape.append(("", op))
+            params.append(ensure_naive_utc(value))
+    if after is not None:
+        measured_at = ensure_naive_utc(after[0])
+        shape.append(("", "seek"))
+        params.extend([measured_at, measured_at, after[1]])
+    return tuple(shape), params
+
+
+@lru_cache(maxsize=None)
+def _where_sql(shape: FilterShape) -> str:
+    clauses = [_FILTER_SQL[op].format(col=_FILTER_COLUMNS.get(key, "")) for key, op in shape]
+    return " WHERE " + " AND ".join(clauses) if clauses else ""
 
+
+@lru_cache(maxsize=None)
+def _list_sql(shape: FilterShape, ordered: bool, limited: bool) -> str:
     sql = f"""
         SELECT
             s.score_id,
@@ -46,19 +144,73 @@ def list_by_track(
             s.role_at_rate,
             s.comment,
             s.measured_at AS occurred_at
-        FROM scores s
+        FROM {SCORES_SOURCE} s
         LEFT JOIN metrics m ON m.metric_id = s.metric_id
-        WHERE {' AND '.join(where)}
-        ORDER BY s.measured_at DESC
-        LIMIT ? OFFSET ?
+        {_where_sql(shape)}
     """
-    params.extend([limit, offset])
+    if ordered:
+        sql += " ORDER BY s.measured_at DESC, s.score_id DESC"
+    if limited:
+        sql += " LIMIT ? OFFSET ?"
+    return sql
+
 
+def _list_query(
+    *,
+    limit: Optional[int],
+    offset: int = 0,
+    ordered: bool = True,
+    **filters: Any,
+) -> Optional[Tuple[str, List[Any]]]:
+    compiled = _compile_filters(**filters)
+    if compiled is None:
+        return None
+    shape, params = compiled
+    sql = _list_sql(shape, ordered, limit is not None)
+    if limit is not None:
+        params.extend([limit, offset])
+    return sql, params
+
+
+def _fetch_list(**kwargs: Any) -> List[Dict[str, Any]]:
+    query = _list_query(**kwargs)
+    if query is None:
+        return []
+    sql, params = query
     with get_conn(True) as con:
         cur = con.execute(sql, params)
         return dictrows(cur)
 
 
+def compiled_shapes() -> int:
+    """Number of distinct list query shapes compiled so far."""
+
+    return _list_sql.cache_info().currsize
+
+
+def list_by_track(
+    track_id: str,
+    *,
+    student_id: Optional[str] = None,
+    metric_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int,
+    offset: int = 0,
+    after: Optional[ScoreKey] = None,
+) -> List[Dict[str, Any]]:
+    return _fetch_list(
+        track=track_id,
+        student=student_id or None,
+        metric=metric_id or None,
+        since=since,
+        until=until,
+        after=after,
+        limit=limit,
+        offset=offset,
+    )
+
+
 def list_by_student(
     student_id: str,
     *,
@@ -67,48 +219,34 @@ def list_by_student(
     since: Optional[datetime] = None,
     until: Optional[datetime] = None,
     limit: int,
-    offset: int,
+    offset: int = 0,
+    after: Optional[ScoreKey] = None,
 ) -> List[Dict[str, Any]]:
-    where = ["s.student_id = ?"]
-    params: List[Any] = [student_id]
-
-    if track_id:
-        where.append("s.track_id = ?")
-        params.append(track_id)
-    if metric_id:
-        where.append("s.metric_id = ?")
-        params.append(metric_id)
-    if since:
-        where.append("s.measured_at >= ?")
-        params.append(ensure_naive_utc(since))
-    if until:
-        where.append("s.measured_at < ?")
-        params.append(ensure_naive_utc(until))
+    return _fetch_list(
+        student=student_id,
+        track=track_id or None,
+        metric=metric_id or None,
+        since=since,
+        until=until,
+        after=after,
+        limit=limit,
+        offset=offset,
+    )
 
-    sql = f"""
-        SELECT
-            s.score_id,
-            s.step_id,
-            s.track_id,
-            s.student_id,
-            s.metric_id,
-            m.name AS metric_name,
-            COALESCE(s.raw_value, s.value) AS value_raw,
-            s.rater_user_id,
-            s.role_at_rate,
-            s.comment,
-            s.measured_at AS occurred_at
-        FROM scores s
-        LEFT JOIN metrics m ON m.metric_id = s.metric_id
-        WHERE {' AND '.join(where)}
-        ORDER BY s.measured_at DESC
-        LIMIT ? OFFSET ?
-    """
-    params.extend([limit, offset])
 
-    with get_conn(True) as con:
-        cur = con.execute(sql, params)
-        return dictrows(cur)
+def list_by_user(
+    user_id: str,
+    *,
+    metric_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int,
+    offset: int = 0,
+    after: Optional[ScoreKey] = None,
+) -> List[Dict[str, Any]]:
+    return list_by_student(
+        user_id, metric_id=metric_id, since=since, until=until, limit=limit, offset=offset, after=after
+    )
 
 
 def list_by_sets(
@@ -119,108 +257,312 @@ def list_by_sets(
     since: Optional[datetime] = None,
     until: Optional[datetime] = None,
     limit: int,
-    offset: int,
+    offset: int = 0,
+    after: Optional[ScoreKey] = None,
 ) -> List[Dict[str, Any]]:
-    if track_ids is not None and len(track_ids) == 0:
-        return []
-    if student_ids is not None and len(student_ids) == 0:
-        return []
-    if metric_ids is not None and len(metric_ids) == 0:
-        return []
+    return _fetch_list(
+        track=track_ids,
+        student=student_ids,
+        metric=metric_ids,
+        since=since,
+        until=until,
+        after=after,
+        limit=limit,
+        offset=offset,
+    )
 
-    where: List[str] = []
-    params: List[Any] = []
 
-    if track_ids:
-        placeholders = ", ".join(["?"] * len(track_ids))
-        where.append(f"s.track_id IN ({placeholders})")
-        params.extend(track_ids)
-    if student_ids:
-        placeholders = ", ".join(["?"] * len(student_ids))
-        where.append(f"s.student_id IN ({placeholders})")
-        params.extend(student_ids)
-    if metric_ids:
-        placeholders = ", ".join(["?"] * len(metric_ids))
-        where.append(f"s.metric_id IN ({placeholders})")
-        params.extend(metric_ids)
-    if since:
-        where.append("s.measured_at >= ?")
-        params.append(ensure_naive_utc(since))
-    if until:
-        where.append("s.measured_at < ?")
-        params.append(ensure_naive_utc(until))
-
-    sql = """
-        SELECT
-            s.score_id,
-            s.step_id,
-            s.track_id,
-            s.student_id,
-            s.metric_id,
-            m.name AS metric_name,
-            COALESCE(s.raw_value, s.value) AS value_raw,
-            s.rater_user_id,
-            s.role_at_rate,
-            s.comment,
-            s.measured_at AS occurred_at
-        FROM scores s
-        LEFT JOIN metrics m ON m.metric_id = s.metric_id
-    """
+def list_by_sets_json(
+    *,
+    track_ids: Optional[List[str]] = None,
+    student_ids: Optional[List[str]] = None,
+    metric_ids: Optional[List[str]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int,
+    offset: int = 0,
+    after: Optional[ScoreKey] = None,
+) -> Tuple[bytes, Optional[ScoreKey]]:
+    """Same rows as list_by_sets, already encoded as a JSON array of ScoreOut objects.
 
-    if where:
-        sql += " WHERE " + " AND ".join(where)
+    Also returns the key of the last row when another page follows, else ``None``.
+    """
 
-    sql += " ORDER BY s.measured_at DESC LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
+    query = _list_query(
+        track=track_ids,
+        student=student_ids,
+        metric=metric_ids,
+        since=since,
+        until=until,
+        after=after,
+        limit=limit + 1,
+        offset=offset,
+    )
+    if query is None:
+        return b"[]", None
+    sql, params = query
 
     with get_conn(True) as con:
-        cur = con.execute(sql, params)
-        return dictrows(cur)
+        projection = _SCORE_JSON_PROJECTION_PG if DB_BACKEND == "postgres" else _SCORE_JSON_PROJECTION
+        rows = json_rows(con, projection.format(sql=sql), params)
 
+    next_key: Optional[ScoreKey] = None
+    if len(rows) > limit:
+        # Лишняя строка только сигнализирует о следующей странице; ключ берём из последней отданной
+        rows = rows[:limit]
+        last = json.loads(rows[-1])
+        next_key = (datetime.fromisoformat(last["occurred_at"]), last["score_id"])
+    body = ("[" + ",".join(rows) + "]").encode("utf-8")
+    return body, next_key
 
-def list_by_user(
-    user_id: str,
+
+def open_stream_by_sets(
+    *,
+    track_ids: Optional[List[str]] = None,
+    student_ids: Optional[List[str]] = None,
+    metric_ids: Optional[List[str]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    as_json: bool = False,
+) -> Optional[RowStream]:
+    """Start an unbounded list_by_sets read; ``None`` when a filter set is empty.
+
+    Rows come in storage order: sorting would make the database hold the whole result
+    before the first row. With ``as_json`` every row is a single ScoreOut JSON string.
+    """
+
+    query = _list_query(
+        track=track_ids,
+        student=student_ids,
+        metric=metric_ids,
+        since=since,
+        until=until,
+        limit=None,
+        ordered=False,
+    )
+    if query is None:
+        return None
+    sql, params = query
+    if as_json:
+        projection = _SCORE_JSON_PROJECTION_PG if DB_BACKEND == "postgres" else _SCORE_JSON_PROJECTION
+        sql = json_row_sql(projection.format(sql=sql))
+    return open_row_stream(sql, params)
+
+
+_BUCKET_UNITS = {"day": "day", "week": "week"}
+
+
+def series_buckets(
+    track_id: str,
     *,
+    student_id: Optional[str] = None,
     metric_id: Optional[str] = None,
     since: Optional[datetime] = None,
     until: Optional[datetime] = None,
-    limit: int,
-    offset: int,
-) -> List[Dict[str, Any]]:
-    where = ["s.student_id = ?"]
-    params: List[Any] = [user_id]
-
-    if metric_id:
-        where.append("s.metric_id = ?")
-        params.append(metric_id)
-    if since:
-        where.append("s.measured_at >= ?")
-        params.append(ensure_naive_utc(since))
-    if until:
-        where.append("s.measured_at < ?")
-        params.append(ensure_naive_utc(until))
+    after: Optional[datetime] = None,
+    interval: str = "day",
+) -> List[Tuple[str, str, Any, float, int]]:
+    """Return ``(metric_id, role_at_rate, bucket_date, value_sum, value_count)`` per bucket.
+
+    Buckets are calendar days or ISO weeks (starting Monday). Sums and counts rather
+    than averages let the caller merge metrics, or new rows past ``after``, without
+    re-reading old rows.
+    """
+
+    unit = _BUCKET_UNITS[interval]
+    shape, params = _compile_filters(
+        track=track_id,
+        student=student_id or None,
+        metric=metric_id or None,
+        since=since,
+        until=until,
+        after_time=after,
+    )
 
     sql = f"""
         SELECT
-            s.score_id,
-            s.step_id,
-            s.track_id,
-            s.student_id,
             s.metric_id,
-            m.name AS metric_name,
-            COALESCE(s.raw_value, s.value) AS value_raw,
-            s.rater_user_id,
             s.role_at_rate,
-            s.comment,
-            s.measured_at AS occurred_at
-        FROM scores s
-        LEFT JOIN metrics m ON m.metric_id = s.metric_id
-        WHERE {' AND '.join(where)}
-        ORDER BY s.measured_at DESC
-        LIMIT ? OFFSET ?
+            CAST(date_trunc('{unit}', s.measured_at) AS DATE) AS bucket,
+            CAST(SUM(COALESCE(s.raw_value, s.value)) AS DOUBLE PRECISION) AS value_sum,
+            COUNT(*) AS value_count
+        FROM {SCORES_SOURCE} s
+        {_where_sql(shape)}
+        GROUP BY 1, 2, 3
+        ORDER BY 3
+    """
+
+    with get_conn(True) as con:
+        return con.execute(sql, params).fetchall()
+
+
+_AGGREGATE_KEYS = {
+    "track": "s.track_id",
+    "metric": "s.metric_id",
+    "role": "s.role_at_rate",
+    "student": "s.student_id",
+}
+_AGGREGATE_KEY_NAMES = {"track": "track_id", "metric": "metric_id", "role": "role_at_rate", "student": "student_id"}
+_AGGREGATE_UNITS = {"day": "day", "week": "week", "month": "month"}
+
+
+def aggregate_by_sets(
+    *,
+    track_ids: Optional[List[str]] = None,
+    student_ids: Optional[List[str]] = None,
+    metric_ids: Optional[List[str]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    group_by: Sequence[str] = (),
+    interval: Optional[str] = None,
+    quantiles: Sequence[float] = (),
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """Aggregate ``COALESCE(raw_value, value)`` per group inside the database.
+
+    Every row carries the requested group keys (plus ``bucket`` with ``interval``),
+    ``count``, ``mean``, ``min``, ``max`` and, with ``quantiles``, a ``quantiles`` list
+    in the same order. DuckDB uses ``approx_quantile``; Postgres has no approximate
+    variant and computes exact ``percentile_cont``.
     """
-    params.extend([limit, offset])
+
+    compiled = _compile_filters(track=track_ids, student=student_ids, metric=metric_ids, since=since, until=until)
+    if compiled is None:
+        return []
+    shape, params = compiled
+
+    keys = [f"{_AGGREGATE_KEYS[key]} AS {_AGGREGATE_KEY_NAMES[key]}" for key in group_by]
+    if interval:
+        keys.append(f"CAST(date_trunc('{_AGGREGATE_UNITS[interval]}', s.measured_at) AS DATE) AS bucket")
+
+    value = "CAST(COALESCE(s.raw_value, s.value) AS DOUBLE PRECISION)"
+    aggregates = [
+        "COUNT(*) AS count",
+        f"AVG({value}) AS mean",
+        f"MIN({value}) AS min",
+        f"MAX({value}) AS max",
+    ]
+    if quantiles:
+        # Квантили подставляются литералами: approx_quantile в DuckDB принимает только константы
+        qs = ", ".join(repr(float(q)) for q in quantiles)
+        if DB_BACKEND == "postgres":
+            aggregates.append(
+                f"percentile_cont(CAST(ARRAY[{qs}] AS DOUBLE PRECISION[])) WITHIN GROUP (ORDER BY {value}) AS quantiles"
+            )
+        else:
+            aggregates.append(f"approx_quantile({value}, [{qs}]) AS quantiles")
+
+    sql = f"SELECT {', '.join(keys + aggregates)} FROM {SCORES_SOURCE} s{_where_sql(shape)}"
+    if keys:
+        positions = ", ".join(str(i + 1) for i in range(len(keys)))
+        sql += f" GROUP BY {positions} ORDER BY {positions}"
+    sql += " LIMIT ?"
+    params.append(limit)
 
     with get_conn(True) as con:
         cur = con.execute(sql, params)
         return dictrows(cur)
+
+
+# Порядок колонок в bulk-вставке; типы — для CAST(? AS ...[]) при unnest
+BULK_COLUMNS = (
+    ("score_id", "VARCHAR"),
+    ("track_id", "VARCHAR"),
+    ("step_id", "VARCHAR"),
+    ("student_id", "VARCHAR"),
+    ("metric_id", "VARCHAR"),
+    ("raw_value", "INTEGER"),
+    ("rater_user_id", "VARCHAR"),
+    ("role_at_rate", "VARCHAR"),
+    ("comment", "VARCHAR"),
+    ("measured_at", "TIMESTAMP"),
+)
+
+_BULK_UNNEST = ", ".join(f"unnest(CAST(? AS {kind}[])) AS {name}" for name, kind in BULK_COLUMNS)
+_BULK_NAMES = ", ".join(name for name, _ in BULK_COLUMNS)
+
+# Те же проверки, что CHECK в схеме scores, плюс ссылки на tracks/metrics/users и уникальность id
+_BULK_CHECK_SQL = """
+    SELECT row_idx, errors FROM (
+        SELECT
+            i.row_idx,
+            concat_ws(
+                ',',
+                CASE WHEN i.raw_value IS NULL OR i.raw_value NOT BETWEEN 0 AND 100 THEN 'raw_value_out_of_range' END,
+                CASE WHEN i.role_at_rate IS NULL OR i.role_at_rate NOT IN ('student', 'teacher', 'mentor')
+                     THEN 'invalid_role' END,
+                CASE WHEN t.track_id IS NULL THEN 'unknown_track' END,
+                CASE WHEN m.metric_id IS NULL THEN 'unknown_metric' END,
+                CASE WHEN su.user_id IS NULL THEN 'unknown_student' END,
+                CASE WHEN ru.user_id IS NULL THEN 'unknown_rater' END,
+                CASE WHEN s.score_id IS NOT NULL THEN 'score_id_exists' END,
+                CASE WHEN COUNT(*) OVER (PARTITION BY i.score_id) > 1 THEN 'duplicate_score_id' END
+            ) AS errors
+        FROM {source} i
+        LEFT JOIN tracks t ON t.track_id = i.track_id
+        LEFT JOIN metrics m ON m.metric_id = i.metric_id
+        LEFT JOIN users su ON su.user_id = i.student_id
+        LEFT JOIN users ru ON ru.user_id = i.rater_user_id
+        LEFT JOIN {scores} s ON s.score_id = i.score_id
+    ) checked
+    WHERE errors <> ''
+"""
+
+
+def _bulk_arrow(columns: Dict[str, List[Any]], size: int):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    types = {"VARCHAR": pa.string(), "INTEGER": pa.int32(), "TIMESTAMP": pa.timestamp("us")}
+    arrays = {"row_idx": pa.array(range(size), type=pa.int32())}
+    for name, kind in BULK_COLUMNS:
+        arrays[name] = pa.array(columns[name], type=types[kind])
+    return pa.table(arrays)
+
+
+def insert_bulk(columns: Dict[str, List[Any]], *, all_or_nothing: bool = False) -> Tuple[int, List[Tuple[int, str]]]:
+    """Check and insert column-wise scores in one write transaction.
+
+    ``columns`` maps every name in ``BULK_COLUMNS`` to a list of equal length. Rows are
+    checked with one set-based query and the valid ones go in with a single
+    ``INSERT ... SELECT``. On DuckDB the rows are scanned from a registered Arrow table
+    (binding long lists as parameters costs ~0.1 ms per value there); Postgres and
+    DuckDB without pyarrow read them through ``unnest`` of array parameters.
+    Returns ``(inserted, [(row_index, "err,err"), ...])``; with ``all_or_nothing``
+    nothing is inserted when any row fails.
+    """
+
+    size = len(columns["score_id"])
+    if size == 0:
+        return 0, []
+    table = _bulk_arrow(columns, size) if DB_BACKEND == "duckdb" else None
+
+    def _write(con) -> Tuple[int, List[Tuple[int, str]]]:
+        if table is not None:
+            source = f"_bulk_scores_{id(table):x}"
+            params: List[Any] = []
+            con.register(source, table)
+        else:
+            source = f"(SELECT unnest(CAST(? AS INTEGER[])) AS row_idx, {_BULK_UNNEST})"
+            params = [list(range(size))] + [columns[name] for name, _ in BULK_COLUMNS]
+        try:
+            check_sql = _BULK_CHECK_SQL.format(source=source, scores=SCORES_SOURCE)
+            errors = sorted((int(idx), str(err)) for idx, err in con.execute(check_sql, params).fetchall())
+            if len(errors) == size or (errors and all_or_nothing):
+                return 0, errors
+            profiles_repo.scores_changed(zip(columns["track_id"], columns["student_id"]))
+            con.execute(
+                f"""
+                INSERT INTO scores ({_BULK_NAMES})
+                SELECT {_BULK_NAMES} FROM {source} i
+                WHERE i.row_idx NOT IN (SELECT row_idx FROM ({check_sql}) bad)
+                """,
+                params + params,
+            )
+            return size - len(errors), errors
+        finally:
+            if table is not None:
+                con.unregister(source)
+
+    return run_write(_write)
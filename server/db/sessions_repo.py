@@ -4,6 +4,7 @@ from datetime import timedelta
 from typing import Any, Dict, Optional
 
 from .connection import dictrows, get_conn
+from .writer import run_write
 from ..logging_utils import get_logger
 from ..utils.ids import new_id
 from ..utils.time import ensure_naive_utc, now_utc
@@ -22,7 +23,8 @@ def create_session(
     session_id = new_id("ses_")
     now = now_utc()
     expires = now + timedelta(minutes=ttl_minutes)
-    with get_conn(False) as con:
+
+    def _write(con):
         con.execute(
             """
             INSERT INTO sessions (session_id, user_id, created_at, expires_at, ip_hash, user_agent, session_type)
@@ -42,7 +44,9 @@ def create_session(
             "SELECT session_id, user_id, created_at, expires_at FROM sessions WHERE session_id = ?",
             [session_id],
         )
-        row = dictrows(cur)[0]
+        return dictrows(cur)[0]
+
+    row = run_write(_write)
     log.info("Created session %s for user %s", session_id, user_id)
     return row
 
@@ -65,33 +69,36 @@ def get_session(session_id: str) -> Optional[Dict[str, Any]]:
 def refresh_session(session_id: str, ttl_minutes: int) -> Optional[Dict[str, Any]]:
     now = now_utc()
     expires = now + timedelta(minutes=ttl_minutes)
-    with get_conn(False) as con:
+
+    def _write(con):
         cur = con.execute(
             """
             UPDATE sessions
             SET expires_at = ?, revoked_at = NULL
             WHERE session_id = ?
+            RETURNING session_id, user_id, created_at, expires_at, revoked_at
             """,
             [ensure_naive_utc(expires), session_id],
         )
-        if cur.rowcount == 0:
-            return None
-        cur = con.execute(
-            "SELECT session_id, user_id, created_at, expires_at, revoked_at FROM sessions WHERE session_id = ?",
-            [session_id],
-        )
-        rows = dictrows(cur)
+        return dictrows(cur)
+
+    rows = run_write(_write)
+    if not rows:
+        return None
     log.info("Refreshed session %s", session_id)
     return rows[0]
 
 
 def revoke_session(session_id: str) -> bool:
-    with get_conn(False) as con:
+    def _write(con):
+        # rowcount у DuckDB для UPDATE всегда -1 — число изменённых строк берём из RETURNING
         cur = con.execute(
-            "UPDATE sessions SET revoked_at = CURRENT_TIMESTAMP WHERE session_id = ? AND revoked_at IS NULL",
+            "UPDATE sessions SET revoked_at = CURRENT_TIMESTAMP WHERE session_id = ? AND revoked_at IS NULL RETURNING session_id",
             [session_id],
         )
-        changed = cur.rowcount
+        return len(cur.fetchall())
+
+    changed = run_write(_write)
     if changed:
         log.info("Revoked session %s", session_id)
     return bool(changed)
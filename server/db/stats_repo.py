@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from typing import Any, Dict
 
+from .archive import SYS_EVENTS_SOURCE
 from .connection import get_conn
 from ..config import DB_BACKEND
 from ..logging_utils import get_logger
@@ -16,7 +17,7 @@ def fetch_db_health() -> Dict[str, Any]:
         con.execute("SELECT 1").fetchone()
 
         last_sys_event = con.execute(
-            "SELECT MAX(occurred_at) FROM sys_events"
+            f"SELECT MAX(occurred_at) FROM {SYS_EVENTS_SOURCE}"
         ).fetchone()[0]
 
         last_system_message = con.execute(
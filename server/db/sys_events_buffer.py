@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..config import SYS_EVENTS_BATCH_MAX, SYS_EVENTS_FLUSH_MS, SYS_EVENTS_QUEUE_MAX, SYS_EVENTS_SPOOL_PATH
+from ..logging_utils import get_logger
+from ..utils.ids import new_id
+from ..utils.time import ensure_naive_utc, now_utc
+from . import sys_events_repo
+from .connection import after_commit
+from .sys_events_repo import SysEventRow
+
+log = get_logger("db.sys_events_buffer")
+
+__all__ = ["record", "stop", "buffer_stats"]
+
+_SPOOL = Path(SYS_EVENTS_SPOOL_PATH)
+
+
+class _Buffer:
+    """Collects audit events and inserts them in batches from a background thread.
+
+    A batch goes out once ``SYS_EVENTS_BATCH_MAX`` events are waiting or
+    ``SYS_EVENTS_FLUSH_MS`` after its first event. Events that cannot be inserted, or
+    that do not fit into the queue, are appended to a JSONL spool file and replayed
+    after the next successful flush.
+    """
+
+    def __init__(self, maxsize: int, batch_max: int, flush_ms: int) -> None:
+        self._queue: "queue.Queue[SysEventRow | None]" = queue.Queue(maxsize=maxsize)
+        self._batch_max = max(1, batch_max)
+        self._interval = flush_ms / 1000
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._stopped = False
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            "queued": 0,
+            "inserted": 0,
+            "batches": 0,
+            "spooled": 0,
+            "replayed": 0,
+            "flush_failures": 0,
+        }
+
+    def _bump(self, key: str, by: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += by
+
+    # --- lifecycle -----------------------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="sys-events-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stopped = True
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            thread.join(timeout)
+        # Всё, что не успел забрать поток, уходит в spool — на диске оно переживёт рестарт
+        leftover = self._drain()
+        if leftover:
+            self._spool(leftover)
+        log.info("sys_events buffer stopped spooled=%s", len(leftover))
+
+    # --- submission ----------------------------------------------------------------
+
+    def enqueue(self, row: SysEventRow) -> None:
+        if self._stopped:
+            self._flush([row])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            log.warning("sys_events queue full, spooling event %s", row[0])
+            self._spool([row])
+            return
+        self._bump("queued")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            data = dict(self._stats)
+        data["depth"] = self._queue.qsize()
+        data["queue_max"] = self._queue.maxsize
+        data["spool_pending"] = _SPOOL.exists()
+        return data
+
+    # --- worker --------------------------------------------------------------------
+
+    def _drain(self) -> List[SysEventRow]:
+        rows: List[SysEventRow] = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if row is not None:
+                rows.append(row)
+
+    def _next_batch(self) -> tuple[List[SysEventRow], bool]:
+        batch: List[SysEventRow] = []
+        deadline: Optional[float] = None
+        while len(batch) < self._batch_max:
+            timeout = self._interval if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if row is None:
+                return batch + self._drain(), True
+            batch.append(row)
+            if deadline is None:
+                deadline = time.monotonic() + self._interval
+        return batch, False
+
+    def _loop(self) -> None:
+        self._replay()
+        while True:
+            batch, stop = self._next_batch()
+            ok = True
+            for start in range(0, len(batch), self._batch_max):
+                ok = self._flush(batch[start:start + self._batch_max]) and ok
+            if ok and batch:
+                self._replay()
+            if stop:
+                return
+
+    def _flush(self, rows: List[SysEventRow]) -> bool:
+        try:
+            sys_events_repo.insert_many(rows)
+        except Exception:
+            self._bump("flush_failures")
+            log.exception("sys_events flush failed size=%s, spooling", len(rows))
+            self._spool(rows)
+            return False
+        self._bump("batches")
+        self._bump("inserted", len(rows))
+        return True
+
+    # --- spool ---------------------------------------------------------------------
+
+    def _spool(self, rows: List[SysEventRow]) -> None:
+        lines = "".join(
+            json.dumps([*row[:5], row[5].isoformat()], ensure_ascii=False) + "\n" for row in rows
+        )
+        with self._spool_lock:
+            try:
+                _SPOOL.parent.mkdir(parents=True, exist_ok=True)
+                with _SPOOL.open("a", encoding="utf-8") as fh:
+                    fh.write(lines)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            except OSError:
+                log.exception("sys_events spool write failed, %s events lost", len(rows))
+                return
+        self._bump("spooled", len(rows))
+
+    def _replay(self) -> None:
+        with self._spool_lock:
+            if not _SPOOL.exists():
+                return
+            rows: List[SysEventRow] = []
+            try:
+                with _SPOOL.open("r", encoding="utf-8") as fh:
+                    for line in fh:
+                        if not line.strip():
+                            continue
+                        try:
+                            data = json.loads(line)
+                            rows.append((*data[:5], datetime.fromisoformat(data[5])))
+                        except (ValueError, IndexError, TypeError):
+                            log.warning("sys_events spool: skipping malformed line %r", line[:200])
+            except OSError:
+                log.exception("sys_events spool read failed")
+                return
+            try:
+                # Повторная вставка безопасна: уже записанные sys_event_id пропускаются
+                for start in range(0, len(rows), self._batch_max):
+                    sys_events_repo.insert_many(rows[start:start + self._batch_max])
+            except Exception as e:
+                log.warning("sys_events spool replay failed, will retry: %s", e)
+                return
+            _SPOOL.unlink()
+        self._bump("replayed", len(rows))
+        log.info("sys_events spool replayed size=%s", len(rows))
+
+
+_buffer = _Buffer(SYS_EVENTS_QUEUE_MAX, SYS_EVENTS_BATCH_MAX, SYS_EVENTS_FLUSH_MS)
+
+
+def record(
+    *,
+    event_type: str,
+    actor_user_id: Optional[str],
+    subject_user_id: Optional[str],
+    context: Optional[str],
+) -> str:
+    """Queue an audit event for a batched insert and return its id right away.
+
+    Inside a unit of work the event is queued only after the transaction commits.
+    With ``SYS_EVENTS_FLUSH_MS=0`` the event is inserted synchronously as before.
+    """
+
+    if SYS_EVENTS_FLUSH_MS <= 0:
+        return sys_events_repo.insert(
+            event_type=event_type,
+            actor_user_id=actor_user_id,
+            subject_user_id=subject_user_id,
+            context=context,
+        )
+    sys_event_id = new_id("se_")
+    row: SysEventRow = (
+        sys_event_id,
+        event_type,
+        actor_user_id,
+        subject_user_id,
+        context,
+        ensure_naive_utc(now_utc()),
+    )
+    after_commit(lambda: _buffer.enqueue(row))
+    log.info("Queued sys_event %s type=%s subject=%s", sys_event_id, event_type, subject_user_id)
+    return sys_event_id
+
+
+def stop() -> None:
+    _buffer.stop()
+
+
+def buffer_stats() -> Dict[str, Any]:
+    return _buffer.stats()
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-from typing import Optional
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
 
-from .connection import get_conn
+from .writer import run_write
 from ..logging_utils import get_logger
 from ..utils.ids import new_id
 
@@ -17,15 +18,40 @@ def insert(
     context: Optional[str],
 ) -> str:
     sys_event_id = new_id("se_")
-    with get_conn(False) as con:
-        con.execute(
+    run_write(
+        lambda con: con.execute(
             """
             INSERT INTO sys_events (sys_event_id, event_type, actor_user_id, subject_user_id, context)
             VALUES (?, ?, ?, ?, ?)
             """,
             [sys_event_id, event_type, actor_user_id, subject_user_id, context],
         )
+    )
     log.info(
         "Inserted sys_event %s type=%s subject=%s", sys_event_id, event_type, subject_user_id
     )
     return sys_event_id
+
+
+SysEventRow = Tuple[str, str, Optional[str], Optional[str], Optional[str], datetime]
+
+
+def insert_many(rows: Sequence[SysEventRow]) -> int:
+    """Insert prepared events in one statement; ids already present are skipped."""
+
+    if not rows:
+        return 0
+    columns = [list(col) for col in zip(*rows)]
+    run_write(
+        lambda con: con.execute(
+            """
+            INSERT INTO sys_events (sys_event_id, event_type, actor_user_id, subject_user_id, context, occurred_at)
+            SELECT unnest(CAST(? AS VARCHAR[])), unnest(CAST(? AS VARCHAR[])), unnest(CAST(? AS VARCHAR[])),
+                   unnest(CAST(? AS VARCHAR[])), unnest(CAST(? AS VARCHAR[])), unnest(CAST(? AS TIMESTAMP[]))
+            ON CONFLICT DO NOTHING
+            """,
+            columns,
+        )
+    )
+    log.debug("Inserted sys_events batch size=%s", len(rows))
+    return len(rows)
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import threading
+from datetime import datetime
+from typing import Dict
+
+from ..config import CLIENT_TOKEN_USAGE_FLUSH_SECONDS
+from ..logging_utils import get_logger
+from ..utils.time import now_utc
+from . import client_tokens_repo
+
+log = get_logger("db.token_usage")
+
+__all__ = ["record", "flush", "stop"]
+
+# token_id -> последний момент использования; пишется в client_tokens.last_used_at пачкой
+_pending: Dict[str, datetime] = {}
+_pending_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_stop = threading.Event()
+_thread: threading.Thread | None = None
+_start_lock = threading.Lock()
+
+
+def _ensure_started() -> None:
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    with _start_lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=_loop, name="token-usage-flusher", daemon=True)
+        _thread.start()
+
+
+def record(token_id: str) -> None:
+    """Remember that ``token_id`` was used now; no database work on the request path."""
+
+    if CLIENT_TOKEN_USAGE_FLUSH_SECONDS <= 0:
+        return
+    used_at = now_utc()
+    with _pending_lock:
+        _pending[token_id] = used_at
+    _ensure_started()
+
+
+def flush() -> int:
+    with _flush_lock:
+        with _pending_lock:
+            batch = dict(_pending)
+            _pending.clear()
+        if not batch:
+            return 0
+        try:
+            client_tokens_repo.touch_many(batch)
+        except Exception:
+            # Возвращаем в буфер, не затирая более свежие отметки
+            with _pending_lock:
+                for token_id, used_at in batch.items():
+                    current = _pending.get(token_id)
+                    if current is None or current < used_at:
+                        _pending[token_id] = used_at
+            log.exception("token usage flush failed size=%s", len(batch))
+            return 0
+    log.debug("token usage flushed size=%s", len(batch))
+    return len(batch)
+
+
+def _loop() -> None:
+    while not _stop.wait(CLIENT_TOKEN_USAGE_FLUSH_SECONDS):
+        flush()
+
+
+def stop() -> None:
+    _stop.set()
+    thread = _thread
+    if thread is not None and thread.is_alive():
+        thread.join(timeout=5)
+    flushed = flush()
+    if flushed:
+        log.info("token usage final flush size=%s", flushed)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Set
 
 from .connection import dictrows, get_conn
 from ..logging_utils import get_logger
@@ -49,6 +49,80 @@ def list_by_student(user_id: str, active_only: bool, now: datetime) -> List[Dict
     return rows
 
 
+def list_by_participant(user_id: str, active_only: bool, now: datetime) -> List[Dict[str, Any]]:
+    """Tracks the user takes part in as student or teacher, with ``role_in_track``.
+
+    One query for both ``list_by_student`` and ``list_by_teacher``, same columns and order.
+    """
+
+    params: List[Any] = [user_id]
+    sql = [
+        "SELECT tp.role_in_track, t.track_id, t.title, t.status,",
+        "       NULL AS start_at, NULL AS end_at,",
+        "       t.owner_user_id, t.created_at, t.updated_at",
+        "FROM track_participants tp",
+        "JOIN tracks t ON t.track_id = tp.track_id",
+        "WHERE tp.user_id = ? AND tp.role_in_track IN ('student', 'teacher')",
+    ]
+    if active_only:
+        sql.append("AND t.status = 'active'")
+    sql.append("ORDER BY t.created_at DESC")
+    query = "\n".join(sql)
+    with get_conn(True) as con:
+        cur = con.execute(query, params)
+        rows = dictrows(cur)
+    return rows
+
+
+def list_teachers_by_student_track(user_id: str, active_only: bool) -> Dict[str, List[Dict[str, Any]]]:
+    """Teachers of every track the user studies in: ``track_id -> teachers`` in ``joined_at`` order.
+
+    One join instead of ``list_teachers_for_track`` per track; tracks without teachers
+    have no key.
+    """
+
+    # Треки берутся соединением по студенту, а не списком id: привязка списка-параметра
+    # в DuckDB стоит ~0.2 мс на элемент и сама растёт с числом треков
+    params: List[Any] = [user_id]
+    sql = [
+        "SELECT tp.track_id, u.user_id, u.display_name, u.telegram_username",
+        "FROM track_participants me",
+        "JOIN tracks t ON t.track_id = me.track_id",
+        "JOIN track_participants tp ON tp.track_id = me.track_id AND tp.role_in_track = 'teacher'",
+        "JOIN users u ON u.user_id = tp.user_id",
+        "WHERE me.user_id = ? AND me.role_in_track = 'student'",
+    ]
+    if active_only:
+        sql.append("AND t.status = 'active'")
+    sql.append("ORDER BY tp.track_id, tp.joined_at ASC")
+    query = "\n".join(sql)
+    with get_conn(True) as con:
+        cur = con.execute(query, params)
+        rows = dictrows(cur)
+    teachers: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        teachers.setdefault(row.pop("track_id"), []).append(row)
+    return teachers
+
+
+def teacher_track_ids(user_id: str, track_ids: Sequence[str]) -> Set[str]:
+    """Return those of ``track_ids`` where the user is a teacher."""
+
+    if not track_ids:
+        return set()
+    with get_conn(True) as con:
+        rows = con.execute(
+            """
+            SELECT DISTINCT tp.track_id
+            FROM track_participants tp
+            WHERE tp.user_id = ? AND tp.role_in_track = 'teacher'
+              AND tp.track_id = ANY(?)
+            """,
+            [user_id, list(track_ids)],
+        ).fetchall()
+    return {row[0] for row in rows}
+
+
 def list_teachers_for_track(track_id: str) -> List[Dict[str, Any]]:
     with get_conn(True) as con:
         cur = con.execute(
@@ -2,7 +2,9 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
+from . import invalidation
 from .connection import dictrows, get_conn
+from .writer import run_write
 from ..logging_utils import get_logger
 from ..utils.ids import new_id
 
@@ -85,7 +87,8 @@ def create_user_for_telegram(
     telegram_login_name: str | None,
 ) -> Dict[str, Any]:
     user_id = new_id("u_")
-    with get_conn(False) as con:
+
+    def _write(con):
         con.execute(
             """
             INSERT INTO users (
@@ -117,7 +120,9 @@ def create_user_for_telegram(
             """,
             [user_id],
         )
-        row = dictrows(cur)[0]
+        return dictrows(cur)[0]
+
+    row = run_write(_write)
     log.info("Created user %s for telegram %s", user_id, telegram_user_id)
     return row
 
@@ -154,6 +159,55 @@ def get_roles(user_id: str) -> List[str]:
     return [row[0] for row in rows]
 
 
+def get_profile_facts(
+    user_id: str,
+    mentor_user_id: Optional[str],
+    telegram_user_id: Optional[int],
+) -> Dict[str, Any]:
+    """Load the curator, roles, ban flag and last session time of a user in one query.
+
+    Returns ``curator`` (dict or ``None``), ``roles``, ``banned`` and ``last_seen_at``.
+    A ban matches either the user id or the Telegram id, like ``get_ban_by_user`` with
+    the ``get_ban_by_telegram`` fallback.
+    """
+
+    with get_conn(True) as con:
+        # Строка на каждую роль, остальные колонки в них повторяются; без ролей строка одна
+        cur = con.execute(
+            """
+            SELECT r.role,
+                   c.user_id AS curator_user_id,
+                   c.display_name AS curator_display_name,
+                   c.telegram_username AS curator_telegram_username,
+                   EXISTS (
+                       SELECT 1 FROM banned_users b
+                       WHERE b.user_id = ? OR b.telegram_user_id = ?
+                   ) AS banned,
+                   (SELECT MAX(s.created_at) FROM sessions s WHERE s.user_id = ?) AS last_seen_at
+            FROM (SELECT 1 AS one) base
+            LEFT JOIN users c ON c.user_id = ?
+            LEFT JOIN user_roles r ON r.user_id = ?
+            ORDER BY r.role
+            """,
+            [user_id, telegram_user_id, user_id, mentor_user_id, user_id],
+        )
+        rows = dictrows(cur)
+    first = rows[0]
+    curator = None
+    if first["curator_user_id"] is not None:
+        curator = {
+            "user_id": first["curator_user_id"],
+            "display_name": first["curator_display_name"],
+            "telegram_username": first["curator_telegram_username"],
+        }
+    return {
+        "curator": curator,
+        "roles": [row["role"] for row in rows if row["role"] is not None],
+        "banned": bool(first["banned"]),
+        "last_seen_at": first["last_seen_at"],
+    }
+
+
 def is_frozen(user_id: str) -> bool:
     with get_conn(True) as con:
         cur = con.execute(
@@ -165,11 +219,13 @@ def is_frozen(user_id: str) -> bool:
 
 
 def set_frozen(user_id: str, frozen: bool) -> None:
-    with get_conn(False) as con:
-        con.execute(
+    run_write(
+        lambda con: con.execute(
             "UPDATE users SET frozen = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?",
             [frozen, user_id],
         )
+    )
+    invalidation.user_changed(user_id)
     log.info("Set frozen=%s for user %s", frozen, user_id)
 
 
@@ -231,7 +287,7 @@ def list_users_by_role(role: str, limit: int, offset: int) -> Dict[str, Any]:
 
 
 def rename_display_name(user_id: str, display_name: str) -> Dict[str, Any] | None:
-    with get_conn(False) as con:
+    def _write(con):
         cur = con.execute(
             """
             UPDATE users
@@ -241,5 +297,7 @@ def rename_display_name(user_id: str, display_name: str) -> Dict[str, Any] | Non
             """,
             [display_name, user_id],
         )
-        rows = dictrows(cur)
+        return dictrows(cur)
+
+    rows = run_write(_write)
     return rows[0] if rows else None
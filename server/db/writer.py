@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from ..config import DB_BACKEND, DB_WRITER_BATCH_MAX, DB_WRITER_QUEUE_MAX, DB_WRITER_SUBMIT_TIMEOUT
+from ..logging_utils import get_logger
+from .connection import backend_conn, bind_transaction
+
+log = get_logger("db.writer")
+
+T = TypeVar("T")
+
+__all__ = ["WriterBusyError", "run_write", "submit_write", "writer_stats", "stop_writer"]
+
+_LOCK_MESSAGES = ("Could not set lock on file", "Conflicting lock is held")
+# Конфликт MVCC с записью мимо писателя (перестройка таблиц в maintenance, другой процесс):
+# транзакция уже откатилась, задания можно повторить
+_CONFLICT_MESSAGES = ("Conflict on ", "write-write conflict")
+_LOCK_RETRY_ATTEMPTS = 5
+_LOCK_RETRY_DELAY = 0.2
+
+
+class WriterBusyError(RuntimeError):
+    """Raised when the write queue stays full for longer than the submit timeout."""
+
+
+@dataclass(slots=True)
+class _Job:
+    fn: Callable[[Any], Any]
+    future: Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+def _is_lock_error(exc: Exception) -> bool:
+    msg = str(exc)
+    return any(marker in msg for marker in _LOCK_MESSAGES)
+
+
+def _is_conflict(exc: Exception) -> bool:
+    msg = str(exc)
+    return any(marker in msg for marker in _CONFLICT_MESSAGES)
+
+
+class _Writer:
+    """One thread that owns the write connection and applies jobs in submission order.
+
+    Consecutive jobs are grouped into a single transaction (up to ``DB_WRITER_BATCH_MAX``).
+    If any job in a batch fails, the batch is rolled back and replayed one job per
+    transaction, so a bad write only fails its own caller. While a job runs, ``get_conn``
+    and ``run_write`` inside it use the writer's transaction, so a multi-step service
+    write is one job; ``after_commit`` callbacks run once that transaction commits.
+    """
+
+    def __init__(self, maxsize: int, batch_max: int) -> None:
+        self._queue: "queue.Queue[_Job | None]" = queue.Queue(maxsize=maxsize)
+        self._batch_max = max(1, batch_max)
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "batches": 0,
+            "batch_fallbacks": 0,
+            "lock_retries": 0,
+            "conflict_retries": 0,
+            "max_depth": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+        }
+
+    # --- lifecycle -----------------------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+            self._thread.start()
+            log.info("db writer started queue_max=%s batch_max=%s", self._queue.maxsize, self._batch_max)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        log.info("db writer stopped pending=%s", self._queue.qsize())
+
+    # --- submission ----------------------------------------------------------------
+
+    def submit(self, fn: Callable[[Any], T]) -> "Future[T]":
+        future: Future = Future()
+        # Запись изнутри задания писателя: выполняем в той же транзакции,
+        # иначе взаимная блокировка или потеря атомарности
+        inline_con = getattr(self._local, "con", None)
+        if inline_con is not None:
+            try:
+                future.set_result(fn(inline_con))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+
+        # Postgres сам сериализует конкурентные записи — очередь только добавила бы ожидание.
+        # Запись из after_commit-колбэка идёт уже из потока писателя, вне задания: в очередь
+        # её ставить нельзя — поток ждал бы сам себя
+        if DB_BACKEND == "postgres" or threading.current_thread() is self._thread:
+            try:
+                future.set_result(self._run_in_transaction([_Job(fn=fn, future=future)])[0])
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+
+        self._ensure_started()
+        try:
+            self._queue.put(_Job(fn=fn, future=future), timeout=DB_WRITER_SUBMIT_TIMEOUT)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["rejected"] += 1
+            log.warning("db writer queue full depth=%s", self._queue.qsize())
+            raise WriterBusyError("DB writer queue is full")
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+            if depth > self._stats["max_depth"]:
+                self._stats["max_depth"] = depth
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            data = dict(self._stats)
+        data["depth"] = self._queue.qsize()
+        data["queue_max"] = self._queue.maxsize
+        data["running"] = bool(self._thread and self._thread.is_alive())
+        return data
+
+    # --- worker --------------------------------------------------------------------
+
+    def _next_batch(self) -> tuple[List[_Job], bool]:
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        stop = False
+        while len(batch) < self._batch_max:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                stop = True
+                break
+            batch.append(job)
+        return batch, stop
+
+    def _loop(self) -> None:
+        while True:
+            batch, stop = self._next_batch()
+            if batch:
+                self._process(batch)
+            if stop:
+                return
+
+    def _process(self, batch: List[_Job]) -> None:
+        started = time.monotonic()
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            for job in batch:
+                wait_ms = (started - job.enqueued_at) * 1000
+                self._stats["wait_ms_total"] += wait_ms
+                if wait_ms > self._stats["wait_ms_max"]:
+                    self._stats["wait_ms_max"] = wait_ms
+
+        for attempt in range(1, _LOCK_RETRY_ATTEMPTS + 1):
+            try:
+                results = self._run_in_transaction(batch)
+            except Exception as exc:
+                retryable = _is_lock_error(exc) or _is_conflict(exc)
+                if retryable and attempt < _LOCK_RETRY_ATTEMPTS:
+                    with self._stats_lock:
+                        self._stats["lock_retries" if _is_lock_error(exc) else "conflict_retries"] += 1
+                    time.sleep(_LOCK_RETRY_DELAY * attempt)
+                    continue
+                if len(batch) == 1:
+                    self._finish(batch[0], exc=exc)
+                    return
+                break
+            for job, result in zip(batch, results):
+                self._finish(job, result=result)
+            return
+
+        with self._stats_lock:
+            self._stats["batch_fallbacks"] += 1
+        log.warning("db writer batch failed, replaying size=%s one by one", len(batch))
+        for job in batch:
+            try:
+                result = self._run_in_transaction([job])[0]
+            except Exception as exc:
+                self._finish(job, exc=exc)
+            else:
+                self._finish(job, result=result)
+
+    def _run_in_transaction(self, jobs: List[_Job]) -> List[Any]:
+        # Своё соединение, а не привязанное к контексту: в Postgres задание выполняется в
+        # потоке вызывающего, который может быть внутри unit_of_work на чтение
+        with backend_conn(False) as con, bind_transaction(con) as callbacks:
+            con.execute("BEGIN TRANSACTION")
+            self._local.con = con
+            try:
+                results = [job.fn(con) for job in jobs]
+                con.execute("COMMIT")
+            except Exception:
+                try:
+                    con.execute("ROLLBACK")
+                except Exception:
+                    pass
+                raise
+            finally:
+                self._local.con = None
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception:
+                log.exception("db writer after-commit callback failed")
+        return results
+
+    def _finish(self, job: _Job, *, result: Any = None, exc: Optional[Exception] = None) -> None:
+        with self._stats_lock:
+            if exc is None:
+                self._stats["completed"] += 1
+            else:
+                self._stats["failed"] += 1
+        if exc is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(exc)
+
+
+_writer = _Writer(DB_WRITER_QUEUE_MAX, DB_WRITER_BATCH_MAX)
+
+
+def submit_write(fn: Callable[[Any], T]) -> "Future[T]":
+    """Queue ``fn(con)`` on the writer thread and return a future with its result."""
+
+    return _writer.submit(fn)
+
+
+def run_write(fn: Callable[[Any], T]) -> T:
+    """Run ``fn(con)`` on the writer thread and wait for its result."""
+
+    return _writer.submit(fn).result()
+
+
+def writer_stats() -> Dict[str, Any]:
+    return _writer.stats()
+
+
+def stop_writer() -> None:
+    _writer.stop()
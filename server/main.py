@@ -21,7 +21,10 @@ from .config import (
     emit_config_logs,
     reload_tokens,
 )
-from .db.connection import get_conn
+from .db.connection import close_db, get_conn
+from .db import archive, maintenance, sandbox_jobs, sys_events_buffer, token_usage
+from .db.sandbox import close_sandbox
+from .db.writer import WriterBusyError, stop_writer
 from .logging_utils import get_logger
 from .routers import get_api_router
 
@@ -97,6 +100,9 @@ def startup_safe_check() -> None:
         duckdb_exists,
     )
 
+    archive.ensure_views()
+    maintenance.start()
+
     if not SAFE_CHECK_ON_START:
         log.info("boot safe_check=skipped reason=disabled")
         return
@@ -114,6 +120,27 @@ def startup_safe_check() -> None:
         raise SystemExit(1)
 
 
+@app.on_event("shutdown")
+def shutdown_close_db() -> None:
+    maintenance.stop()
+    token_usage.stop()
+    sys_events_buffer.stop()
+    stop_writer()
+    sandbox_jobs.stop()
+    close_sandbox()
+    close_db()
+    log.info("shutdown db_closed=true")
+
+
+def _table_columns(con, table: str) -> list:
+    if DB_BACKEND == "postgres":
+        return con.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = ?",
+            [table],
+        ).fetchall()
+    return con.execute(f"PRAGMA table_info('{table}')").fetchall()
+
+
 def run_safe_check() -> None:
     try:
         tokens = reload_tokens()
@@ -125,7 +152,7 @@ def run_safe_check() -> None:
     with get_conn(read_only=False) as con:
         required_tables = ("users", "metrics", "tracks", "scores")
         for table in required_tables:
-            columns = con.execute(f"PRAGMA table_info('{table}')").fetchall()
+            columns = _table_columns(con, table)
             if not columns:
                 log.critical("bootcheck table_missing table=%s", table)
                 sys.exit(1)
@@ -200,6 +227,12 @@ async def http_exc_handler(request: Request, exc: HTTPException):
 @app.exception_handler(Exception)
 async def unhandled_exc_handler(request: Request, exc: Exception):
     msg = str(exc)
+    if isinstance(exc, WriterBusyError):
+        log.warning("DB WRITER BUSY on %s: %s", request.url.path, msg)
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "DB_BUSY", "hint": "Write queue is full, retry later."},
+        )
     if "Could not set lock on file" in msg or "Conflicting lock is held" in msg:
         log.warning("DB LOCK on %s: %s", request.url.path, msg)
         return JSONResponse(
@@ -1,16 +1,109 @@
 from __future__ import annotations
 
+import threading
+import time
 from dataclasses import dataclass
-from typing import Literal, Optional
+from datetime import timedelta
+from typing import Any, Dict, Literal, Optional, Set
 
 from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from ..config import DEMO_MODE, TOKENS
-from ..db import client_tokens_repo
+from ..config import (
+    CLIENT_TOKEN_CACHE_MAX,
+    CLIENT_TOKEN_CACHE_TTL_SECONDS,
+    CLIENT_TOKEN_REVOCATION_REFRESH_SECONDS,
+    CLIENT_TOKEN_SECRET,
+    DEMO_MODE,
+    SESSION_MAX_TTL_MINUTES,
+    TOKENS,
+)
+from ..db import client_tokens_repo, invalidation, token_usage
+from ..logging_utils import get_logger
+from ..utils.cache import TTLCache
+from ..utils.client_token import SIGNED_TOKEN_PREFIX, SignedTokenError, verify_client_token
 from ..utils.time import ensure_naive_utc, now_utc
 
 security = HTTPBearer(auto_error=False)
+log = get_logger("access")
+
+# Строки client_tokens (срок, revoked, frozen, banned) по token_id. Сроки проверяются
+# при каждом запросе заново; revoke/refresh/freeze в этом процессе сбрасывают запись сразу,
+# изменения из других процессов видны не позже чем через TTL.
+_token_cache: TTLCache[str, Dict[str, Any]] = TTLCache(CLIENT_TOKEN_CACHE_MAX, CLIENT_TOKEN_CACHE_TTL_SECONDS)
+
+
+class _RevocationState:
+    """In-memory snapshot of revoked tokens and banned/frozen users for signed tokens.
+
+    Reloaded from the database at most every ``CLIENT_TOKEN_REVOCATION_REFRESH_SECONDS``
+    and immediately after a local revoke/refresh/freeze. Only one thread reloads; the
+    others keep using the previous snapshot meanwhile.
+    """
+
+    def __init__(self, refresh_seconds: float) -> None:
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._loaded_at: float | None = None
+        self._revoked_tokens: Set[str] = set()
+        self._banned_users: Set[str] = set()
+        self._frozen_users: Set[str] = set()
+
+    def mark_stale(self) -> None:
+        self._loaded_at = None
+
+    def _reload(self) -> None:
+        revoked_since = now_utc() - timedelta(minutes=SESSION_MAX_TTL_MINUTES)
+        state = client_tokens_repo.load_revocation_state(revoked_since=revoked_since)
+        self._revoked_tokens = state["revoked_tokens"]
+        self._banned_users = state["banned_users"]
+        self._frozen_users = state["frozen_users"]
+        self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self) -> None:
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.refresh_seconds:
+            return
+        # Первый раз ждём загрузку, дальше — не блокируемся, если уже грузит другой поток
+        if not self._lock.acquire(blocking=loaded_at is None):
+            return
+        try:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+                self._reload()
+        except Exception:
+            if self._loaded_at is None:
+                raise
+            log.exception("signed token revocation reload failed, keeping previous snapshot")
+        finally:
+            self._lock.release()
+
+    def check(self, token_id: str, user_id: str) -> Optional[str]:
+        self._ensure_fresh()
+        if token_id in self._revoked_tokens:
+            return "revoked"
+        if user_id in self._banned_users:
+            return "banned"
+        if user_id in self._frozen_users:
+            return "frozen"
+        return None
+
+
+_revocations = _RevocationState(CLIENT_TOKEN_REVOCATION_REFRESH_SECONDS)
+
+
+def _on_invalidate(kind: str, key: str) -> None:
+    if kind == "token":
+        _token_cache.invalidate(key)
+    elif kind == "user":
+        _token_cache.invalidate_where(lambda _, row: row.get("user_id") == key)
+    _revocations.mark_stale()
+
+
+invalidation.subscribe(_on_invalidate)
+
+
+def token_cache_stats() -> Dict[str, Any]:
+    return _token_cache.stats()
 
 
 @dataclass(slots=True)
@@ -21,6 +114,7 @@ class Caller:
     token_id: str | None = None
     act_as_user_id: str | None = None
     act_as_telegram_user_id: int | None = None
+    signed: bool = False
 
 
 def _extract_token(
@@ -37,8 +131,19 @@ def _extract_token(
     return None
 
 
-def _validate_client_token(token: str) -> Caller:
+def _load_client_token(token: str) -> Optional[Dict[str, Any]]:
+    row = _token_cache.get(token)
+    if row is not None:
+        return row
+    generation = _token_cache.generation()
     row = client_tokens_repo.get_token(token)
+    if row:
+        _token_cache.put(token, row, generation=generation)
+    return row
+
+
+def _validate_client_token(token: str) -> Caller:
+    row = _load_client_token(token)
     if not row:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     if row.get("revoked_at"):
@@ -66,6 +171,33 @@ def _validate_client_token(token: str) -> Caller:
     )
 
 
+def _validate_signed_token(token: str) -> Caller:
+    try:
+        claims = verify_client_token(CLIENT_TOKEN_SECRET, token)
+    except SignedTokenError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    current_naive = ensure_naive_utc(now_utc())
+    if claims.expires_at < current_naive:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
+
+    reason = _revocations.check(claims.token_id, claims.user_id)
+    if reason == "revoked":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+    if reason == "banned":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="ACCOUNT_BANNED")
+    if reason == "frozen":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="ACCOUNT_FROZEN")
+
+    return Caller(
+        kind="client",
+        user_id=claims.user_id,
+        telegram_user_id=claims.telegram_user_id,
+        token_id=claims.token_id,
+        signed=True,
+    )
+
+
 def require_token(
     *,
     allow_server: bool = True,
@@ -83,7 +215,16 @@ def require_token(
             if token.startswith("ct_"):
                 if not allow_client:
                     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Client token not allowed")
-                return _validate_client_token(token)
+                caller = _validate_client_token(token)
+                token_usage.record(caller.token_id)
+                return caller
+
+            if token.startswith(SIGNED_TOKEN_PREFIX) and CLIENT_TOKEN_SECRET:
+                if not allow_client:
+                    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Client token not allowed")
+                caller = _validate_signed_token(token)
+                token_usage.record(caller.token_id)
+                return caller
 
             role = TOKENS.get(token)
             if role == "server":
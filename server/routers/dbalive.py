@@ -3,8 +3,8 @@ from __future__ import annotations
 from fastapi import APIRouter, Depends
 
 from ..middleware.access import need_server_role
-from ..schemas.dbalive import DBAliveOut
-from ..services.dbalive_service import get_db_status
+from ..schemas.dbalive import ArchiveOut, DBAliveOut, ScoresReclusterOut
+from ..services.dbalive_service import archive_cold, get_db_status, recluster_scores
 
 router = APIRouter(prefix="/dbalive", tags=["db"])
 
@@ -12,3 +12,15 @@ router = APIRouter(prefix="/dbalive", tags=["db"])
 @router.get("", response_model=DBAliveOut)
 def dbalive(role: str = Depends(need_server_role)) -> DBAliveOut:  # noqa: ARG001
     return get_db_status()
+
+
+@router.post("/recluster-scores", response_model=ScoresReclusterOut)
+def dbalive_recluster_scores(role: str = Depends(need_server_role)) -> ScoresReclusterOut:  # noqa: ARG001
+    # Принудительная перестройка вне тихих часов; блокирует запрос на время копирования
+    return recluster_scores()
+
+
+@router.post("/archive", response_model=ArchiveOut)
+def dbalive_archive(role: str = Depends(need_server_role)) -> ArchiveOut:  # noqa: ARG001
+    # Переносит в Parquet всё, что старше SCORES_/SYS_EVENTS_ARCHIVE_AFTER_DAYS, не дожидаясь тихих часов
+    return archive_cold()
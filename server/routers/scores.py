@@ -1,21 +1,40 @@
 from __future__ import annotations
 
-from typing import List
+from datetime import datetime
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
 
 from ..middleware.access import Caller, require_token
-from ..schemas.scores import ScoreOut, ScoresQueryIn
-from ..services.scores_service import get_scores_by_sets
+from ..schemas.scores import (
+    ScoreAggregateOut,
+    ScoreBulkItemIn,
+    ScoreOut,
+    ScoresAggregateIn,
+    ScoresBulkOut,
+    ScoresExportIn,
+    ScoresQueryIn,
+    SmoothedSeriesOut,
+)
+from ..services.profile_series_service import smoothed_series_cached
+from ..services.scores_bulk_service import ARROW_MEDIA_TYPE, ingest_scores
+from ..services.scores_export_service import MEDIA_TYPES, export_scores
+from ..services.scores_service import aggregate_scores, get_scores_by_sets_json
+from ..utils.streaming import ClosingStreamingResponse
 
 router = APIRouter(prefix="/scores", tags=["scores"])
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 @router.post("/query", response_model=List[ScoreOut])
 def scores_query(
     payload: ScoresQueryIn,
     caller: Caller = Depends(require_token(allow_client=True)),  # noqa: ARG001
-) -> List[ScoreOut]:
-    return get_scores_by_sets(
+) -> Response:
+    # Тело собирается в DuckDB, response_model остаётся для схемы OpenAPI
+    body, next_cursor = get_scores_by_sets_json(
         track_ids=payload.track_ids,
         student_ids=payload.student_ids,
         metric_ids=payload.metric_ids,
@@ -23,4 +42,96 @@ def scores_query(
         until=payload.until,
         limit=payload.limit,
         offset=payload.offset,
+        cursor=payload.cursor,
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.post(
+    "/bulk",
+    response_model=ScoresBulkOut,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": ScoreBulkItemIn.model_json_schema()}},
+                ARROW_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+)
+async def scores_bulk(
+    request: Request,
+    all_or_nothing: bool = Query(default=False),
+    caller: Caller = Depends(require_token()),  # noqa: ARG001
+) -> ScoresBulkOut:
+    # Тело читается целиком: JSON-массив или Arrow IPC stream, разбор и запись — в пуле потоков
+    body = await request.body()
+    content_type = request.headers.get("content-type", "application/json")
+    return await run_in_threadpool(ingest_scores, body, content_type, all_or_nothing=all_or_nothing)
+
+
+@router.post("/aggregate", response_model=List[ScoreAggregateOut])
+def scores_aggregate(
+    payload: ScoresAggregateIn,
+    caller: Caller = Depends(require_token(allow_client=True)),
+) -> List[ScoreAggregateOut]:
+    return aggregate_scores(
+        caller,
+        track_ids=payload.track_ids,
+        student_ids=payload.student_ids,
+        metric_ids=payload.metric_ids,
+        since=payload.since,
+        until=payload.until,
+        group_by=payload.group_by,
+        interval=payload.interval,
+        quantiles=payload.quantiles,
+        limit=payload.limit,
+    )
+
+
+@router.post("/export")
+def scores_export(
+    payload: ScoresExportIn,
+    caller: Caller = Depends(require_token()),  # noqa: ARG001
+) -> ClosingStreamingResponse:
+    # Без limit: строки читаются порциями и сразу уходят клиенту — поэтому только server-токен
+    body = export_scores(
+        fmt=payload.format,
+        track_ids=payload.track_ids,
+        student_ids=payload.student_ids,
+        metric_ids=payload.metric_ids,
+        since=payload.since,
+        until=payload.until,
+    )
+    return ClosingStreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[payload.format],
+        headers={"Content-Disposition": f'attachment; filename="scores.{payload.format}"'},
+    )
+
+
+@router.get("/smoothed-series", response_model=SmoothedSeriesOut)
+def scores_smoothed_series(
+    track_id: str = Query(...),
+    student_id: Optional[str] = Query(default=None),
+    metric_id: Optional[str] = Query(default=None),
+    interval: Optional[Literal["day", "week"]] = Query(default=None),
+    max_points: Optional[int] = Query(default=None, ge=1, le=5000),
+    since: Optional[datetime] = Query(default=None),
+    until: Optional[datetime] = Query(default=None),
+    by_metric: bool = Query(default=False),
+    caller: Caller = Depends(require_token(allow_client=True)),
+) -> SmoothedSeriesOut:
+    return smoothed_series_cached(
+        caller,
+        track_id=track_id,
+        student_id=student_id,
+        metric_id=metric_id,
+        interval=interval,
+        max_points=max_points,
+        since=since,
+        until=until,
+        by_metric=by_metric,
     )
@@ -1,36 +1,110 @@
 from __future__ import annotations
 
-from typing import Any, List
+from typing import List, Union
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.responses import FileResponse
 
-from ..db import sandbox
 from ..middleware.access import Caller, need_server_role
+from ..schemas.select import (
+    SelectExplainIn,
+    SelectExplainOut,
+    SelectJobIn,
+    SelectJobOut,
+    SelectJobPageOut,
+    SelectQueryIn,
+    SelectQueryOut,
+)
+from ..services.select_service import (
+    MEDIA_TYPES,
+    cancel_job,
+    explain_select,
+    get_job,
+    job_file,
+    job_page,
+    list_jobs,
+    run_sandbox_select,
+    submit_job,
+)
 
 router = APIRouter(prefix="/select", tags=["select"])
 
 
-class SelectQueryIn(BaseModel):
-    sql: str
-    params: List[Any] = Field(default_factory=list)
+@router.post(
+    "",
+    response_model=SelectQueryOut,
+    responses={
+        200: {
+            "content": {
+                media_type: {"schema": {"type": "string", "format": "binary"}}
+                for fmt, media_type in MEDIA_TYPES.items()
+                if fmt != "json"
+            }
+        }
+    },
+)
+async def run_select(
+    payload: SelectQueryIn,
+    request: Request,
+    caller: Caller = Depends(need_server_role),
+) -> Union[SelectQueryOut, Response]:
+    del caller
+    return await run_sandbox_select(payload, request)
 
 
-class SelectQueryOut(BaseModel):
-    columns: List[str]
-    rows: List[List[Any]]
+@router.post("/explain", response_model=SelectExplainOut)
+def run_explain(
+    payload: SelectExplainIn,
+    caller: Caller = Depends(need_server_role),
+) -> SelectExplainOut:
+    """Plan a query without running it and show the cost guard's verdict."""
 
+    del caller
+    return explain_select(payload)
 
-@router.post("", response_model=SelectQueryOut)
-def run_select(
-    payload: SelectQueryIn,
+
+@router.post("/jobs", response_model=SelectJobOut, status_code=status.HTTP_202_ACCEPTED)
+def select_job_submit(
+    payload: SelectJobIn,
     caller: Caller = Depends(need_server_role),
-) -> SelectQueryOut:
-    del caller
-    try:
-        columns, rows = sandbox.select(payload.sql, payload.params)
-    except ValueError as exc:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-    except FileNotFoundError as exc:
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc)) from exc
-    return SelectQueryOut(columns=columns, rows=rows)
+) -> SelectJobOut:
+    del caller
+    return submit_job(payload)
+
+
+@router.get("/jobs", response_model=List[SelectJobOut])
+def select_job_list(caller: Caller = Depends(need_server_role)) -> List[SelectJobOut]:
+    del caller
+    return list_jobs()
+
+
+@router.get("/jobs/{job_id}", response_model=SelectJobOut)
+def select_job_get(job_id: str, caller: Caller = Depends(need_server_role)) -> SelectJobOut:
+    del caller
+    return get_job(job_id)
+
+
+@router.delete("/jobs/{job_id}", response_model=SelectJobOut)
+def select_job_cancel(job_id: str, caller: Caller = Depends(need_server_role)) -> SelectJobOut:
+    """Cancel a queued or running job; a finished job is dropped with its result file."""
+
+    del caller
+    return cancel_job(job_id)
+
+
+@router.get("/jobs/{job_id}/rows", response_model=SelectJobPageOut)
+def select_job_rows(
+    job_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=1000, ge=1, le=10000),
+    caller: Caller = Depends(need_server_role),
+) -> SelectJobPageOut:
+    del caller
+    return job_page(job_id, offset, limit)
+
+
+@router.get("/jobs/{job_id}/parquet", response_class=FileResponse)
+def select_job_parquet(job_id: str, caller: Caller = Depends(need_server_role)) -> FileResponse:
+    del caller
+    name, path = job_file(job_id)
+    return FileResponse(path, media_type=MEDIA_TYPES["parquet"], filename=f"{name}.parquet")
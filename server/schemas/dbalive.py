@@ -1,10 +1,109 @@
 from __future__ import annotations
 
-from typing import Literal
+from typing import Dict, Literal
 
 from pydantic import BaseModel
 
 
+class WriterStatsOut(BaseModel):
+    running: bool
+    depth: int
+    queue_max: int
+    max_depth: int
+    submitted: int
+    completed: int
+    failed: int
+    rejected: int
+    batches: int
+    batch_fallbacks: int
+    lock_retries: int
+    conflict_retries: int
+    wait_ms_total: float
+    wait_ms_max: float
+
+
+class SandboxCacheStatsOut(BaseModel):
+    size: int
+    bytes: int
+    max_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    skipped: int
+
+
+class SandboxStatsOut(BaseModel):
+    generation: int
+    refreshes: int
+    refresh_ms_last: float
+    method: str | None = None
+    age_seconds: float | None = None
+    in_use: int
+    pool_size: int
+    queries: int
+    timeouts: int
+    cancelled: int
+    truncated: int
+    rejected: int
+    cache: SandboxCacheStatsOut
+
+
+class CacheStatsOut(BaseModel):
+    size: int
+    maxsize: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+
+
+class SysEventsBufferStatsOut(BaseModel):
+    depth: int
+    queue_max: int
+    queued: int
+    inserted: int
+    batches: int
+    spooled: int
+    replayed: int
+    flush_failures: int
+    spool_pending: bool
+
+
+class ScoresLayoutOut(BaseModel):
+    rows: int
+    row_groups: int
+    track_scan: float
+    track_scan_sorted: float
+    student_scan: float
+
+
+class ScoresReclusterOut(BaseModel):
+    status: Literal["done", "skipped"]
+    reason: str | None = None
+    started_at: str
+    finished_at: str | None = None
+    before: ScoresLayoutOut | None = None
+    after: ScoresLayoutOut | None = None
+    copied: int | None = None
+    caught_up: int | None = None
+    build_ms: float | None = None
+    swap_ms: float | None = None
+
+
+class ArchiveTableOut(BaseModel):
+    rows: int
+    files: int
+    cutoff: str | None = None
+    ms: float | None = None
+
+
+class ArchiveOut(BaseModel):
+    started_at: str
+    finished_at: str | None = None
+    tables: Dict[str, ArchiveTableOut]
+
+
 class DBAliveOut(BaseModel):
     ok: bool = True
     backend: Literal["duckdb", "postgres"]
@@ -16,3 +115,9 @@ class DBAliveOut(BaseModel):
     student_count: int
     curator_count: int
     track_count: int
+    writer: WriterStatsOut | None = None
+    token_cache: CacheStatsOut | None = None
+    sys_events: SysEventsBufferStatsOut | None = None
+    scores_recluster: ScoresReclusterOut | None = None
+    archive: ArchiveOut | None = None
+    sandbox: SandboxStatsOut | None = None
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from typing import List, Literal
+from datetime import date
+from typing import Dict, List, Literal
 
 from pydantic import BaseModel, Field
 
+from .scores import SmoothedSeriesOut
 from .tracks import TrackSummaryOut
 from .users import CuratorOut, TrackWithTeachersOut
 
@@ -54,7 +56,29 @@ class ProfileTrackOut(BaseModel):
     joined_at: str | None = None
 
 
+class RoleSummaryOut(BaseModel):
+    count: int
+    mean: float | None = None
+
+
+class SeriesSummaryOut(BaseModel):
+    scores_total: int
+    metrics_total: int
+    first_bucket: date | None = None
+    last_measured_at: str | None = None
+    by_role: Dict[str, RoleSummaryOut] = Field(default_factory=dict)
+
+
+class ProfileChartOut(BaseModel):
+    track_id: str
+    title: str
+    series: SmoothedSeriesOut
+    summary: SeriesSummaryOut
+    computed_at: str | None = None
+
+
 class ProfileResponseOut(BaseModel):
     profile_type: ProfileType
     header: ProfileHeaderOut | None = None
     tracks: List[ProfileTrackOut] = Field(default_factory=list)
+    charts: List[ProfileChartOut] = Field(default_factory=list)
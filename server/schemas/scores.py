@@ -1,7 +1,7 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime
+from typing import Annotated, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -28,3 +28,81 @@ class ScoresQueryIn(BaseModel):
     until: Optional[datetime] = None
     limit: int = Field(200, ge=1, le=2000)
     offset: int = Field(0, ge=0)
+    # Непрозрачный курсор из заголовка X-Next-Cursor предыдущего ответа; заменяет offset
+    cursor: Optional[str] = None
+
+
+class ScoresExportIn(BaseModel):
+    track_ids: Optional[List[str]] = None
+    student_ids: Optional[List[str]] = None
+    metric_ids: Optional[List[str]] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    format: Literal["ndjson", "csv", "arrow"] = "ndjson"
+
+
+class ScoreBulkItemIn(BaseModel):
+    # Диапазоны и ссылки проверяются в БД построчно, здесь только типы
+    score_id: Optional[str] = None
+    track_id: str
+    step_id: Optional[str] = None
+    student_id: str
+    metric_id: str
+    raw_value: int
+    rater_user_id: str
+    role_at_rate: str
+    comment: Optional[str] = None
+    measured_at: Optional[datetime] = None
+
+
+class ScoreBulkErrorOut(BaseModel):
+    index: int
+    score_id: Optional[str] = None
+    errors: List[str]
+
+
+class ScoresBulkOut(BaseModel):
+    received: int
+    inserted: int
+    rejected: int
+    errors: List[ScoreBulkErrorOut] = Field(default_factory=list)
+
+
+class ScoresAggregateIn(BaseModel):
+    track_ids: Optional[List[str]] = None
+    student_ids: Optional[List[str]] = None
+    metric_ids: Optional[List[str]] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    group_by: List[Literal["track", "metric", "role", "student"]] = Field(default_factory=list)
+    interval: Optional[Literal["day", "week", "month"]] = None
+    quantiles: List[Annotated[float, Field(ge=0, le=1)]] = Field(default_factory=lambda: [0.5, 0.9], max_length=10)
+    limit: int = Field(1000, ge=1, le=10000)
+
+
+class ScoreAggregateOut(BaseModel):
+    track_id: Optional[str] = None
+    metric_id: Optional[str] = None
+    role_at_rate: Optional[str] = None
+    student_id: Optional[str] = None
+    bucket: Optional[date] = None
+    count: int
+    mean: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    # Ключи вида "p50", "p90"; на DuckDB значения приближённые
+    quantiles: Dict[str, Optional[float]] = Field(default_factory=dict)
+
+
+class SmoothedPointOut(BaseModel):
+    t: date
+    self_weighted: Optional[float] = None
+    teacher_weighted: Optional[float] = None
+    mentor_weighted: Optional[float] = None
+    composite: Optional[float] = None
+
+
+class SmoothedSeriesOut(BaseModel):
+    interval: Literal["day", "week"]
+    points: List[SmoothedPointOut]
+    by_metric: Optional[Dict[str, List[SmoothedPointOut]]] = None
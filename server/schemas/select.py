@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from typing import Any, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class SelectQueryIn(BaseModel):
+    sql: str
+    params: List[Any] = Field(default_factory=list)
+    max_rows: Optional[int] = Field(default=None, ge=1)
+    timeout_seconds: Optional[float] = Field(default=None, gt=0)
+    use_cache: bool = True
+    profile: bool = False
+    format: Optional[Literal["json", "arrow", "parquet", "csv"]] = None  # иначе по заголовку Accept
+
+
+class SelectProfileOperatorOut(BaseModel):
+    depth: int
+    name: str
+    rows: int
+    estimated_rows: Optional[int] = None
+    time_ms: float
+
+
+class SelectProfileOut(BaseModel):
+    latency_ms: float
+    cpu_ms: float
+    rows_scanned: int
+    peak_memory_bytes: int
+    operators: List[SelectProfileOperatorOut]
+
+
+class SelectQueryOut(BaseModel):
+    columns: List[str]
+    rows: List[List[Any]]
+    row_count: int
+    truncated: bool = False
+    truncated_by: Optional[Literal["rows", "bytes"]] = None
+    elapsed_ms: float
+    cached: bool = False
+    profile: Optional[SelectProfileOut] = None
+
+
+class SelectExplainIn(BaseModel):
+    sql: str
+    params: List[Any] = Field(default_factory=list)
+
+
+class SelectPlanOperatorOut(BaseModel):
+    depth: int
+    name: str
+    estimated_rows: int
+    cost: int
+
+
+class SelectExplainOut(BaseModel):
+    allowed: bool
+    estimated_rows: int
+    costliest_operator: Optional[str] = None
+    limit: int
+    job_limit: int
+    allowed_as_job: bool
+    operators: List[SelectPlanOperatorOut]
+
+
+class SelectJobIn(BaseModel):
+    sql: str
+    params: List[Any] = Field(default_factory=list)
+
+
+class SelectJobOut(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "done", "failed", "cancelled"]
+    sql: str
+    submitted_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    queue_ms: Optional[float] = None
+    run_ms: Optional[float] = None
+    columns: List[str] = Field(default_factory=list)
+    row_count: Optional[int] = None
+    file_bytes: Optional[int] = None
+    error: Optional[str] = None
+
+
+class SelectJobPageOut(BaseModel):
+    job_id: str
+    columns: List[str]
+    rows: List[List[Any]]
+    offset: int
+    row_count: int
+    total_rows: int
@@ -66,3 +66,4 @@ class ClientTokenRefreshIn(BaseModel):
 
 class ClientTokenRefreshOut(BaseModel):
     expires_at: str
+    client_token: str | None = None
@@ -1,10 +1,58 @@
 from __future__ import annotations
 
-from ..db import stats_repo
-from ..schemas.dbalive import DBAliveOut
+from typing import Any, Dict
+
+from ..db import archive, maintenance, stats_repo
+from ..db.sandbox import sandbox_stats
+from ..db.sys_events_buffer import buffer_stats
+from ..db.writer import writer_stats
+from ..middleware.access import token_cache_stats
+from ..schemas.dbalive import (
+    ArchiveOut,
+    ArchiveTableOut,
+    CacheStatsOut,
+    DBAliveOut,
+    SandboxStatsOut,
+    ScoresReclusterOut,
+    SysEventsBufferStatsOut,
+    WriterStatsOut,
+)
 from ..utils.time import now_utc, to_warsaw_iso
 
 
+def _recluster_out(report: Dict[str, Any]) -> ScoresReclusterOut:
+    finished_at = report.get("finished_at")
+    return ScoresReclusterOut(
+        **{
+            **report,
+            "started_at": to_warsaw_iso(report["started_at"]),
+            "finished_at": to_warsaw_iso(finished_at) if finished_at else None,
+        }
+    )
+
+
+def _archive_out(report: Dict[str, Any]) -> ArchiveOut:
+    finished_at = report.get("finished_at")
+    return ArchiveOut(
+        started_at=to_warsaw_iso(report["started_at"]),
+        finished_at=to_warsaw_iso(finished_at) if finished_at else None,
+        tables={
+            table: ArchiveTableOut(
+                **{**result, "cutoff": result["cutoff"].isoformat() if result.get("cutoff") else None}
+            )
+            for table, result in report["tables"].items()
+        },
+    )
+
+
+def archive_cold() -> ArchiveOut:
+    return _archive_out(archive.archive_cold())
+
+
+def recluster_scores() -> ScoresReclusterOut:
+    return _recluster_out(maintenance.recluster_scores(force=True))
+
+
 def get_db_status() -> DBAliveOut:
     stats = stats_repo.fetch_db_health()
     last_event = stats.get("last_sys_event_at")
@@ -12,6 +60,8 @@ def get_db_status() -> DBAliveOut:
     last_system_message = stats.get("last_system_message_at")
     last_system_message_iso = to_warsaw_iso(last_system_message) if last_system_message else None
     generated_at = to_warsaw_iso(now_utc())
+    recluster = maintenance.last_recluster()
+    archived = archive.last_archive()
 
     return DBAliveOut(
         ok=True,
@@ -24,4 +74,10 @@ def get_db_status() -> DBAliveOut:
         student_count=stats["student_count"],
         curator_count=stats["curator_count"],
         track_count=stats["track_count"],
+        writer=WriterStatsOut(**writer_stats()),
+        token_cache=CacheStatsOut(**token_cache_stats()),
+        sys_events=SysEventsBufferStatsOut(**buffer_stats()),
+        scores_recluster=_recluster_out(recluster) if recluster else None,
+        archive=_archive_out(archived) if archived else None,
+        sandbox=SandboxStatsOut(**sandbox_stats()),
     )
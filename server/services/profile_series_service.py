@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import (
+    PROFILES_RECHECK_SECONDS,
+    SMOOTH_GAP_STRATEGY,
+    SMOOTH_SERIES_INTERVAL,
+    SMOOTH_SERIES_MAX_POINTS,
+    SMOOTH_WEIGHTS,
+)
+from ..db import profiles_repo, scores_repo
+from ..logging_utils import get_logger
+from ..middleware.access import Caller
+from ..schemas.profiles import RoleSummaryOut, SeriesSummaryOut
+from ..schemas.scores import SmoothedSeriesOut
+from ..utils.time import now_utc, to_warsaw_iso
+from .scores_series_service import EMA_ALPHA, build_series, smoothed_series
+from .scores_service import ensure_scores_access
+
+log = get_logger("services.profile_series")
+
+PROFILE_TYPE = "series"
+FORMAT_VERSION = "series-v1"
+
+BucketRow = Tuple[str, str, date, float, int]
+
+# profile_id -> (счётчик области, source_hash, когда сверяли) на момент последней полной проверки
+_verified_lock = threading.Lock()
+_verified: Dict[str, Tuple[int, str, float]] = {}
+
+
+def _still_fresh(profile_id: str, version: int, stored: Dict[str, Any]) -> bool:
+    with _verified_lock:
+        seen = _verified.get(profile_id)
+    if seen is None:
+        return False
+    seen_version, seen_hash, checked_at = seen
+    return (
+        seen_version == version
+        and seen_hash == stored["source_hash"]
+        and time.monotonic() - checked_at < PROFILES_RECHECK_SECONDS
+    )
+
+
+def _remember(profile_id: str, version: int, source_hash: str) -> None:
+    with _verified_lock:
+        _verified[profile_id] = (version, source_hash, time.monotonic())
+
+
+def _profile_id(track_id: str, student_id: Optional[str]) -> Tuple[str, str]:
+    if student_id:
+        return f"{PROFILE_TYPE}:student_track:{track_id}:{student_id}", "student_track"
+    return f"{PROFILE_TYPE}:track:{track_id}", "track"
+
+
+def _params() -> Dict[str, Any]:
+    # Всё, от чего зависит готовая серия; при смене настроек пересчёт идёт из корзин без чтения scores
+    return {
+        "interval": SMOOTH_SERIES_INTERVAL,
+        "max_points": SMOOTH_SERIES_MAX_POINTS,
+        "alpha": EMA_ALPHA,
+        "gap": SMOOTH_GAP_STRATEGY,
+        "weights": dict(sorted(SMOOTH_WEIGHTS.items())),
+    }
+
+
+def _load_buckets(data: Dict[str, Any]) -> List[BucketRow]:
+    return [(m, role, date.fromisoformat(b), s, c) for m, role, b, s, c in data["buckets"]]
+
+
+def _merge(old: List[BucketRow], new: List[BucketRow]) -> List[BucketRow]:
+    """Add new bucket sums onto stored ones; a bucket split by the cutoff is summed up."""
+
+    merged: Dict[Tuple[str, str, date], List[float]] = {(m, r, b): [s, c] for m, r, b, s, c in old}
+    for m, r, b, s, c in new:
+        acc = merged.setdefault((m, r, b), [0.0, 0])
+        acc[0] += s
+        acc[1] += c
+    return [(m, r, b, s, c) for (m, r, b), (s, c) in sorted(merged.items(), key=lambda kv: kv[0][2])]
+
+
+def _summary(rows: List[BucketRow], last_at: Optional[datetime]) -> Dict[str, Any]:
+    by_role: Dict[str, List[float]] = {}
+    for _, role, _, s, c in rows:
+        acc = by_role.setdefault(role, [0.0, 0])
+        acc[0] += s
+        acc[1] += c
+    return {
+        "scores_total": int(sum(c for *_, c in rows)),
+        "metrics_total": len({m for m, *_ in rows}),
+        "first_bucket": min(b for _, _, b, _, _ in rows).isoformat() if rows else None,
+        "last_measured_at": last_at.isoformat() if last_at else None,
+        "by_role": {
+            role: {"count": int(c), "mean": round(s / c, 2) if c else None} for role, (s, c) in by_role.items()
+        },
+    }
+
+
+def _materialize(track_id: str, student_id: Optional[str]) -> Dict[str, Any]:
+    """Return the stored series for a scope, refreshing it first if its scores moved.
+
+    The stored row keeps per-bucket sums next to the finished series. When the only
+    change is new scores after ``source_last_at``, just those rows are aggregated and
+    merged in; any other change (edits, deletes, backdated rows) rebuilds the scope.
+    The content hash is only recomputed when the scope's change counter moved since the
+    last check, on the first read after a restart, or every ``PROFILES_RECHECK_SECONDS``;
+    otherwise a read is the primary-key lookup of the stored row.
+    """
+
+    profile_id, scope_kind = _profile_id(track_id, student_id)
+    params = _params()
+    # Счётчик читаем до проверки: запись, закоммиченная после, сдвинет его и вызовет новую
+    version = profiles_repo.watermark(track_id, student_id)
+    stored = profiles_repo.get_profile(profile_id)
+    if stored and stored["format_version"] != FORMAT_VERSION:
+        stored = None
+    if stored and stored["data"]["params"] == params and _still_fresh(profile_id, version, stored):
+        return stored
+    cutoff = stored["source_last_at"] if stored else None
+    (last_at, source_hash), head_hash = profiles_repo.source_state(track_id, student_id=student_id, cutoff=cutoff)
+
+    data = stored["data"] if stored else None
+    fresh = stored is not None and stored["source_hash"] == source_hash
+    if fresh and data["params"] == params:
+        _remember(profile_id, version, source_hash)
+        return stored
+
+    reusable = data is not None and data["params"]["interval"] == params["interval"]
+    if reusable and fresh:
+        mode = "params"
+        rows = _load_buckets(data)
+    elif reusable and head_hash == stored["source_hash"]:
+        mode = "delta"
+        delta = scores_repo.series_buckets(
+            track_id, student_id=student_id, after=cutoff, interval=params["interval"]
+        )
+        rows = _merge(_load_buckets(data), delta)
+    else:
+        mode = "full"
+        rows = scores_repo.series_buckets(track_id, student_id=student_id, interval=params["interval"])
+
+    series = build_series(rows, interval=params["interval"], max_points=params["max_points"], by_metric=True)
+    data = {
+        "params": params,
+        "buckets": [[m, r, b.isoformat(), s, c] for m, r, b, s, c in rows],
+        "series": series.model_dump(mode="json"),
+        "summary": _summary(rows, last_at),
+    }
+    profiles_repo.upsert_profile(
+        profile_id=profile_id,
+        profile_type=PROFILE_TYPE,
+        scope_kind=scope_kind,
+        track_id=track_id,
+        user_id=student_id,
+        data=data,
+        source_last_at=last_at,
+        source_hash=source_hash,
+        format_version=FORMAT_VERSION,
+    )
+    _remember(profile_id, version, source_hash)
+    log.info("Refreshed %s mode=%s buckets=%s", profile_id, mode, len(rows))
+    return {"data": data, "computed_at": now_utc()}
+
+
+def materialized_series(
+    track_id: str, student_id: Optional[str] = None
+) -> Tuple[SmoothedSeriesOut, SeriesSummaryOut, str]:
+    """Return ``(series, summary, computed_at)`` for a student in a track, or for a whole track."""
+
+    profile = _materialize(track_id, student_id)
+    summary = dict(profile["data"]["summary"])
+    last_measured_at = summary.pop("last_measured_at")
+    by_role = summary.pop("by_role")
+    return (
+        SmoothedSeriesOut(**profile["data"]["series"]),
+        SeriesSummaryOut(
+            **summary,
+            last_measured_at=to_warsaw_iso(datetime.fromisoformat(last_measured_at)) if last_measured_at else None,
+            by_role={role: RoleSummaryOut(**value) for role, value in by_role.items()},
+        ),
+        to_warsaw_iso(profile["computed_at"]),
+    )
+
+
+def smoothed_series_cached(
+    caller: Caller,
+    *,
+    track_id: str,
+    student_id: Optional[str] = None,
+    metric_id: Optional[str] = None,
+    interval: Optional[str] = None,
+    max_points: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    by_metric: bool = False,
+) -> SmoothedSeriesOut:
+    """Serve the default-shaped series from ``profiles``; anything narrower is computed live.
+
+    A client caller gets only its own series or one of a track it teaches, else ``403``.
+    """
+
+    ensure_scores_access(caller, track_ids=[track_id], student_ids=[student_id] if student_id else None)
+    default_shape = (
+        metric_id is None
+        and since is None
+        and until is None
+        and interval in (None, SMOOTH_SERIES_INTERVAL)
+        and (max_points or SMOOTH_SERIES_MAX_POINTS) <= SMOOTH_SERIES_MAX_POINTS
+    )
+    if not default_shape:
+        return smoothed_series(
+            track_id=track_id,
+            student_id=student_id,
+            metric_id=metric_id,
+            interval=interval,
+            max_points=max_points,
+            since=since,
+            until=until,
+            by_metric=by_metric,
+        )
+
+    series, _, _ = materialized_series(track_id, student_id)
+    limit = max_points or SMOOTH_SERIES_MAX_POINTS
+    per_metric = None
+    if by_metric:
+        per_metric = {m: points[-limit:] for m, points in (series.by_metric or {}).items()}
+    return SmoothedSeriesOut(interval=series.interval, points=series.points[-limit:], by_metric=per_metric)
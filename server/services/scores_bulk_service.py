@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+from fastapi import HTTPException, status
+from pydantic import TypeAdapter, ValidationError
+
+from ..config import SCORES_BULK_MAX_ROWS
+from ..db import scores_repo
+from ..logging_utils import get_logger
+from ..schemas.scores import ScoreBulkErrorOut, ScoreBulkItemIn, ScoresBulkOut
+from ..utils.ids import new_id
+from ..utils.time import ensure_naive_utc, now_utc
+
+log = get_logger("services.scores_bulk")
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+_ITEMS = TypeAdapter(List[ScoreBulkItemIn])
+_REQUIRED = ("track_id", "student_id", "metric_id", "raw_value", "rater_user_id", "role_at_rate")
+
+
+def _too_large(size: int) -> None:
+    if size > SCORES_BULK_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {SCORES_BULK_MAX_ROWS} scores per request",
+        )
+
+
+def _columns_from_json(body: bytes) -> Dict[str, List[Any]]:
+    try:
+        items = _ITEMS.validate_json(body)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors()) from exc
+    _too_large(len(items))
+    return {name: [getattr(item, name) for item in items] for name, _ in scores_repo.BULK_COLUMNS}
+
+
+def _columns_from_arrow(body: bytes) -> Dict[str, List[Any]]:
+    try:
+        import pyarrow as pa
+    except ImportError as exc:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Arrow input requires pyarrow") from exc
+
+    try:
+        table = pa.ipc.open_stream(body).read_all()
+    except (pa.ArrowInvalid, OSError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed Arrow IPC stream") from exc
+    missing = [name for name in _REQUIRED if name not in table.column_names]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Missing columns: {', '.join(missing)}"
+        )
+    _too_large(table.num_rows)
+
+    types = {"VARCHAR": pa.string(), "INTEGER": pa.int32(), "TIMESTAMP": pa.timestamp("us", tz="UTC")}
+    columns: Dict[str, List[Any]] = {}
+    for name, kind in scores_repo.BULK_COLUMNS:
+        if name not in table.column_names:
+            columns[name] = [None] * table.num_rows
+            continue
+        try:
+            columns[name] = table.column(name).cast(types[kind]).to_pylist()
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=f"Column {name} cannot be read as {kind}"
+            ) from exc
+    return columns
+
+
+def ingest_scores(body: bytes, content_type: str, *, all_or_nothing: bool = False) -> ScoresBulkOut:
+    """Insert a JSON array or an Arrow IPC stream of scores in one transaction.
+
+    Missing ``score_id`` values are generated and missing ``measured_at`` defaults to now.
+    Rows failing the ``scores`` constraints or pointing at unknown tracks, metrics or
+    users are reported by index and skipped (or reject the batch with ``all_or_nothing``).
+    """
+
+    if content_type.split(";")[0].strip().lower() == ARROW_MEDIA_TYPE:
+        columns = _columns_from_arrow(body)
+    else:
+        columns = _columns_from_json(body)
+
+    now = ensure_naive_utc(now_utc())
+    columns["score_id"] = [sid or new_id("sc_") for sid in columns["score_id"]]
+    columns["measured_at"] = [ensure_naive_utc(ts) if ts else now for ts in columns["measured_at"]]
+
+    received = len(columns["score_id"])
+    inserted, failures = scores_repo.insert_bulk(columns, all_or_nothing=all_or_nothing)
+    errors = [
+        ScoreBulkErrorOut(index=idx, score_id=columns["score_id"][idx], errors=reasons.split(","))
+        for idx, reasons in failures
+    ]
+    log.info("Bulk scores received=%s inserted=%s rejected=%s", received, inserted, received - inserted)
+    return ScoresBulkOut(received=received, inserted=inserted, rejected=received - inserted, errors=errors)
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import csv
+import io
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import anyio
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+
+from ..config import SCORES_EXPORT_CHUNK_ROWS
+from ..db import scores_repo
+from ..db.connection import RowStream
+from ..logging_utils import get_logger
+
+log = get_logger("services.scores_export")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Колонки и типы совпадают с ScoreOut, чтобы все форматы выгрузки были взаимозаменяемы
+_COLUMNS = [
+    "score_id",
+    "step_id",
+    "track_id",
+    "student_id",
+    "metric_id",
+    "metric_name",
+    "value_raw",
+    "rater_user_id",
+    "role_at_rate",
+    "comment",
+    "occurred_at",
+]
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [(name, pa.string()) for name in _COLUMNS[:6]]
+        + [("value_raw", pa.float64())]
+        + [(name, pa.string()) for name in _COLUMNS[7:10]]
+        + [("occurred_at", pa.timestamp("us"))]
+    )
+
+
+def _row_chunks(stream: Optional[RowStream]) -> Iterator[List[Any]]:
+    if stream is None:
+        return
+    while True:
+        rows = stream.fetchmany(SCORES_EXPORT_CHUNK_ROWS)
+        if not rows:
+            return
+        yield rows
+
+
+def _arrow_batches(stream: Optional[RowStream]) -> Iterator[Any]:
+    """Yield RecordBatches in the export schema, natively when the backend allows it."""
+
+    import pyarrow as pa
+
+    schema = _arrow_schema()
+    if stream is not None and stream.supports_arrow:
+        while True:
+            batch = stream.fetch_arrow(SCORES_EXPORT_CHUNK_ROWS)
+            if batch is None:
+                return
+            if batch.num_rows:
+                yield pa.Table.from_batches([batch]).cast(schema).combine_chunks().to_batches()[0]
+        return
+    for rows in _row_chunks(stream):
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        )
+
+
+def _encode_ndjson(stream: Optional[RowStream]) -> Iterator[bytes]:
+    for rows in _row_chunks(stream):
+        yield ("\n".join(row[0] for row in rows) + "\n").encode("utf-8")
+
+
+def _encode_csv(stream: Optional[RowStream]) -> Iterator[bytes]:
+    if stream is not None and stream.supports_arrow and _has_pyarrow():
+        yield from _encode_csv_arrow(stream)
+        return
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(_COLUMNS)
+    for rows in _row_chunks(stream):
+        writer.writerows(
+            [value.isoformat(timespec="microseconds") if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _encode_csv_arrow(stream: RowStream) -> Iterator[bytes]:
+    import pyarrow.compute as pc
+    import pyarrow.csv as pcsv
+
+    yield (",".join(_COLUMNS) + "\n").encode("utf-8")
+    options = pcsv.WriteOptions(include_header=False)
+    idx = _COLUMNS.index("occurred_at")
+    for batch in _arrow_batches(stream):
+        # Тот же вид времени, что и у csv-модуля: ISO с микросекундами
+        batch = batch.set_column(idx, "occurred_at", pc.strftime(batch.column(idx), format="%Y-%m-%dT%H:%M:%S"))
+        buf = io.BytesIO()
+        pcsv.write_csv(batch, buf, write_options=options)
+        yield buf.getvalue()
+
+
+def _encode_arrow(stream: Optional[RowStream]) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    buf = io.BytesIO()
+    writer = pa.ipc.new_stream(buf, _arrow_schema())
+    for batch in _arrow_batches(stream):
+        writer.write_batch(batch)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    writer.close()
+    yield buf.getvalue()
+
+
+_ENCODERS = {"ndjson": _encode_ndjson, "csv": _encode_csv, "arrow": _encode_arrow}
+
+
+def export_scores(
+    *,
+    fmt: str,
+    track_ids: Optional[List[str]] = None,
+    student_ids: Optional[List[str]] = None,
+    metric_ids: Optional[List[str]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> AsyncIterator[bytes]:
+    """Stream every score matching the filters, ``SCORES_EXPORT_CHUNK_ROWS`` rows at a time.
+
+    Only one chunk is held in memory. Closing the iterator (ClosingStreamingResponse does it
+    when the client goes away) interrupts the query and releases its cursor.
+    """
+
+    if fmt == "arrow" and not _has_pyarrow():
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Arrow export requires pyarrow")
+    encode = _ENCODERS[fmt]
+
+    async def body() -> AsyncIterator[bytes]:
+        stream = await run_in_threadpool(
+            scores_repo.open_stream_by_sets,
+            track_ids=track_ids,
+            student_ids=student_ids,
+            metric_ids=metric_ids,
+            since=since,
+            until=until,
+            as_json=fmt == "ndjson",
+        )
+        parts = encode(stream)
+        sent = 0
+        done = False
+        try:
+            while True:
+                part = await run_in_threadpool(next, parts, None)
+                if part is None:
+                    done = True
+                    return
+                sent += len(part)
+                yield part
+        finally:
+            if not done:
+                log.info("scores export stopped early format=%s bytes=%s", fmt, sent)
+            if stream is not None:
+                # Останавливаем выборку, если поток пула ещё внутри fetchmany, затем ждём его и закрываем
+                stream.interrupt()
+                with anyio.CancelScope(shield=True):
+                    await run_in_threadpool(stream.close)
+
+    return body()
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import math
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+
+from ..config import SMOOTH_GAP_STRATEGY, SMOOTH_SERIES_INTERVAL, SMOOTH_SERIES_MAX_POINTS, SMOOTH_WEIGHTS
+from ..db import scores_repo
+from ..schemas.scores import SmoothedPointOut, SmoothedSeriesOut
+from ..utils.time import ensure_naive_utc
+
+# Сглаживание зафиксировано техзаданием: EMA с α=0.3
+EMA_ALPHA = 0.3
+
+# Порядок ролей в массивах; student в ответе называется self
+_ROLES = ("student", "teacher", "mentor")
+_STEP_DAYS = {"day": 1, "week": 7}
+
+
+def _numpy():
+    try:
+        import numpy as np
+    except ImportError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Smoothed series require numpy"
+        ) from exc
+    return np
+
+
+def _bucket_start(value: datetime, interval: str) -> date:
+    day = ensure_naive_utc(value).date()
+    if interval == "week":
+        day -= timedelta(days=day.weekday())
+    return day
+
+
+def _fill_gaps(np, values, strategy: str):
+    """Fill interior gaps of each row; cells before a row's first value stay NaN."""
+
+    valid = ~np.isnan(values)
+    positions = np.arange(values.shape[-1])
+    if strategy == "carry":
+        last = np.where(valid, positions, -1)
+        np.maximum.accumulate(last, axis=-1, out=last)
+        filled = np.take_along_axis(values, np.maximum(last, 0), axis=-1)
+        return np.where(last >= 0, filled, np.nan)
+    filled = np.full_like(values, np.nan)
+    for row in np.flatnonzero(valid.any(axis=-1)):
+        known = valid[row]
+        start = int(np.argmax(known))
+        # np.interp держит крайнее значение за последней точкой — это и есть carry на хвосте
+        filled[row, start:] = np.interp(positions[start:], positions[known], values[row, known])
+    return filled
+
+
+def _ema(np, values, alpha: float):
+    """EMA along the last axis without a per-point loop.
+
+    Uses y[t] = (1-a)^t * (y[0] + a * sum_{k=1..t} x[k] * (1-a)^-k), evaluated in blocks
+    short enough for (1-a)^-k to stay finite. Leading NaNs are preserved and the EMA is
+    seeded with each row's first value.
+    """
+
+    lead = np.isnan(values)
+    lead &= np.logical_and.accumulate(lead, axis=-1)
+    first = np.take_along_axis(values, np.argmax(~lead, axis=-1)[..., None], axis=-1)
+    x = np.where(lead, first, values)
+    x = np.nan_to_num(x)
+
+    decay = 1.0 - alpha
+    out = np.empty_like(x)
+    block = max(1, int(150 * math.log(10) / -math.log(decay)))
+    prev = x[..., :1]
+    for start in range(0, x.shape[-1], block):
+        chunk = x[..., start:start + block]
+        k = np.arange(1, chunk.shape[-1] + 1)
+        grow = decay ** -k
+        out[..., start:start + block] = decay ** k * (prev + alpha * np.cumsum(chunk * grow, axis=-1))
+        prev = out[..., start + chunk.shape[-1] - 1:start + chunk.shape[-1]]
+    if x.shape[-1]:
+        out[..., 0] = x[..., 0]
+    out[lead] = np.nan
+    return out
+
+
+def _composite(np, roles):
+    """Weighted mix over the role axis, renormalized over roles that have a value."""
+
+    weights = np.array([SMOOTH_WEIGHTS.get(role, 0.0) for role in _ROLES])[:, None]
+    present = ~np.isnan(roles)
+    total = np.where(present, weights, 0.0).sum(axis=-2)
+    mixed = np.where(present, roles * weights, 0.0).sum(axis=-2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, mixed / total, np.nan)
+
+
+def _points(np, grid: List[date], roles, composite) -> List[SmoothedPointOut]:
+    clipped = np.round(np.clip(np.concatenate([roles, composite[None, :]]), 0, 100), 1)
+    columns = [[None if math.isnan(v) else v for v in row] for row in clipped.tolist()]
+    return [
+        SmoothedPointOut(
+            t=t,
+            self_weighted=columns[0][i],
+            teacher_weighted=columns[1][i],
+            mentor_weighted=columns[2][i],
+            composite=columns[3][i],
+        )
+        for i, t in enumerate(grid)
+    ]
+
+
+def build_series(
+    rows: Sequence[Tuple[str, str, date, float, int]],
+    *,
+    interval: str,
+    max_points: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    by_metric: bool = False,
+) -> SmoothedSeriesOut:
+    """Turn ``scores_repo.series_buckets`` rows into a smoothed series.
+
+    Bucket averages per role are gap-filled, smoothed and mixed on NumPy arrays shaped
+    ``(series, role, bucket)``. With ``by_metric`` every metric gets its own series next
+    to the combined one.
+    """
+
+    np = _numpy()
+    if not rows:
+        return SmoothedSeriesOut(interval=interval, points=[], by_metric={} if by_metric else None)
+
+    metric_col, role_col, bucket_col, sum_col, count_col = zip(*rows)
+    step = _STEP_DAYS[interval]
+    first = _bucket_start(since, interval) if since else min(bucket_col)
+    last = _bucket_start(until - timedelta(microseconds=1), interval) if until else max(bucket_col)
+    n = (last - first).days // step + 1
+    grid = [first + timedelta(days=step * i) for i in range(n)]
+
+    metrics: Tuple[Any, ...] = tuple(sorted(set(metric_col))) if by_metric else ()
+    metric_index = {m: i + 1 for i, m in enumerate(metrics)}
+    role_index = {role: i for i, role in enumerate(_ROLES)}
+
+    keep = np.array([role in role_index for role in role_col])
+    series_idx = np.array([metric_index.get(m, 0) for m in metric_col])[keep]
+    role_idx = np.array([role_index.get(role, 0) for role in role_col])[keep]
+    bucket_idx = np.array([(b - first).days // step for b in bucket_col])[keep]
+    sums = np.asarray(sum_col, dtype=float)[keep]
+    counts = np.asarray(count_col, dtype=float)[keep]
+
+    # Серия 0 — все метрики вместе, 1..N — по одной метрике
+    shape = (1 + len(metrics), len(_ROLES), n)
+    total_sum = np.zeros(shape)
+    total_count = np.zeros(shape)
+    np.add.at(total_sum, (0, role_idx, bucket_idx), sums)
+    np.add.at(total_count, (0, role_idx, bucket_idx), counts)
+    if metrics:
+        np.add.at(total_sum, (series_idx, role_idx, bucket_idx), sums)
+        np.add.at(total_count, (series_idx, role_idx, bucket_idx), counts)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = total_sum / total_count
+    flat = means.reshape(-1, n)
+    smoothed = _ema(np, _fill_gaps(np, flat, SMOOTH_GAP_STRATEGY), EMA_ALPHA).reshape(shape)
+    composite = _composite(np, smoothed)
+
+    # EMA считается по всей истории, а отдаём только последние max_points корзин
+    tail = slice(max(0, n - max_points), n)
+    grid = grid[tail]
+    points = _points(np, grid, smoothed[0, :, tail], composite[0, tail])
+    per_metric: Optional[Dict[str, List[SmoothedPointOut]]] = None
+    if by_metric:
+        per_metric = {
+            m: _points(np, grid, smoothed[i + 1, :, tail], composite[i + 1, tail]) for i, m in enumerate(metrics)
+        }
+    return SmoothedSeriesOut(interval=interval, points=points, by_metric=per_metric)
+
+
+def smoothed_series(
+    *,
+    track_id: str,
+    student_id: Optional[str] = None,
+    metric_id: Optional[str] = None,
+    interval: Optional[str] = None,
+    max_points: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    by_metric: bool = False,
+) -> SmoothedSeriesOut:
+    """Build the smoothed series described in techspec.md from one grouped query."""
+
+    _numpy()
+    interval = interval or SMOOTH_SERIES_INTERVAL
+    rows = scores_repo.series_buckets(
+        track_id,
+        student_id=student_id,
+        metric_id=metric_id,
+        since=since,
+        until=until,
+        interval=interval,
+    )
+    return build_series(
+        rows,
+        interval=interval,
+        max_points=max_points or SMOOTH_SERIES_MAX_POINTS,
+        since=since,
+        until=until,
+        by_metric=by_metric,
+    )
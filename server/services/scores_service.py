@@ -1,10 +1,49 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
 
-from ..db import scores_repo
-from ..schemas.scores import ScoreOut
+from fastapi import HTTPException, status
+
+from ..db import scores_repo, tracks_repo
+from ..db.scores_repo import ScoreKey
+from ..middleware.access import Caller
+from ..schemas.scores import ScoreAggregateOut, ScoreOut
+from ..utils.cursor import CursorError, decode_score_cursor, encode_score_cursor
+
+
+def ensure_scores_access(
+    caller: Caller,
+    *,
+    track_ids: Optional[Sequence[str]] = None,
+    student_ids: Optional[Sequence[str]] = None,
+) -> None:
+    """Enforce the client-token rule for score reads; server callers pass through.
+
+    A client may read only its own scores (every requested student is the caller) or
+    scores of tracks where it is a teacher (every requested track). Anything else,
+    including a request without track or student filters, is ``403``.
+    """
+
+    if caller.kind == "server":
+        return
+    if caller.user_id:
+        if student_ids and all(student_id == caller.user_id for student_id in student_ids):
+            return
+        if track_ids and tracks_repo.teacher_track_ids(caller.user_id, track_ids) == set(track_ids):
+            return
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access to these scores is not allowed")
+
+
+def _seek_key(cursor: Optional[str], offset: int) -> Optional[ScoreKey]:
+    if cursor is None:
+        return None
+    if offset:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cursor and offset are mutually exclusive")
+    try:
+        return decode_score_cursor(cursor)
+    except CursorError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from exc
 
 
 def get_scores_by_sets(
@@ -16,6 +55,7 @@ def get_scores_by_sets(
     until: Optional[datetime] = None,
     limit: int,
     offset: int,
+    cursor: Optional[str] = None,
 ) -> List[ScoreOut]:
     rows = scores_repo.list_by_sets(
         track_ids=track_ids,
@@ -25,7 +65,71 @@ def get_scores_by_sets(
         until=until,
         limit=limit,
         offset=offset,
+        after=_seek_key(cursor, offset),
     )
     return [ScoreOut(**row) for row in rows]
 
 
+def get_scores_by_sets_json(
+    *,
+    track_ids: Optional[List[str]] = None,
+    student_ids: Optional[List[str]] = None,
+    metric_ids: Optional[List[str]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int,
+    offset: int,
+    cursor: Optional[str] = None,
+) -> Tuple[bytes, Optional[str]]:
+    """Return the JSON body and the cursor of the next page, if there is one."""
+
+    body, next_key = scores_repo.list_by_sets_json(
+        track_ids=track_ids,
+        student_ids=student_ids,
+        metric_ids=metric_ids,
+        since=since,
+        until=until,
+        limit=limit,
+        offset=offset,
+        after=_seek_key(cursor, offset),
+    )
+    next_cursor = encode_score_cursor(*next_key) if next_key is not None else None
+    return body, next_cursor
+
+
+def _quantile_key(q: float) -> str:
+    return f"p{q * 100:g}"
+
+
+def aggregate_scores(
+    caller: Caller,
+    *,
+    track_ids: Optional[List[str]] = None,
+    student_ids: Optional[List[str]] = None,
+    metric_ids: Optional[List[str]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    group_by: Sequence[str] = (),
+    interval: Optional[str] = None,
+    quantiles: Sequence[float] = (),
+    limit: int,
+) -> List[ScoreAggregateOut]:
+    ensure_scores_access(caller, track_ids=track_ids, student_ids=student_ids)
+    quantiles = list(dict.fromkeys(quantiles))
+    rows = scores_repo.aggregate_by_sets(
+        track_ids=track_ids,
+        student_ids=student_ids,
+        metric_ids=metric_ids,
+        since=since,
+        until=until,
+        group_by=list(dict.fromkeys(group_by)),
+        interval=interval,
+        quantiles=quantiles,
+        limit=limit,
+    )
+    result = []
+    for row in rows:
+        values = row.pop("quantiles", None) or [None] * len(quantiles)
+        row["quantiles"] = {_quantile_key(q): v for q, v in zip(quantiles, values)}
+        result.append(ScoreAggregateOut(**row))
+    return result
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import io
+import time
+from pathlib import Path
+from typing import Any, List, Optional, Tuple, Union
+
+import anyio
+from fastapi import HTTPException, Request, Response, status
+from starlette.concurrency import run_in_threadpool
+
+from ..config import SANDBOX_JOB_MAX_ESTIMATED_ROWS, SANDBOX_MAX_ROWS, SANDBOX_TIMEOUT_SECONDS
+from ..db import sandbox, sandbox_jobs
+from ..errors import NotFoundError
+from ..logging_utils import get_logger
+from ..schemas.select import (
+    SelectExplainIn,
+    SelectExplainOut,
+    SelectJobIn,
+    SelectJobOut,
+    SelectJobPageOut,
+    SelectPlanOperatorOut,
+    SelectProfileOut,
+    SelectQueryIn,
+    SelectQueryOut,
+)
+from ..utils.time import to_warsaw_iso
+
+log = get_logger("services.select")
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _negotiate(requested: Optional[str], accept: str) -> str:
+    # Явный format в теле важнее заголовка Accept; по умолчанию — JSON
+    if requested:
+        return requested
+    for item in accept.split(","):
+        media = item.split(";")[0].strip().lower()
+        for fmt, media_type in MEDIA_TYPES.items():
+            if media == media_type.split(";")[0]:
+                return fmt
+    return "json"
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _encode_table(table: Any, fmt: str) -> bytes:
+    import pyarrow as pa
+
+    buf = pa.BufferOutputStream()
+    if fmt == "arrow":
+        with pa.ipc.new_stream(buf, table.schema) as writer:
+            writer.write_table(table)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, buf)
+    else:
+        import pyarrow.csv as pcsv
+
+        pcsv.write_csv(table, buf)
+    return buf.getvalue().to_pybytes()
+
+
+def _select_encoded(fmt: str, *args: Any, **kwargs: Any) -> Tuple[sandbox.SelectResult, Optional[bytes]]:
+    # Запрос и кодирование — в одном потоке пула: таблица не возвращается в event loop
+    result = sandbox.select(*args, arrow=fmt != "json", **kwargs)
+    if fmt == "json":
+        return result, None
+    return result, _encode_table(result.table, fmt)
+
+
+def _limit(requested, configured):
+    # Клиент может только ужесточить серверные лимиты, но не ослабить их
+    if requested is None:
+        return configured
+    if configured <= 0:
+        return requested
+    return min(requested, configured)
+
+
+def _too_expensive(exc: sandbox.QueryTooExpensiveError) -> HTTPException:
+    detail = {
+        "message": str(exc),
+        "estimated_rows": exc.estimated_rows,
+        "operator": exc.operator,
+        "limit": exc.limit,
+    }
+    if exc.estimated_rows <= SANDBOX_JOB_MAX_ESTIMATED_ROWS:
+        detail["hint"] = "Submit it to POST /select/jobs, which allows larger plans"
+    return HTTPException(status_code=422, detail=detail)
+
+
+async def _cancel_on_disconnect(request: Request, control: sandbox.QueryControl) -> None:
+    # Тело уже прочитано, дальше ASGI пришлёт только http.disconnect. is_disconnected() тут не
+    # годится: за BaseHTTPMiddleware (log_requests) он всегда отвечает False
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+    control.cancel("client disconnected")
+
+
+async def run_sandbox_select(payload: SelectQueryIn, request: Request) -> Union[SelectQueryOut, Response]:
+    """Run a sandbox query in the thread pool, cancelling it if the client goes away.
+
+    Timeouts map to 504, cancellations to 499 (the client will not see it, but it
+    shows up in the logs) and validation errors to 400. The result is JSON unless
+    ``format`` or the ``Accept`` header asks for Arrow IPC, Parquet or CSV; those are
+    encoded straight from DuckDB's Arrow batches and carry the row count and
+    truncation in ``X-Select-*`` headers.
+    """
+
+    fmt = _negotiate(payload.format, request.headers.get("accept", ""))
+    if fmt != "json" and not _has_pyarrow():
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=f"{fmt} output requires pyarrow")
+    if fmt != "json" and payload.profile:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="profile is only returned with JSON")
+
+    control = sandbox.QueryControl(_limit(payload.timeout_seconds, SANDBOX_TIMEOUT_SECONDS))
+    started = time.monotonic()
+    error: Exception | None = None
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_cancel_on_disconnect, request, control)
+        try:
+            result, body = await run_in_threadpool(
+                _select_encoded,
+                fmt,
+                payload.sql,
+                payload.params,
+                control=control,
+                max_rows=_limit(payload.max_rows, SANDBOX_MAX_ROWS),
+                use_cache=payload.use_cache,
+                profile=payload.profile,
+            )
+        except Exception as exc:
+            # Ошибку поднимаем уже вне группы задач, иначе она придёт завёрнутой в ExceptionGroup
+            error = exc
+        finally:
+            tg.cancel_scope.cancel()
+    if isinstance(error, sandbox.QueryTooExpensiveError):
+        raise _too_expensive(error) from error
+    if isinstance(error, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+    if isinstance(error, FileNotFoundError):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(error)) from error
+    if isinstance(error, sandbox.SandboxTimeoutError):
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(error)) from error
+    if isinstance(error, sandbox.SandboxCancelledError):
+        raise HTTPException(status_code=499, detail=str(error)) from error
+    if error is not None:
+        raise error
+    elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+    if body is not None:
+        headers = {
+            "X-Select-Row-Count": str(result.table.num_rows),
+            "X-Select-Truncated": result.truncated_by or "false",
+            "X-Select-Cached": "true" if result.cached else "false",
+            "X-Select-Elapsed-Ms": str(elapsed_ms),
+        }
+        if fmt != "arrow":
+            headers["Content-Disposition"] = f'attachment; filename="select.{fmt}"'
+        return Response(content=body, media_type=MEDIA_TYPES[fmt], headers=headers)
+    return SelectQueryOut(
+        columns=result.columns,
+        rows=result.rows,
+        row_count=len(result.rows),
+        truncated=result.truncated,
+        truncated_by=result.truncated_by,
+        elapsed_ms=elapsed_ms,
+        cached=result.cached,
+        profile=SelectProfileOut(**result.profile) if result.profile else None,
+    )
+
+
+def _job_out(job: sandbox_jobs.SandboxJob) -> SelectJobOut:
+    return SelectJobOut(
+        job_id=job.job_id,
+        status=job.status,
+        sql=job.sql,
+        submitted_at=to_warsaw_iso(job.submitted_at),
+        started_at=to_warsaw_iso(job.started_at) if job.started_at else None,
+        finished_at=to_warsaw_iso(job.finished_at) if job.finished_at else None,
+        queue_ms=job.queue_ms,
+        run_ms=job.run_ms,
+        columns=job.columns,
+        row_count=job.row_count,
+        file_bytes=job.file_bytes,
+        error=job.error,
+    )
+
+
+def _job_or_404(job_id: str) -> sandbox_jobs.SandboxJob:
+    job = sandbox_jobs.get_job(job_id)
+    if job is None:
+        raise NotFoundError("Job not found")
+    return job
+
+
+def submit_job(payload: SelectJobIn) -> SelectJobOut:
+    try:
+        job = sandbox_jobs.submit(payload.sql, payload.params)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    except sandbox_jobs.JobQueueFullError as exc:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(exc)) from exc
+    return _job_out(job)
+
+
+def list_jobs() -> List[SelectJobOut]:
+    return [_job_out(job) for job in sandbox_jobs.list_jobs()]
+
+
+def get_job(job_id: str) -> SelectJobOut:
+    return _job_out(_job_or_404(job_id))
+
+
+def cancel_job(job_id: str) -> SelectJobOut:
+    job = sandbox_jobs.cancel(job_id)
+    if job is None:
+        raise NotFoundError("Job not found")
+    return _job_out(job)
+
+
+def _finished_job(job_id: str) -> sandbox_jobs.SandboxJob:
+    job = _job_or_404(job_id)
+    if sandbox_jobs.result_path(job) is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}, no result to read")
+    return job
+
+
+def job_page(job_id: str, offset: int, limit: int) -> SelectJobPageOut:
+    job = _finished_job(job_id)
+    columns, rows = sandbox_jobs.read_page(job, offset, limit)
+    return SelectJobPageOut(
+        job_id=job.job_id,
+        columns=columns or job.columns,
+        rows=rows,
+        offset=offset,
+        row_count=len(rows),
+        total_rows=job.row_count or 0,
+    )
+
+
+def job_file(job_id: str) -> Tuple[str, Path]:
+    job = _finished_job(job_id)
+    return job.job_id, job.path
+
+
+def explain_select(payload: SelectExplainIn) -> SelectExplainOut:
+    try:
+        plan = sandbox.explain(payload.sql, payload.params)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc)) from exc
+    job_limit = SANDBOX_JOB_MAX_ESTIMATED_ROWS
+    return SelectExplainOut(
+        allowed=plan["allowed"],
+        estimated_rows=plan["estimated_rows"],
+        costliest_operator=plan["costliest_operator"],
+        limit=plan["limit"],
+        job_limit=job_limit,
+        allowed_as_job=job_limit <= 0 or plan["estimated_rows"] <= job_limit,
+        operators=[SelectPlanOperatorOut(**op) for op in plan["operators"]],
+    )
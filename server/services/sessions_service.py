@@ -5,8 +5,9 @@ from datetime import timedelta
 
 from fastapi import HTTPException, status
 
-from ..config import MINIAPP_BOT_TOKEN
+from ..config import CLIENT_TOKEN_SECRET, CLIENT_TOKEN_SIGNED, MINIAPP_BOT_TOKEN
 from ..db import client_tokens_repo, flags_repo, sessions_repo, users_repo
+from ..db.writer import run_write
 from ..middleware.access import Caller
 from ..schemas.sessions import (
     ClientTokenRefreshIn,
@@ -19,6 +20,7 @@ from ..schemas.sessions import (
     SessionOut,
     SessionRefreshIn,
 )
+from ..utils.client_token import sign_client_token
 from ..utils.telegram import TelegramInitDataError, parse_webapp_init_data
 from ..utils.time import ensure_naive_utc, now_utc, to_warsaw_iso
 from .sys_events_service import write_sys_event
@@ -26,37 +28,52 @@ from .sys_events_service import write_sys_event
 _DEFAULT_CLIENT_TTL_MINUTES = 1440
 
 
+def _issue_signed(*, token_id: str, user_id: str, telegram_user_id: int, expires_at) -> str:
+    return sign_client_token(
+        CLIENT_TOKEN_SECRET,
+        token_id=token_id,
+        user_id=user_id,
+        telegram_user_id=telegram_user_id,
+        expires_at=expires_at,
+    )
+
+
 def connect_session(payload: SessionConnectIn) -> SessionOut:
-    user = users_repo.get_by_telegram_id(payload.telegram_user_id)
-    created_user = False
-    if not user:
-        display_name = payload.display_name or f"tg:{payload.telegram_user_id}"
-        user = users_repo.create_user_for_telegram(
-            telegram_user_id=payload.telegram_user_id,
-            display_name=display_name,
-            telegram_username=payload.telegram_username,
-            telegram_login_name=payload.telegram_login_name,
+    # Поиск, создание пользователя и сессия — одно задание писателя: параллельный connect
+    # того же telegram_id ждёт в очереди и видит уже созданного пользователя
+    def _connect(con):
+        user = users_repo.get_by_telegram_id(payload.telegram_user_id)
+        created_user = False
+        if not user:
+            display_name = payload.display_name or f"tg:{payload.telegram_user_id}"
+            user = users_repo.create_user_for_telegram(
+                telegram_user_id=payload.telegram_user_id,
+                display_name=display_name,
+                telegram_username=payload.telegram_username,
+                telegram_login_name=payload.telegram_login_name,
+            )
+            created_user = True
+            write_sys_event(
+                event_type="user_created",
+                subject_user_id=user["user_id"],
+                context="via sessions/connect",
+            )
+            write_sys_event(
+                event_type="user_frozen",
+                subject_user_id=user["user_id"],
+                context="via sessions/connect",
+            )
+
+        session_row = sessions_repo.create_session(
+            user_id=user["user_id"],
+            session_type=payload.session_type,
+            ttl_minutes=payload.ttl_minutes,
+            user_agent=payload.user_agent,
+            ip_hash=payload.ip_hash,
         )
-        created_user = True
-        write_sys_event(
-            event_type="user_created",
-            subject_user_id=user["user_id"],
-            context="via sessions/connect",
-        )
-        write_sys_event(
-            event_type="user_frozen",
-            subject_user_id=user["user_id"],
-            context="via sessions/connect",
-        )
-
-    session_row = sessions_repo.create_session(
-        user_id=user["user_id"],
-        session_type=payload.session_type,
-        ttl_minutes=payload.ttl_minutes,
-        user_agent=payload.user_agent,
-        ip_hash=payload.ip_hash,
-    )
+        return user, session_row, created_user
 
+    user, session_row, created_user = run_write(_connect)
     expires = session_row["expires_at"]
     expires_iso = to_warsaw_iso(expires)
 
@@ -69,18 +86,26 @@ def connect_session(payload: SessionConnectIn) -> SessionOut:
 
 
 def refresh_session(payload: SessionRefreshIn) -> SessionOut:
-    session = sessions_repo.get_session(payload.session_id)
-    if not session:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-    if session.get("revoked_at"):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Session revoked")
-    current_naive = ensure_naive_utc(now_utc())
-    if session["expires_at"] < current_naive:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Session expired")
-
-    refreshed = sessions_repo.refresh_session(payload.session_id, payload.ttl_minutes)
-    if not refreshed:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    # Отказы возвращаются из задания, а не бросаются в нём: исключение откатило бы
+    # весь пакет писателя вместе с чужими заданиями и переиграло его по одному
+    def _refresh(con):
+        session = sessions_repo.get_session(payload.session_id)
+        if not session:
+            return None, HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+        if session.get("revoked_at"):
+            return None, HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Session revoked")
+        current_naive = ensure_naive_utc(now_utc())
+        if session["expires_at"] < current_naive:
+            return None, HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Session expired")
+
+        refreshed = sessions_repo.refresh_session(payload.session_id, payload.ttl_minutes)
+        if not refreshed:
+            return None, HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+        return refreshed, None
+
+    refreshed, error = run_write(_refresh)
+    if error is not None:
+        raise error
 
     expires_iso = to_warsaw_iso(refreshed["expires_at"])
     return SessionOut(
@@ -107,61 +132,81 @@ def connect_miniapp_session(payload: MiniAppConnectIn) -> MiniAppConnectOut:
     except TelegramInitDataError as exc:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid init data signature") from exc
 
-    if flags_repo.get_ban_by_telegram(payload.telegram_user_id):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
-
-    user = users_repo.get_by_telegram_id(payload.telegram_user_id)
-    if not user:
-        display_name = payload.display_name or f"tg:{payload.telegram_user_id}"
-        user = users_repo.create_user_for_telegram(
+    # Бан — user=None, заморозка — token_id=None; HTTP-ошибка после run_write (см. refresh_session)
+    def _connect(con):
+        if flags_repo.get_ban_by_telegram(payload.telegram_user_id):
+            return None, None, None
+
+        user = users_repo.get_by_telegram_id(payload.telegram_user_id)
+        if not user:
+            display_name = payload.display_name or f"tg:{payload.telegram_user_id}"
+            user = users_repo.create_user_for_telegram(
+                telegram_user_id=payload.telegram_user_id,
+                display_name=display_name,
+                telegram_username=payload.telegram_username,
+                telegram_login_name=payload.telegram_login_name,
+            )
+            write_sys_event(
+                event_type="user_created",
+                subject_user_id=user["user_id"],
+                context="via sessions/connect/miniapp",
+            )
+            write_sys_event(
+                event_type="user_frozen",
+                subject_user_id=user["user_id"],
+                context="via sessions/connect/miniapp",
+            )
+        else:
+            if flags_repo.get_ban_by_user(user["user_id"]):
+                return None, None, None
+
+        # Новый пользователь создаётся замороженным: он должен сохраниться, поэтому 401
+        # отдаём уже после коммита, а токен не выдаём
+        if user.get("frozen"):
+            return user, None, None
+        ttl_minutes = payload.ttl_minutes
+        now = now_utc()
+        expires_at = now + timedelta(minutes=ttl_minutes)
+
+        token_id = f"ct_{secrets.token_hex(12)}"
+        client_tokens_repo.create_token(
+            token_id=token_id,
+            user_id=user["user_id"],
             telegram_user_id=payload.telegram_user_id,
-            display_name=display_name,
-            telegram_username=payload.telegram_username,
-            telegram_login_name=payload.telegram_login_name,
-        )
-        write_sys_event(
-            event_type="user_created",
-            subject_user_id=user["user_id"],
-            context="via sessions/connect/miniapp",
+            expires_at=expires_at,
+            user_agent=payload.user_agent,
+            ip_hash=payload.ip_hash,
+            payload_json=init_payload,
         )
+
         write_sys_event(
-            event_type="user_frozen",
+            event_type="client_token_issued",
             subject_user_id=user["user_id"],
             context="via sessions/connect/miniapp",
         )
-    else:
-        if flags_repo.get_ban_by_user(user["user_id"]):
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+        return user, token_id, expires_at
 
-    if user.get("frozen"):
+    user, token_id, expires_at = run_write(_connect)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    if token_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Ваш аккаунт заморожен администратором.",
         )
 
-    ttl_minutes = payload.ttl_minutes
-    now = now_utc()
-    expires_at = now + timedelta(minutes=ttl_minutes)
-
-    token_id = f"ct_{secrets.token_hex(12)}"
-    client_tokens_repo.create_token(
-        token_id=token_id,
-        user_id=user["user_id"],
-        telegram_user_id=payload.telegram_user_id,
-        expires_at=expires_at,
-        user_agent=payload.user_agent,
-        ip_hash=payload.ip_hash,
-        payload_json=init_payload,
-    )
-
-    write_sys_event(
-        event_type="client_token_issued",
-        subject_user_id=user["user_id"],
-        context="via sessions/connect/miniapp",
-    )
+    client_token = token_id
+    if CLIENT_TOKEN_SIGNED and CLIENT_TOKEN_SECRET:
+        # Подписанный токен проверяется без БД; строка в client_tokens остаётся для revoke/refresh
+        client_token = _issue_signed(
+            token_id=token_id,
+            user_id=user["user_id"],
+            telegram_user_id=payload.telegram_user_id,
+            expires_at=expires_at,
+        )
 
     return MiniAppConnectOut(
-        client_token=token_id,
+        client_token=client_token,
         user_id=user["user_id"],
         telegram_user_id=payload.telegram_user_id,
         expires_at=to_warsaw_iso(expires_at),
@@ -172,13 +217,16 @@ def revoke_client_token(caller: Caller) -> ClientTokenRevokeOut:
     if not caller.token_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported token")
 
-    client_tokens_repo.revoke_token(caller.token_id)
-    if caller.user_id:
-        write_sys_event(
-            event_type="client_token_revoked",
-            subject_user_id=caller.user_id,
-            context="client/revoke",
-        )
+    def _revoke(con):
+        client_tokens_repo.revoke_token(caller.token_id)
+        if caller.user_id:
+            write_sys_event(
+                event_type="client_token_revoked",
+                subject_user_id=caller.user_id,
+                context="client/revoke",
+            )
+
+    run_write(_revoke)
     return ClientTokenRevokeOut(ok=True)
 
 
@@ -190,15 +238,29 @@ def refresh_client_token(caller: Caller, payload: ClientTokenRefreshIn) -> Clien
     now = now_utc()
     new_expires = now + timedelta(minutes=ttl_minutes)
 
-    refreshed = client_tokens_repo.refresh_token(caller.token_id, new_expires_at=new_expires)
-    if not refreshed:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    def _refresh(con):
+        refreshed = client_tokens_repo.refresh_token(caller.token_id, new_expires_at=new_expires)
+        if not refreshed:
+            return None
 
-    write_sys_event(
-        event_type="client_token_refreshed",
-        subject_user_id=caller.user_id,
-        context="client/refresh",
-    )
+        write_sys_event(
+            event_type="client_token_refreshed",
+            subject_user_id=caller.user_id,
+            context="client/refresh",
+        )
+        return refreshed
 
+    refreshed = run_write(_refresh)
+    if not refreshed:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     expires_at = refreshed.get("expires_at", ensure_naive_utc(new_expires))
-    return ClientTokenRefreshOut(expires_at=to_warsaw_iso(expires_at))
+    new_token = None
+    if caller.signed:
+        # Срок зашит в подписанный токен, поэтому после refresh клиент получает новый
+        new_token = _issue_signed(
+            token_id=caller.token_id,
+            user_id=caller.user_id,
+            telegram_user_id=caller.telegram_user_id,
+            expires_at=expires_at,
+        )
+    return ClientTokenRefreshOut(expires_at=to_warsaw_iso(expires_at), client_token=new_token)
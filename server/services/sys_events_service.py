@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import Optional
 
-from ..db import sys_events_repo
+from ..db import sys_events_buffer
 
 
 def write_sys_event(
@@ -12,7 +12,7 @@ def write_sys_event(
     subject_user_id: Optional[str] = None,
     context: Optional[str] = None,
 ) -> str:
-    return sys_events_repo.insert(
+    return sys_events_buffer.record(
         event_type=event_type,
         actor_user_id=actor_user_id,
         subject_user_id=subject_user_id,
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+__all__ = ["TTLCache", "SizedLRUCache"]
+
+
+class TTLCache(Generic[K, V]):
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+
+    ``generation()`` lets a caller detect an invalidation that happened while it was
+    loading a value: pass the value read before the load to ``put`` and the entry is
+    dropped if anything was invalidated in between.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: K) -> Optional[V]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            return item[1]
+
+    def put(self, key: K, value: V, *, generation: Optional[int] = None) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[K, V], bool]) -> int:
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            stale = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in stale:
+                del self._data[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+class SizedLRUCache(Generic[K, V]):
+    """Thread-safe LRU cache bounded by the total size of its values in bytes.
+
+    The caller passes each value's size to ``put``; values larger than
+    ``max_entry_bytes`` are not stored, and the least recently used entries are
+    evicted until the total fits in ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes) if max_entry_bytes > 0 else max_bytes
+        self._data: "OrderedDict[K, Tuple[int, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._skipped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: K) -> Optional[V]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            return item[1]
+
+    def put(self, key: K, value: V, size: int) -> bool:
+        if not self.enabled:
+            return False
+        with self._lock:
+            if size > self.max_entry_bytes:
+                self._skipped += 1
+                return False
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0]
+            self._data[key] = (size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self._evictions += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "skipped": self._skipped,
+            }
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+__all__ = ["SIGNED_TOKEN_PREFIX", "SignedTokenError", "SignedClaims", "sign_client_token", "verify_client_token"]
+
+SIGNED_TOKEN_PREFIX = "cts_"
+
+
+class SignedTokenError(ValueError):
+    """Raised when a signed client token is malformed or its signature does not match."""
+
+
+@dataclass(slots=True, frozen=True)
+class SignedClaims:
+    token_id: str
+    user_id: str
+    telegram_user_id: int
+    expires_at: datetime  # naive UTC, как в client_tokens.expires_at
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    padding = "=" * (-len(text) % 4)
+    return base64.urlsafe_b64decode(text + padding)
+
+
+def _signature(secret: str, payload: str) -> str:
+    digest = hmac.new(secret.encode(), payload.encode("ascii"), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def sign_client_token(
+    secret: str,
+    *,
+    token_id: str,
+    user_id: str,
+    telegram_user_id: int,
+    expires_at: datetime,
+) -> str:
+    """Return ``cts_<payload>.<signature>`` carrying the token claims."""
+
+    if not secret:
+        raise SignedTokenError("Missing signing secret")
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    claims = {
+        "tid": token_id,
+        "uid": user_id,
+        "tg": telegram_user_id,
+        "exp": int(expires_at.timestamp()),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{SIGNED_TOKEN_PREFIX}{payload}.{_signature(secret, payload)}"
+
+
+def verify_client_token(secret: str, token: str) -> SignedClaims:
+    """Check the signature and decode claims. Expiry is left to the caller."""
+
+    if not secret:
+        raise SignedTokenError("Missing signing secret")
+    if not token.startswith(SIGNED_TOKEN_PREFIX):
+        raise SignedTokenError("Not a signed client token")
+    body = token[len(SIGNED_TOKEN_PREFIX):]
+    payload, sep, signature = body.partition(".")
+    if not sep or not payload or not signature:
+        raise SignedTokenError("Malformed signed token")
+    if not hmac.compare_digest(_signature(secret, payload), signature):
+        raise SignedTokenError("Invalid token signature")
+    try:
+        claims = json.loads(_b64decode(payload))
+        return SignedClaims(
+            token_id=str(claims["tid"]),
+            user_id=str(claims["uid"]),
+            telegram_user_id=int(claims["tg"]),
+            expires_at=datetime.fromtimestamp(int(claims["exp"]), tz=timezone.utc).replace(tzinfo=None),
+        )
+    except (ValueError, KeyError, TypeError) as exc:
+        raise SignedTokenError("Malformed signed token") from exc
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+__all__ = ["CursorError", "encode_score_cursor", "decode_score_cursor"]
+
+
+class CursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_score_cursor(measured_at: datetime, score_id: str) -> str:
+    """Return an opaque cursor pointing just past ``(measured_at, score_id)``."""
+
+    raw = json.dumps([measured_at.isoformat(), score_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_score_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        measured_at, score_id = json.loads(raw)
+        return datetime.fromisoformat(measured_at), str(score_id)
+    except (ValueError, TypeError) as exc:
+        raise CursorError("Invalid cursor") from exc
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import anyio
+from starlette.responses import StreamingResponse
+from starlette.types import Send
+
+__all__ = ["ClosingStreamingResponse"]
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that always closes its async body iterator.
+
+    Starlette abandons the iterator when the client disconnects, so its ``finally``
+    blocks would only run whenever it happens to be garbage-collected. Closing it here
+    releases cursors and other resources right away.
+    """
+
+    async def stream_response(self, send: Send) -> None:
+        try:
+            await super().stream_response(send)
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                with anyio.CancelScope(shield=True):
+                    await aclose()
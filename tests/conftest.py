@@ -0,0 +1,43 @@
+"""Test environment: a throwaway DuckDB file with the current schema.
+
+``server.config`` reads the environment at import time, so everything is set up here,
+before any test module imports ``server``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import duckdb
+
+ROOT = Path(__file__).resolve().parents[1]
+DUCKDB_SCHEMA = ROOT / "db" / "schema" / "current_schema.sql"
+POSTGRES_SCHEMA = ROOT / "db" / "schema" / "current_schema_postgres.sql"
+
+
+def create_duckdb(path: Path) -> Path:
+    con = duckdb.connect(str(path))
+    try:
+        con.execute(DUCKDB_SCHEMA.read_text(encoding="utf-8"))
+    finally:
+        con.close()
+    return path
+
+
+_tmp = Path(tempfile.mkdtemp(prefix="server-tests-"))
+_tokens = _tmp / "tokens.json"
+_tokens.write_text(json.dumps({"test-server-token": "server"}), encoding="utf-8")
+os.environ.update(
+    {
+        "DB_BACKEND": "duckdb",
+        "DUCKDB_PATH": str(create_duckdb(_tmp / "test.duckdb")),
+        "SANDBOX_DUCKDB_PATH": str(_tmp / "sandbox" / "_sandbox.duckdb"),
+        "TOKENS_JSON": str(_tokens),
+        "LOG_DIR": str(_tmp / "logs"),
+        "LOG_LEVEL": "WARNING",
+        "SAFE_CHECK_ON_START": "false",
+    }
+)
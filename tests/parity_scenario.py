@@ -0,0 +1,245 @@
+"""One fixed sequence of repository calls, printed as JSON for the backend parity test.
+
+``server.config`` fixes ``DB_BACKEND`` at import time, so test_backend_parity runs this
+script once per backend in its own process and compares the output. Generated ids and
+``CURRENT_TIMESTAMP`` values differ between runs by design; they are reported as flags
+or durations, everything else as it comes back from the repository.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server.db import client_tokens_repo, profiles_repo, scores_repo, sessions_repo, sys_events_repo, users_repo  # noqa: E402
+from server.db.connection import dictrows, get_conn  # noqa: E402
+from server.db.writer import run_write, stop_writer  # noqa: E402
+
+TRACKS = ("t_par_a", "t_par_b")
+STUDENTS = ("u_par_s1", "u_par_s2")
+TEACHER = "u_par_t"
+METRICS = ("m_par_focus", "m_par_speed")
+START = datetime(2026, 3, 2, 9)
+
+
+def _plain(value: Any) -> Any:
+    # Типы сравниваются вместе со значениями: Decimal против float — тоже расхождение
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return f"Decimal({value})"
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def _seed(con) -> None:
+    con.execute(
+        "INSERT INTO users (user_id, display_name) VALUES (?, 'S1'), (?, 'S2'), (?, 'Teacher')",
+        [*STUDENTS, TEACHER],
+    )
+    for track_id in TRACKS:
+        con.execute(
+            "INSERT INTO tracks (track_id, title, owner_user_id, status) VALUES (?, ?, ?, 'active')",
+            [track_id, track_id.upper(), TEACHER],
+        )
+    con.execute(
+        "INSERT INTO metrics (metric_id, kind, name) VALUES (?, 'metric', 'Focus'), (?, 'metric', 'Speed')",
+        list(METRICS),
+    )
+
+
+def _score_rows() -> List[Dict[str, Any]]:
+    rows = []
+    for i in range(24):
+        rows.append(
+            {
+                "score_id": f"sc_par_{i:02d}",
+                "track_id": TRACKS[i % 2],
+                "step_id": None,
+                "student_id": STUDENTS[(i // 2) % 2],
+                "metric_id": METRICS[(i // 4) % 2],
+                "raw_value": (i * 37) % 101,
+                "rater_user_id": TEACHER,
+                "role_at_rate": ("teacher", "student", "mentor")[i % 3],
+                "comment": f"c{i}" if i % 5 else None,
+                "measured_at": START + timedelta(hours=7 * i),
+            }
+        )
+    return rows
+
+
+def _columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    return {name: [row[name] for row in rows] for name, _ in scores_repo.BULK_COLUMNS}
+
+
+def _identity(out: Dict[str, Any]) -> None:
+    user = users_repo.create_user_for_telegram(
+        telegram_user_id=424242,
+        display_name="Parity",
+        telegram_username="parity",
+        telegram_login_name=None,
+    )
+    user_id = user["user_id"]
+    out["user"] = {
+        "id_prefix": user_id[:2],
+        "frozen": user["frozen"],
+        "telegram_id": user["telegram_id"],
+        "stamped": user["created_at"] is not None and user["updated_at"] is not None,
+    }
+
+    session = sessions_repo.create_session(
+        user_id=user_id, session_type="miniapp", ttl_minutes=30, user_agent="ua", ip_hash="ip"
+    )
+    session_id = session["session_id"]
+    refreshed = sessions_repo.refresh_session(session_id, 90)
+    out["session"] = {
+        "created_ttl": (session["expires_at"] - session["created_at"]).total_seconds(),
+        "refreshed_ttl": round((refreshed["expires_at"] - refreshed["created_at"]).total_seconds() / 60),
+        "refreshed_revoked": refreshed["revoked_at"] is not None,
+        "revoke": sessions_repo.revoke_session(session_id),
+        "revoke_again": sessions_repo.revoke_session(session_id),
+        "revoked": sessions_repo.get_session(session_id)["revoked_at"] is not None,
+        "refresh_missing": sessions_repo.refresh_session("ses_missing", 5),
+        "revived": sessions_repo.refresh_session(session_id, 5)["revoked_at"] is None,
+    }
+
+    expires = START + timedelta(days=30)
+    token = client_tokens_repo.create_token(
+        token_id="ct_par_1",
+        user_id=user_id,
+        telegram_user_id=424242,
+        expires_at=expires,
+        user_agent=None,
+        ip_hash=None,
+        payload_json={"scope": "miniapp"},
+    )
+    revoked = client_tokens_repo.revoke_token("ct_par_1")
+    revoked_again = client_tokens_repo.revoke_token("ct_par_1")
+    state = client_tokens_repo.load_revocation_state(revoked_since=START)
+    refreshed_token = client_tokens_repo.refresh_token("ct_par_1", new_expires_at=expires + timedelta(days=1))
+    out["client_token"] = {
+        "created": _plain({k: v for k, v in token.items() if k not in ("user_id", "issued_at")}),
+        "issued": token["issued_at"] is not None,
+        "revoke": revoked,
+        "revoke_again": revoked_again,
+        "revoked_listed": "ct_par_1" in state["revoked_tokens"],
+        "frozen_listed": user_id in state["frozen_users"],
+        "refreshed": _plain({k: v for k, v in refreshed_token.items() if k != "user_id"}),
+        "refresh_missing": client_tokens_repo.refresh_token("ct_missing", new_expires_at=expires),
+    }
+
+
+def _scores(out: Dict[str, Any]) -> None:
+    rows = _score_rows()
+    bad = dict(rows[0], score_id="sc_par_bad", raw_value=150, role_at_rate="guest", metric_id="m_nope")
+    dup = dict(rows[1])
+    inserted, errors = scores_repo.insert_bulk(_columns(rows[:20] + [bad]))
+    again = scores_repo.insert_bulk(_columns(rows[20:] + [dup]), all_or_nothing=True)
+    rest = scores_repo.insert_bulk(_columns(rows[20:]))
+    out["insert_bulk"] = {"first": [inserted, errors], "all_or_nothing": _plain(again), "rest": _plain(rest)}
+
+    pages = []
+    after = None
+    while True:
+        body, after = scores_repo.list_by_sets_json(
+            track_ids=list(TRACKS), student_ids=[STUDENTS[0]], limit=5, after=after
+        )
+        pages.append(json.loads(body))
+        if after is None:
+            break
+    out["list_by_sets_json"] = pages
+    out["list_by_sets"] = _plain(
+        scores_repo.list_by_sets(
+            track_ids=[TRACKS[0]],
+            metric_ids=list(METRICS),
+            since=START + timedelta(days=1),
+            until=START + timedelta(days=5),
+            limit=50,
+        )
+    )
+    out["list_by_sets_empty"] = scores_repo.list_by_sets(track_ids=[], limit=5)
+
+    out["aggregate_by_sets"] = {
+        "total": _plain(scores_repo.aggregate_by_sets(track_ids=list(TRACKS), limit=10)),
+        "by_track_metric": _plain(
+            scores_repo.aggregate_by_sets(track_ids=list(TRACKS), group_by=("track", "metric"), limit=10)
+        ),
+        "by_role_week": _plain(
+            scores_repo.aggregate_by_sets(
+                student_ids=list(STUDENTS), group_by=("role",), interval="week", limit=50
+            )
+        ),
+    }
+    # Квантили: DuckDB считает approx_quantile, Postgres — точный percentile_cont; сравниваем только форму
+    quantiles = scores_repo.aggregate_by_sets(track_ids=[TRACKS[0]], quantiles=(0.5, 0.9), limit=1)
+    out["aggregate_quantiles"] = [
+        {"count": row["count"], "quantiles": len(row["quantiles"]), "ordered": list(row["quantiles"]) == sorted(row["quantiles"])}
+        for row in quantiles
+    ]
+
+
+def _sys_events(out: Dict[str, Any]) -> None:
+    rows = [
+        ("se_par_1", "user_connected", STUDENTS[0], STUDENTS[0], "miniapp", START),
+        ("se_par_2", "score_added", TEACHER, STUDENTS[1], None, START + timedelta(minutes=1)),
+    ]
+    first = sys_events_repo.insert_many(rows)
+    # Повтор того же id — ON CONFLICT DO NOTHING, новая строка проходит
+    second = sys_events_repo.insert_many(
+        [rows[0], ("se_par_3", "score_added", None, None, "bulk", START + timedelta(minutes=2))]
+    )
+    with get_conn(True) as con:
+        stored = dictrows(
+            con.execute("SELECT * FROM sys_events WHERE sys_event_id LIKE 'se_par_%' ORDER BY sys_event_id")
+        )
+    out["sys_events"] = {"inserted": [first, second], "rows": _plain(stored)}
+
+
+def _source_state(out: Dict[str, Any]) -> None:
+    # Хеши строк считаются разными функциями (hash / hashtextextended), поэтому сравниваются
+    # счётчики, время последней оценки и совпадение префикса с полным хешем
+    result = {}
+    for label, student_id, cutoff in (
+        ("track", None, None),
+        ("student", STUDENTS[0], START + timedelta(days=3)),
+        ("student_all", STUDENTS[1], START + timedelta(days=30)),
+        ("empty", "u_par_nobody", START),
+    ):
+        (last_at, total_hash), head_hash = profiles_repo.source_state(TRACKS[0], student_id=student_id, cutoff=cutoff)
+        again = profiles_repo.source_state(TRACKS[0], student_id=student_id, cutoff=cutoff)
+        result[label] = {
+            "last_at": _plain(last_at),
+            "total": total_hash.split(":")[0],
+            "head": head_hash.split(":")[0] if head_hash else None,
+            "head_is_total": head_hash == total_hash,
+            "stable": again == ((last_at, total_hash), head_hash),
+        }
+    out["source_state"] = result
+
+
+def main() -> None:
+    out: Dict[str, Any] = {}
+    try:
+        run_write(_seed)
+        _identity(out)
+        _scores(out)
+        _sys_events(out)
+        _source_state(out)
+    finally:
+        stop_writer()
+    json.dump(out, sys.stdout, sort_keys=True, indent=1)
+
+
+if __name__ == "__main__":
+    main()
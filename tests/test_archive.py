@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import duckdb
+import pytest
+
+from server.db import archive, scores_repo, sys_events_repo
+from server.db.connection import get_conn
+from server.db.writer import run_write
+
+TRACK = "t_arch"
+STUDENT = "u_arch_s"
+TEACHER = "u_arch_t"
+METRIC = "m_arch"
+OLD = datetime(2005, 3, 1, 9)
+NEW = datetime(2020, 3, 1, 9)
+# Граница архива — 2010 год: чужие тестовые данные (2026) остаются горячими
+CUTOFF_DAYS = (datetime.utcnow() - datetime(2010, 1, 1)).days
+OLD_SCORES = 12
+OLD_EVENTS = 3
+
+
+def _seed(con) -> None:
+    con.execute("INSERT INTO users (user_id, display_name) VALUES (?, 'S'), (?, 'T')", [STUDENT, TEACHER])
+    con.execute(
+        "INSERT INTO tracks (track_id, title, owner_user_id, status) VALUES (?, 'T', ?, 'active')",
+        [TRACK, TEACHER],
+    )
+    con.execute("INSERT INTO metrics (metric_id, kind, name) VALUES (?, 'metric', 'Focus')", [METRIC])
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded():
+    run_write(_seed)
+    # Старые оценки попадают в два месяца, новые остаются в горячей таблице
+    measured = [OLD + timedelta(days=3 * i) for i in range(OLD_SCORES)] + [NEW + timedelta(days=i) for i in range(3)]
+    columns = {
+        "score_id": [f"sc_arch_{i:02d}" for i in range(len(measured))],
+        "track_id": [TRACK] * len(measured),
+        "step_id": [None] * len(measured),
+        "student_id": [STUDENT] * len(measured),
+        "metric_id": [METRIC] * len(measured),
+        "raw_value": [i * 7 % 101 for i in range(len(measured))],
+        "rater_user_id": [TEACHER] * len(measured),
+        "role_at_rate": ["teacher"] * len(measured),
+        "comment": [f"c{i}" if i % 2 else None for i in range(len(measured))],
+        "measured_at": measured,
+    }
+    assert scores_repo.insert_bulk(columns) == (len(measured), [])
+    occurred = [OLD + timedelta(hours=i) for i in range(OLD_EVENTS)] + [NEW + timedelta(hours=i) for i in range(2)]
+    events = [(f"se_arch_{i}", "score_added", TEACHER, STUDENT, None, at) for i, at in enumerate(occurred)]
+    assert sys_events_repo.insert_many(events) == len(events)
+
+
+@pytest.fixture
+def tiers(monkeypatch):
+    for table, tier in list(archive._TIERS.items()):
+        monkeypatch.setitem(archive._TIERS, table, (*tier[:4], CUTOFF_DAYS))
+    # Старых оценок больше порога — scores пересобирается, sys_events чистится DELETE
+    monkeypatch.setattr(archive, "_DELETE_MAX_ROWS", OLD_SCORES - 1)
+
+
+def _snapshot() -> dict:
+    with get_conn(True) as con:
+        return {
+            "scores_all": con.execute("SELECT * FROM scores_all ORDER BY score_id").fetchall(),
+            "sys_events_all": con.execute("SELECT * FROM sys_events_all ORDER BY sys_event_id").fetchall(),
+            "scores": con.execute("SELECT COUNT(*) FROM scores").fetchall()[0][0],
+            "sys_events": con.execute("SELECT COUNT(*) FROM sys_events").fetchall()[0][0],
+            "archive_files": con.execute(
+                "SELECT table_name, COUNT(*), SUM(row_count) FROM archive_files GROUP BY table_name ORDER BY table_name"
+            ).fetchall(),
+        }
+
+
+def _constraints(table: str) -> list:
+    with get_conn(True) as con:
+        return con.execute(
+            """
+            SELECT constraint_type, constraint_text FROM duckdb_constraints()
+            WHERE schema_name = 'main' AND table_name = ?
+            ORDER BY constraint_type, constraint_text
+            """,
+            [table],
+        ).fetchall()
+
+
+def _parquet_files() -> set:
+    return set(archive._ROOT.rglob("*.parquet"))
+
+
+def test_failed_batch_leaves_no_files(tiers, monkeypatch):
+    before = _snapshot()
+
+    def fail(con, table):
+        raise RuntimeError("view switch failed")
+
+    # Падение после записи файлов и удаления строк: транзакция откатывается, файлы удаляются
+    monkeypatch.setattr(archive, "_view_sql", fail)
+    with pytest.raises(RuntimeError, match="view switch failed"):
+        archive.archive_cold()
+
+    assert _parquet_files() == set()
+    assert _snapshot() == before
+
+
+def test_archive_cold_moves_old_rows_without_changing_reads(tiers):
+    before = _snapshot()
+    constraints = _constraints("scores")
+
+    report = archive.archive_cold()
+
+    assert {table: result["rows"] for table, result in report["tables"].items()} == {
+        "scores": OLD_SCORES,
+        "sys_events": OLD_EVENTS,
+    }
+    after = _snapshot()
+    assert after["scores_all"] == before["scores_all"]
+    assert after["sys_events_all"] == before["sys_events_all"]
+    assert (after["scores"], after["sys_events"]) == (before["scores"] - OLD_SCORES, before["sys_events"] - OLD_EVENTS)
+    assert after["archive_files"] == [
+        ("scores", report["tables"]["scores"]["files"], OLD_SCORES),
+        ("sys_events", report["tables"]["sys_events"]["files"], OLD_EVENTS),
+    ]
+    assert len(_parquet_files()) == report["tables"]["scores"]["files"] + report["tables"]["sys_events"]["files"]
+
+    # Пересобранная таблица сохраняет PRIMARY KEY и CHECK исходной
+    assert _constraints("scores") == constraints
+    for score_id, raw_value in (("sc_arch_14", 50), ("sc_arch_new", 150)):
+        with pytest.raises(duckdb.ConstraintException):
+            run_write(
+                lambda con: con.execute(
+                    """
+                    INSERT INTO scores (score_id, track_id, student_id, metric_id, raw_value, rater_user_id, role_at_rate)
+                    VALUES (?, ?, ?, ?, ?, ?, 'teacher')
+                    """,
+                    [score_id, TRACK, STUDENT, METRIC, raw_value, TEACHER],
+                )
+            )
@@ -0,0 +1,163 @@
+"""DuckDB and Postgres must answer the same repository calls the same way.
+
+The backend is chosen when ``server.config`` is imported, so each backend runs
+``parity_scenario.py`` in its own process against a freshly loaded schema. Postgres runs
+only when ``POSTGRES_DSN`` points at a server where a scratch database may be created.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, Dict
+
+import duckdb
+import pytest
+
+from conftest import DUCKDB_SCHEMA, POSTGRES_SCHEMA, ROOT, create_duckdb
+
+SCENARIO = Path(__file__).with_name("parity_scenario.py")
+POSTGRES_DSN = os.getenv("POSTGRES_DSN")
+BACKENDS = [
+    "duckdb",
+    pytest.param("postgres", marks=pytest.mark.skipif(not POSTGRES_DSN, reason="POSTGRES_DSN is not set")),
+]
+
+# Холодный слой архива есть только у DuckDB (на Postgres SCORES_SOURCE — сама таблица scores)
+DUCKDB_ONLY_TABLES = {"archive_files"}
+
+_COLUMNS_SQL = """
+    SELECT c.table_name, c.column_name, c.is_nullable
+    FROM information_schema.columns c
+    JOIN information_schema.tables t ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    WHERE c.table_schema = ? AND t.table_type = 'BASE TABLE'
+    ORDER BY c.table_name, c.ordinal_position
+"""
+
+
+@pytest.fixture(scope="module")
+def postgres_dsn():
+    """A scratch database with current_schema_postgres.sql loaded; dropped afterwards."""
+
+    psycopg = pytest.importorskip("psycopg")
+    from psycopg.conninfo import make_conninfo
+
+    name = f"parity_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(POSTGRES_DSN, autocommit=True) as admin:
+        admin.execute(f'CREATE DATABASE "{name}"')
+    dsn = make_conninfo(POSTGRES_DSN, dbname=name)
+    try:
+        with psycopg.connect(dsn, autocommit=True) as con:
+            con.execute(POSTGRES_SCHEMA.read_text(encoding="utf-8"))
+        yield dsn
+    finally:
+        with psycopg.connect(POSTGRES_DSN, autocommit=True) as admin:
+            admin.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+
+
+@pytest.fixture(scope="module")
+def scenario(request, tmp_path_factory):
+    """Run the scenario once per backend and module; returns ``backend -> result``."""
+
+    results: Dict[str, Any] = {}
+
+    def run(backend: str) -> Dict[str, Any]:
+        if backend in results:
+            return results[backend]
+        workdir = tmp_path_factory.mktemp(f"parity-{backend}")
+        env = dict(os.environ)
+        env.update(
+            {
+                "DB_BACKEND": backend,
+                # DUCKDB_PATH обязателен и для Postgres: config проверяет файл при импорте
+                "DUCKDB_PATH": str(create_duckdb(workdir / "parity.duckdb")),
+                "ARCHIVE_DIR": str(workdir / "archive"),
+                "SANDBOX_DUCKDB_PATH": str(workdir / "sandbox" / "_sandbox.duckdb"),
+                "LOG_DIR": str(workdir / "logs"),
+            }
+        )
+        if backend == "postgres":
+            env["POSTGRES_DSN"] = request.getfixturevalue("postgres_dsn")
+        proc = subprocess.run(
+            [sys.executable, str(SCENARIO)], cwd=ROOT, env=env, capture_output=True, text=True, timeout=300
+        )
+        assert proc.returncode == 0, proc.stderr
+        results[backend] = json.loads(proc.stdout)
+        return results[backend]
+
+    return run
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_scenario_behaves(scenario, backend):
+    out = scenario(backend)
+
+    assert out["session"] == {
+        "created_ttl": 1800.0,
+        "refresh_missing": None,
+        "refreshed_revoked": False,
+        "refreshed_ttl": 90,
+        "revived": True,
+        "revoke": True,
+        "revoke_again": False,
+        "revoked": True,
+    }
+    token = out["client_token"]
+    assert (token["revoke"], token["revoke_again"], token["refresh_missing"]) == (True, False, None)
+    assert token["revoked_listed"] and token["frozen_listed"]
+    assert token["refreshed"]["revoked_at"] is None
+
+    assert out["insert_bulk"] == {
+        "first": [20, [[20, "raw_value_out_of_range,invalid_role,unknown_metric"]]],
+        "all_or_nothing": [0, [[4, "score_id_exists"]]],
+        "rest": [4, []],
+    }
+    pages = out["list_by_sets_json"]
+    listed = [row["score_id"] for page in pages for row in page]
+    assert [len(page) for page in pages] == [5, 5, 2]
+    assert listed == sorted(listed, reverse=True) and len(set(listed)) == 12
+    assert out["list_by_sets_empty"] == []
+
+    (total,) = out["aggregate_by_sets"]["total"]
+    assert total["count"] == 24
+    assert sum(row["count"] for row in out["aggregate_by_sets"]["by_track_metric"]) == 24
+    assert out["aggregate_quantiles"] == [{"count": 12, "quantiles": 2, "ordered": True}]
+
+    assert out["sys_events"]["inserted"] == [2, 2]
+    assert [row["sys_event_id"] for row in out["sys_events"]["rows"]] == ["se_par_1", "se_par_2", "se_par_3"]
+
+    state = out["source_state"]
+    assert {label: (s["total"], s["head"], s["head_is_total"]) for label, s in state.items()} == {
+        "track": ("12", None, False),
+        "student": ("6", "3", False),
+        "student_all": ("6", "6", True),
+        "empty": ("0", "0", True),
+    }
+    assert all(s["stable"] for s in state.values())
+
+
+@pytest.mark.skipif(not POSTGRES_DSN, reason="POSTGRES_DSN is not set")
+def test_backends_agree(scenario):
+    duck, pg = scenario("duckdb"), scenario("postgres")
+    for key in sorted(duck):
+        assert duck[key] == pg[key], key
+    assert duck.keys() == pg.keys()
+
+
+@pytest.mark.skipif(not POSTGRES_DSN, reason="POSTGRES_DSN is not set")
+def test_schemas_define_the_same_columns(postgres_dsn, tmp_path):
+    import psycopg
+
+    con = duckdb.connect(str(create_duckdb(tmp_path / "schema.duckdb")), read_only=True)
+    try:
+        duck = [row for row in con.execute(_COLUMNS_SQL, ["main"]).fetchall() if row[0] not in DUCKDB_ONLY_TABLES]
+    finally:
+        con.close()
+    with psycopg.connect(postgres_dsn) as pg_con:
+        pg = pg_con.execute(_COLUMNS_SQL.replace("?", "%s"), ["public"]).fetchall()
+
+    assert duck == [tuple(row) for row in pg], f"{DUCKDB_SCHEMA.name} and {POSTGRES_SCHEMA.name} drifted"
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from server.db import profiles_repo, scores_repo
+from server.db.writer import run_write
+from server.services import profile_series_service
+
+TRACK = "t_watermark"
+STUDENT = "u_watermark_s"
+TEACHER = "u_watermark_t"
+METRIC = "m_watermark"
+
+
+def _seed(con) -> None:
+    con.execute(
+        "INSERT INTO users (user_id, display_name) VALUES (?, 'Student'), (?, 'Teacher')", [STUDENT, TEACHER]
+    )
+    con.execute("INSERT INTO tracks (track_id, title, owner_user_id, status) VALUES (?, 'T', ?, 'active')", [TRACK, TEACHER])
+    con.execute("INSERT INTO metrics (metric_id, kind, name) VALUES (?, 'metric', 'Focus')", [METRIC])
+
+
+def _insert(score_id: str, value: int, measured_at: datetime) -> None:
+    row = {
+        "score_id": score_id,
+        "track_id": TRACK,
+        "step_id": None,
+        "student_id": STUDENT,
+        "metric_id": METRIC,
+        "raw_value": value,
+        "rater_user_id": TEACHER,
+        "role_at_rate": "teacher",
+        "comment": None,
+        "measured_at": measured_at,
+    }
+    inserted, errors = scores_repo.insert_bulk({name: [row[name]] for name, _ in scores_repo.BULK_COLUMNS})
+    assert (inserted, errors) == (1, [])
+
+
+def test_reads_skip_the_hash_until_scores_change(monkeypatch):
+    run_write(_seed)
+    start = datetime(2026, 1, 1, 12)
+    _insert("sc_wm_1", 40, start)
+
+    checks = []
+    source_state = profiles_repo.source_state
+
+    def counting_source_state(*args, **kwargs):
+        checks.append(args)
+        return source_state(*args, **kwargs)
+
+    monkeypatch.setattr(profiles_repo, "source_state", counting_source_state)
+
+    _, summary, _ = profile_series_service.materialized_series(TRACK, STUDENT)
+    assert summary.scores_total == 1
+    assert len(checks) == 1
+
+    # Счётчик области не двигался — только чтение готовой строки
+    for _ in range(3):
+        profile_series_service.materialized_series(TRACK, STUDENT)
+    assert len(checks) == 1
+
+    version = profiles_repo.watermark(TRACK, STUDENT)
+    _insert("sc_wm_2", 60, start + timedelta(days=1))
+    assert profiles_repo.watermark(TRACK, STUDENT) == version + 1
+    assert profiles_repo.watermark(TRACK) > 0
+
+    _, summary, _ = profile_series_service.materialized_series(TRACK, STUDENT)
+    assert summary.scores_total == 2
+    assert len(checks) == 2
+    _, summary, _ = profile_series_service.materialized_series(TRACK)
+    assert summary.scores_total == 2
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server.config import API_PREFIX
+from server.db import client_tokens_repo, scores_repo
+from server.db.writer import run_write
+from server.main import app
+
+TRACK = "t_access"
+OTHER_TRACK = "t_access_other"
+STUDENT = "u_access_s"
+OTHER_STUDENT = "u_access_s2"
+TEACHER = "u_access_t"
+METRIC = "m_access"
+SERVER = {"Authorization": "Bearer test-server-token"}
+
+
+def _seed(con) -> None:
+    con.execute(
+        "INSERT INTO users (user_id, display_name) VALUES (?, 'S'), (?, 'S2'), (?, 'T')",
+        [STUDENT, OTHER_STUDENT, TEACHER],
+    )
+    for track_id in (TRACK, OTHER_TRACK):
+        con.execute(
+            "INSERT INTO tracks (track_id, title, owner_user_id, status) VALUES (?, 'T', ?, 'active')",
+            [track_id, TEACHER],
+        )
+    con.execute(
+        """
+        INSERT INTO track_participants (track_id, user_id, role_in_track)
+        VALUES (?, ?, 'teacher'), (?, ?, 'student'), (?, ?, 'student'), (?, ?, 'student')
+        """,
+        [TRACK, TEACHER, TRACK, STUDENT, TRACK, OTHER_STUDENT, OTHER_TRACK, STUDENT],
+    )
+    con.execute("INSERT INTO metrics (metric_id, kind, name) VALUES (?, 'metric', 'Focus')", [METRIC])
+
+
+def _client_headers(user_id: str) -> dict:
+    token_id = f"ct_access_{user_id}"
+    client_tokens_repo.create_token(
+        token_id=token_id,
+        user_id=user_id,
+        telegram_user_id=1,
+        expires_at=datetime.utcnow() + timedelta(hours=1),
+        user_agent=None,
+        ip_hash=None,
+        payload_json=None,
+    )
+    return {"Authorization": f"Bearer {token_id}"}
+
+
+@pytest.fixture(scope="module")
+def api():
+    run_write(_seed)
+    start = datetime(2026, 2, 2, 10)
+    rows = [
+        (f"sc_access_{i}", track_id, student_id, start + timedelta(days=i))
+        for i, (track_id, student_id) in enumerate(
+            [(TRACK, STUDENT), (TRACK, OTHER_STUDENT), (OTHER_TRACK, STUDENT), (TRACK, STUDENT)]
+        )
+    ]
+    columns = {
+        "score_id": [r[0] for r in rows],
+        "track_id": [r[1] for r in rows],
+        "step_id": [None] * len(rows),
+        "student_id": [r[2] for r in rows],
+        "metric_id": [METRIC] * len(rows),
+        "raw_value": [50] * len(rows),
+        "rater_user_id": [TEACHER] * len(rows),
+        "role_at_rate": ["teacher"] * len(rows),
+        "comment": [None] * len(rows),
+        "measured_at": [r[3] for r in rows],
+    }
+    assert scores_repo.insert_bulk(columns) == (len(rows), [])
+    with TestClient(app) as client:
+        client.student = _client_headers(STUDENT)
+        client.teacher = _client_headers(TEACHER)
+        yield client
+
+
+def test_smoothed_series_is_limited_to_own_or_taught_series(api):
+    url = f"{API_PREFIX}/scores/smoothed-series"
+
+    assert api.get(url, params={"track_id": TRACK, "student_id": STUDENT}, headers=api.student).status_code == 200
+    assert api.get(url, params={"track_id": TRACK, "student_id": OTHER_STUDENT}, headers=api.teacher).status_code == 200
+    assert api.get(url, params={"track_id": TRACK}, headers=api.teacher).status_code == 200
+    assert api.get(url, params={"track_id": TRACK}, headers=SERVER).status_code == 200
+
+    # Чужая серия и серия всего трека для студента, чужой трек для учителя — 403
+    for params, headers in (
+        ({"track_id": TRACK, "student_id": OTHER_STUDENT}, api.student),
+        ({"track_id": TRACK}, api.student),
+        ({"track_id": OTHER_TRACK}, api.teacher),
+        ({"track_id": OTHER_TRACK, "student_id": STUDENT}, api.teacher),
+    ):
+        response = api.get(url, params=params, headers=headers)
+        assert response.status_code == 403, params
+
+
+def test_export_is_server_only(api):
+    url = f"{API_PREFIX}/scores/export"
+
+    for headers in (api.student, api.teacher):
+        assert api.post(url, json={"student_ids": [STUDENT]}, headers=headers).status_code == 403
+
+    response = api.post(url, json={"track_ids": [TRACK]}, headers=SERVER)
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 3
+
+
+def test_aggregate_is_limited_to_own_or_taught_scores(api):
+    url = f"{API_PREFIX}/scores/aggregate"
+
+    own = api.post(url, json={"student_ids": [STUDENT]}, headers=api.student)
+    assert own.status_code == 200
+    assert own.json()[0]["count"] == 3
+    taught = api.post(url, json={"track_ids": [TRACK], "group_by": ["student"]}, headers=api.teacher)
+    assert taught.status_code == 200
+    assert {row["student_id"] for row in taught.json()} == {STUDENT, OTHER_STUDENT}
+
+    for body, headers in (
+        ({"group_by": ["student"]}, api.student),
+        ({"group_by": ["student"]}, api.teacher),
+        ({"student_ids": [STUDENT, OTHER_STUDENT]}, api.student),
+        ({"track_ids": [TRACK, OTHER_TRACK]}, api.teacher),
+    ):
+        assert api.post(url, json=body, headers=headers).status_code == 403, body
+    assert api.post(url, json={"group_by": ["student"]}, headers=SERVER).status_code == 200
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server.config import API_PREFIX
+from server.db import scores_repo
+from server.db.writer import run_write
+from server.main import app
+from server.routers.scores import NEXT_CURSOR_HEADER
+from server.utils.cursor import encode_score_cursor
+
+TRACK = "t_page"
+STUDENT = "u_page_s"
+TEACHER = "u_page_t"
+METRIC = "m_page"
+SERVER = {"Authorization": "Bearer test-server-token"}
+URL = f"{API_PREFIX}/scores/query"
+TOTAL = 25
+
+
+def _seed(con) -> None:
+    con.execute("INSERT INTO users (user_id, display_name) VALUES (?, 'S'), (?, 'T')", [STUDENT, TEACHER])
+    con.execute(
+        "INSERT INTO tracks (track_id, title, owner_user_id, status) VALUES (?, 'T', ?, 'active')",
+        [TRACK, TEACHER],
+    )
+    con.execute("INSERT INTO metrics (metric_id, kind, name) VALUES (?, 'metric', 'Focus')", [METRIC])
+
+
+@pytest.fixture(scope="module")
+def api():
+    run_write(_seed)
+    # По пять оценок на одно и то же measured_at: границы страниц режут группы с равным временем
+    start = datetime(2026, 4, 6, 9)
+    measured = [start + timedelta(hours=i // 5) for i in range(TOTAL)]
+    columns = {
+        "score_id": [f"sc_page_{i:02d}" for i in range(TOTAL)],
+        "track_id": [TRACK] * TOTAL,
+        "step_id": [None] * TOTAL,
+        "student_id": [STUDENT] * TOTAL,
+        "metric_id": [METRIC] * TOTAL,
+        "raw_value": [i * 3 for i in range(TOTAL)],
+        "rater_user_id": [TEACHER] * TOTAL,
+        "role_at_rate": ["teacher"] * TOTAL,
+        "comment": [None] * TOTAL,
+        "measured_at": measured,
+    }
+    assert scores_repo.insert_bulk(columns) == (TOTAL, [])
+    with TestClient(app) as client:
+        yield client
+
+
+def test_cursor_pages_match_a_single_query(api):
+    full = api.post(URL, json={"track_ids": [TRACK], "limit": 100}, headers=SERVER)
+    assert full.status_code == 200
+    assert NEXT_CURSOR_HEADER not in full.headers
+    expected = [row["score_id"] for row in full.json()]
+    assert len(expected) == TOTAL
+
+    pages = []
+    cursor = None
+    while True:
+        body = {"track_ids": [TRACK], "limit": 7}
+        if cursor:
+            body["cursor"] = cursor
+        response = api.post(URL, json=body, headers=SERVER)
+        assert response.status_code == 200
+        pages.append([row["score_id"] for row in response.json()])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [7, 7, 7, 4]
+    assert [score_id for page in pages for score_id in page] == expected
+
+
+def test_cursor_with_offset_is_rejected(api):
+    cursor = encode_score_cursor(datetime(2026, 4, 6, 10), "sc_page_07")
+    response = api.post(URL, json={"track_ids": [TRACK], "cursor": cursor, "offset": 5}, headers=SERVER)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "cursor and offset are mutually exclusive"
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not-a-cursor",
+        base64.urlsafe_b64encode(b'{"measured_at": "2026-04-06"}').decode("ascii"),
+        base64.urlsafe_b64encode(b'["yesterday", "sc_page_07"]').decode("ascii"),
+    ],
+)
+def test_tampered_cursor_is_rejected(api, cursor):
+    response = api.post(URL, json={"track_ids": [TRACK], "cursor": cursor}, headers=SERVER)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import threading
+from itertools import count
+
+import pytest
+from fastapi import HTTPException
+
+from server.db import sessions_repo, unit_of_work, users_repo
+from server.db.connection import after_commit
+from server.db.writer import run_write, submit_write, writer_stats
+from server.schemas.sessions import SessionConnectIn, SessionRefreshIn
+from server.services import sessions_service
+
+THREADS = 8
+CALLS = 20
+
+_telegram_ids = count(7_000_000)
+
+
+def _hammer(fn) -> tuple[int, list]:
+    done = []
+    errors = []
+    start = threading.Barrier(THREADS)
+
+    def worker() -> None:
+        start.wait()
+        for _ in range(CALLS):
+            try:
+                done.append(fn())
+            except Exception as exc:
+                errors.append(exc)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(done), errors
+
+
+def test_concurrent_refresh_of_one_session_queues_on_writer():
+    session = sessions_service.connect_session(SessionConnectIn(telegram_user_id=next(_telegram_ids)))
+    payload = SessionRefreshIn(session_id=session.session_id, ttl_minutes=60)
+
+    done, errors = _hammer(lambda: sessions_service.refresh_session(payload))
+
+    assert errors == []
+    assert done == THREADS * CALLS
+
+
+def test_rejected_refresh_does_not_fail_the_batch():
+    session = sessions_service.connect_session(SessionConnectIn(telegram_user_id=next(_telegram_ids)))
+    good = SessionRefreshIn(session_id=session.session_id, ttl_minutes=60)
+    missing = SessionRefreshIn(session_id="ses_missing", ttl_minutes=60)
+    calls = count()
+
+    def _refresh():
+        # Каждый второй вызов — 404; он не должен откатывать соседние задания пакета
+        return sessions_service.refresh_session(missing if next(calls) % 2 else good)
+
+    before = writer_stats()
+    done, errors = _hammer(_refresh)
+    after = writer_stats()
+
+    assert done == THREADS * CALLS // 2
+    assert len(errors) == THREADS * CALLS // 2
+    assert all(isinstance(exc, HTTPException) and exc.status_code == 404 for exc in errors)
+    assert after["failed"] == before["failed"]
+    assert after["batch_fallbacks"] == before["batch_fallbacks"]
+
+
+def test_concurrent_connect_creates_one_user():
+    telegram_id = next(_telegram_ids)
+    payload = SessionConnectIn(telegram_user_id=telegram_id)
+
+    done, errors = _hammer(lambda: sessions_service.connect_session(payload))
+
+    assert errors == []
+    assert done == THREADS * CALLS
+    user = users_repo.get_by_telegram_id(telegram_id)
+    with unit_of_work() as con:
+        users = con.execute("SELECT COUNT(*) FROM users WHERE telegram_id = ?", [telegram_id]).fetchall()[0][0]
+        sessions = con.execute("SELECT COUNT(*) FROM sessions WHERE user_id = ?", [user["user_id"]]).fetchall()[0][0]
+    assert users == 1
+    assert sessions == THREADS * CALLS
+
+
+def test_failed_job_rolls_back_every_step():
+    telegram_id = next(_telegram_ids)
+
+    def _create_then_fail(con):
+        users_repo.create_user_for_telegram(
+            telegram_user_id=telegram_id,
+            display_name="rollback",
+            telegram_username=None,
+            telegram_login_name=None,
+        )
+        # Чтение внутри задания видит незакоммиченную запись того же задания
+        assert users_repo.get_by_telegram_id(telegram_id) is not None
+        raise RuntimeError("boom")
+
+    failed = writer_stats()["failed"]
+    with pytest.raises(RuntimeError, match="boom"):
+        run_write(_create_then_fail)
+
+    assert users_repo.get_by_telegram_id(telegram_id) is None
+    assert writer_stats()["failed"] == failed + 1
+
+
+def test_read_unit_of_work_keeps_its_snapshot():
+    session = sessions_service.connect_session(SessionConnectIn(telegram_user_id=next(_telegram_ids)))
+
+    with unit_of_work():
+        before = sessions_repo.get_session(session.session_id)
+        sessions_repo.revoke_session(session.session_id)
+        inside = sessions_repo.get_session(session.session_id)
+
+    assert before["revoked_at"] is None
+    assert inside["revoked_at"] is None
+    assert sessions_repo.get_session(session.session_id)["revoked_at"] is not None
+
+
+def test_write_from_after_commit_callback_does_not_wait_on_itself():
+    telegram_id = next(_telegram_ids)
+    created = []
+
+    def _create_after_commit(con):
+        # Колбэк выполняется в потоке писателя уже после COMMIT — как сброс sys_events после остановки буфера
+        after_commit(
+            lambda: created.append(
+                users_repo.create_user_for_telegram(
+                    telegram_user_id=telegram_id,
+                    display_name="after commit",
+                    telegram_username=None,
+                    telegram_login_name=None,
+                )
+            )
+        )
+
+    future = submit_write(_create_after_commit)
+    future.result(timeout=10)
+
+    assert len(created) == 1
+    assert users_repo.get_by_telegram_id(telegram_id) is not None